@@ -16,7 +16,7 @@ def main():
         "modules/signal_definition.py", title="買賣信號條件", icon=":material/edit:"
     )
     futures_filter = st.Page(
-        "modules/futures_Filter.py", title="濾網交易訊號", icon=":material/filter:"
+        "modules/futures_filter.py", title="濾網交易訊號", icon=":material/filter:"
     )
     plot_data = st.Page(
         "modules/data_analysis.py", title="資料分析圖表", icon=":material/analytics:"
@@ -0,0 +1,162 @@
+import os
+import time
+import argparse
+import pandas as pd
+
+from utils.file_utils import read_folder_files
+from utils.parallel_utils import default_workers, format_progress
+from utils.profiler import start_profiling, stop_profiling
+from utils.storage import get_storage, raw_data_name
+from utils.talib_utils import (
+    build_param_grid,
+    run_backtests,
+    save_strategy_results,
+)
+
+# 彙總結果的預設輸出位置；不放在 data 資料夾，避免被當成股票的結果表
+DEFAULT_OUTPUT = os.path.join("output", "all_strategy_results.csv")
+
+
+def parse_periods(text):
+    """解析以逗號分隔的週期，例如 5,10,20"""
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def parse_tuples(text):
+    """解析以分號分隔的參數組，例如 12,26,9;24,52,9"""
+    return [tuple(map(int, item.split(","))) for item in text.split(";") if item]
+
+
+def parse_walk_forward(text):
+    """解析滾動視窗設定 訓練筆數,測試筆數[,間隔]，例如 500,100 或 500,100,50"""
+    values = [int(x) for x in text.split(",") if x.strip()]
+    if len(values) not in (2, 3):
+        raise argparse.ArgumentTypeError("格式為 訓練筆數,測試筆數[,間隔]")
+    return tuple(values) if len(values) == 3 else (*values, None)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批次回測 data 資料夾內所有股票")
+    parser.add_argument("--tickers", nargs="*", help="指定股票代號，預設為全部")
+    parser.add_argument("--ma", type=parse_periods, default=[5, 10, 20])
+    parser.add_argument("--rsi", type=parse_periods, default=[5, 10, 20])
+    parser.add_argument(
+        "--macd", type=parse_tuples, default=[(12, 26, 9), (24, 52, 9), (48, 104, 9)]
+    )
+    parser.add_argument("--willr", type=parse_periods, default=[5, 10, 20])
+    parser.add_argument(
+        "--kdj", type=parse_tuples, default=[(9, 3, 3), (18, 3, 3), (36, 3, 3)]
+    )
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument(
+        "--output",
+        default=DEFAULT_OUTPUT,
+        help="彙總結果輸出路徑",
+    )
+    parser.add_argument(
+        "--grid",
+        action="store_true",
+        help="以矩陣模式回測，一次求值一個區塊的參數組合",
+    )
+    parser.add_argument(
+        "--walk-forward",
+        type=parse_walk_forward,
+        help="滾動視窗驗證，格式為 訓練筆數,測試筆數[,間隔]",
+    )
+    parser.add_argument(
+        "--profile",
+        help="記錄各階段耗時，輸出 {PROFILE}.json 與 {PROFILE}.trace.json",
+    )
+    parser.add_argument(
+        "--import-storage",
+        action="store_true",
+        help="只執行一次性匯入：將 data 內只有 CSV 的資料表轉存為目前後端的格式，保留原檔",
+    )
+    return parser.parse_args(argv)
+
+
+def load_datasets(tickers):
+    """讀取各股票的歷史資料，讀取失敗的股票會略過"""
+    datasets = {}
+    storage = get_storage("data")
+    for ticker in tickers:
+        try:
+            datasets[ticker] = storage.read(raw_data_name(ticker))
+        except Exception as e:
+            print(f"讀取 {ticker} 失敗: {e}")
+    return datasets
+
+
+def run_batch(
+    tickers,
+    combos,
+    workers=1,
+    output=DEFAULT_OUTPUT,
+    grid=False,
+    walk_forward=None,
+):
+    """回測所有股票並寫出各股票與彙總的結果表"""
+    datasets = load_datasets(tickers)
+    start_time = time.time()
+    last_report = 0
+
+    def report(done, total):
+        nonlocal last_report
+        # 每完成約 1% 輸出一次進度
+        if done == total or done - last_report >= max(1, total // 100):
+            last_report = done
+            print(format_progress(done, total, time.time() - start_time))
+
+    results = run_backtests(
+        datasets, combos, workers, report, grid=grid, walk_forward=walk_forward
+    )
+
+    frames = []
+    for ticker, rows in results.items():
+        result_df = save_strategy_results(ticker, rows)
+        frames.append(result_df.assign(Ticker=ticker))
+
+    summary = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not summary.empty:
+        summary = summary[["Ticker"] + [c for c in summary.columns if c != "Ticker"]]
+        summary = summary.sort_values("Profit Factor", ascending=False)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    summary.to_csv(output, index=False)
+    return summary
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.import_storage:
+        imported = get_storage("data").import_all()
+        print(f"已匯入 {len(imported)} 個資料表：{', '.join(imported)}")
+        return
+
+    tickers = args.tickers or sorted(set(read_folder_files("data")))
+    combos = build_param_grid(args.ma, args.rsi, args.macd, args.willr, args.kdj)
+
+    print(f"共 {len(tickers)} 檔股票，每檔 {len(combos)} 組參數")
+    profiler = start_profiling() if args.profile else None
+    try:
+        run_batch(
+            tickers,
+            combos,
+            args.workers,
+            args.output,
+            grid=args.grid,
+            walk_forward=args.walk_forward,
+        )
+    finally:
+        if profiler is not None:
+            stop_profiling(profiler)
+    print(f"彙總結果已儲存至 {args.output}")
+
+    if profiler is not None:
+        profiler.save_json(f"{args.profile}.json")
+        profiler.save_chrome_trace(f"{args.profile}.trace.json")
+        print(profiler.summary().to_string(index=False))
+        print(f"效能資料已儲存至 {args.profile}.json 與 {args.profile}.trace.json")
+
+
+if __name__ == "__main__":
+    main()
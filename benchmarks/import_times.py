@@ -0,0 +1,135 @@
+"""
+各頁面的匯入時間報告，以 python -X importtime 在新的直譯器中量測
+
+於專案根目錄執行：
+    python -m benchmarks.import_times
+    python -m benchmarks.import_times --pages modules/query_data.py --top 15
+
+每個頁面只匯入該頁面檔案頂層 import 的模組，不執行頁面本身
+輸出各頁面的匯入總時間，以及耗時最多的套件
+"""
+
+import os
+import re
+import ast
+import sys
+import glob
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 專案內的套件
+PROJECT_PACKAGES = ("utils", "modules", "benchmarks")
+
+# -X importtime 的輸出格式：import time: self [us] | cumulative | imported package
+LINE_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def page_imports(path):
+    """頁面檔案頂層 import 的模組名稱"""
+    with open(path, "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的輸出，回傳 (總微秒數, 套件 -> 微秒數)
+    總時間為最外層各匯入的累計時間總和
+    套件的時間為其所有模組自身時間（self）的總和，不受由誰先匯入影響
+    第三方套件以頂層名稱（例如 plotly）統計，專案內的模組保留完整名稱
+    """
+    total = 0
+    packages = {}
+    for line in stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        if len(indent) == 1:
+            total += int(cumulative)
+        root = name.split(".")[0]
+        key = name if root in PROJECT_PACKAGES else root
+        packages[key] = packages.get(key, 0) + int(own)
+    return total, packages
+
+
+def measure_imports(modules, repeat=3, python=sys.executable):
+    """
+    在新的直譯器中匯入 modules，重複 repeat 次取總時間最短的一次
+    回傳 {"seconds": 總秒數, "packages": 套件 -> 累計秒數}
+    """
+    code = "\n".join(f"import {module}" for module in modules)
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [python, "-X", "importtime", "-c", code],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+        total, packages = parse_importtime(completed.stderr)
+        if best is None or total < best[0]:
+            best = (total, packages)
+    total, packages = best
+    return {
+        "seconds": total / 1e6,
+        "packages": {name: us / 1e6 for name, us in packages.items()},
+    }
+
+
+def import_report(pages=None, repeat=3, top=10):
+    """各頁面的匯入時間，回傳 頁面路徑 -> {seconds, modules, packages（前 top 名）}"""
+    pages = pages or sorted(glob.glob(os.path.join(ROOT, "modules", "*.py")))
+    report = {}
+    for page in pages:
+        modules = page_imports(page)
+        result = measure_imports(modules, repeat)
+        heaviest = sorted(result["packages"].items(), key=lambda item: -item[1])
+        report[os.path.relpath(page, ROOT)] = {
+            "seconds": result["seconds"],
+            "modules": modules,
+            "packages": dict(heaviest[:top]),
+        }
+    return report
+
+
+def print_report(report):
+    for page, result in report.items():
+        print(f"{page}: {result['seconds'] * 1000:,.0f} ms")
+        for name, seconds in result["packages"].items():
+            print(f"    {name:<24} {seconds * 1000:>8,.1f} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="頁面匯入時間報告")
+    parser.add_argument("--pages", nargs="*", help="頁面檔案，預設為 modules/*.py")
+    parser.add_argument("--repeat", type=int, default=3, help="每個頁面量測次數")
+    parser.add_argument("--top", type=int, default=10, help="列出的套件數")
+    parser.add_argument("--output", help="另存 JSON 結果")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = import_report(args.pages, args.repeat, args.top)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"結果已儲存至 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
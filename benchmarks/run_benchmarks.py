@@ -0,0 +1,386 @@
+"""
+回測效能基準測試，不需要網路，以合成資料執行
+
+於專案根目錄執行：
+    python -m benchmarks.run_benchmarks --bars 1000,100000 --tickers 2
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --import-times
+
+各階段輸出每秒處理組數、每秒處理 K 棒數與峰值記憶體
+--import-times 另外量測各頁面的匯入時間（階段名稱為 import[頁面]），與基準比較時一併檢查
+與基準檔比較時，吞吐量下降或記憶體增加超過 --tolerance 即視為退步，結束代碼為 1
+"""
+
+import os
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from batch_backtest import parse_periods, parse_tuples
+from benchmarks.import_times import import_report, print_report
+from benchmarks.synthetic import generate_universe
+from utils.signal_utils import SignalEvaluator, load_signals
+from utils.indicator_cache import IndicatorCache, data_fingerprint
+from utils.talib_utils import (
+    INDICATOR_CACHE,
+    build_combo_detail,
+    build_param_grid,
+    calculate_profit,
+    get_indicator_columns,
+    grid_indicator_specs,
+    prefetch_indicators,
+    process_signals,
+    run_backtests,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="回測效能基準測試")
+    parser.add_argument(
+        "--bars", type=parse_periods, default=[1000, 10000], help="K 棒數，可多個"
+    )
+    parser.add_argument("--tickers", type=int, default=2, help="合成股票檔數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ma", type=parse_periods, default=[5, 10, 20])
+    parser.add_argument("--rsi", type=parse_periods, default=[5, 10, 20])
+    parser.add_argument("--macd", type=parse_tuples, default=[(12, 26, 9)])
+    parser.add_argument("--willr", type=parse_periods, default=[5, 10])
+    parser.add_argument("--kdj", type=parse_tuples, default=[(9, 3, 3)])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--sample", type=int, default=20, help="逐組量測階段每檔股票取用的組合數"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="每個階段至少累計執行的秒數"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="略過峰值記憶體量測，只計時"
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join("benchmarks", "latest.json"),
+        help="結果輸出路徑",
+    )
+    parser.add_argument("--baseline", help="比較用的基準結果檔")
+    parser.add_argument("--save-baseline", help="另存本次結果為基準檔")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--import-times", action="store_true", help="量測各頁面的匯入時間"
+    )
+    return parser.parse_args(argv)
+
+
+def _leaves(logic):
+    """取出條件樹中的所有基本條件"""
+    for key in ("or", "and"):
+        if key in logic:
+            return [leaf for cond in logic[key] for leaf in _leaves(cond)]
+    return [logic]
+
+
+def signal_shapes(config, width=16, depth=8):
+    """
+    以 signals.yaml 的條件組出不同形狀的條件樹
+    yaml：原設定；wide：單層 or 的多個條件；deep：and/or 交錯的多層巢狀
+    """
+    leaves = _leaves(config["buy_signal"]) + _leaves(config["sell_signal"])
+    if not leaves:
+        return {"yaml": config}
+
+    wide = {"or": [leaves[i % len(leaves)] for i in range(width)]}
+    deep = leaves[0]
+    for level in range(depth):
+        deep = {"and" if level % 2 else "or": [deep, leaves[(level + 1) % len(leaves)]]}
+
+    return {
+        "yaml": config,
+        "wide": {"buy_signal": wide, "sell_signal": wide},
+        "deep": {"buy_signal": deep, "sell_signal": deep},
+    }
+
+
+def measure(func, memory=True, min_time=0.2):
+    """
+    回傳 (單次執行秒數, 峰值記憶體 MB)
+    重複執行到累計至少 min_time 秒，避免過短的階段被計時誤差淹沒
+    tracemalloc 會拖慢執行，記憶體另外執行一次量測
+    """
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / 1024 / 1024
+
+    # 取最快的一次，排除其他程序干擾造成的波動
+    times = []
+    while sum(times) < min_time or not times:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), peak_mb
+
+
+def _record(stage, bars, tickers, items, total_bars, seconds, peak_mb):
+    return {
+        "stage": stage,
+        "bars": bars,
+        "tickers": tickers,
+        "items": items,
+        "seconds": seconds,
+        "items_per_sec": items / seconds if seconds > 0 else None,
+        "bars_per_sec": total_bars / seconds if seconds > 0 else None,
+        "peak_mb": peak_mb,
+    }
+
+
+def benchmark_size(bars, args, combos):
+    """對同一種資料長度執行所有階段，回傳各階段的量測結果"""
+    memory = not args.no_memory
+    datasets = generate_universe(args.tickers, bars, args.seed)
+    fingerprints = {ticker: data_fingerprint(data) for ticker, data in datasets.items()}
+    tickers = len(datasets)
+    records = []
+
+    # 1. 指標計算：每次量測都從空的快取開始
+    specs = grid_indicator_specs(combos)
+
+    def run_indicators():
+        cache = IndicatorCache()
+        for ticker, data in datasets.items():
+            for indicator, params in specs:
+                get_indicator_columns(
+                    ticker, data, indicator, params, fingerprints[ticker], cache
+                )
+
+    items = tickers * len(specs)
+    seconds, peak_mb = measure(run_indicators, memory, args.min_time)
+    records.append(
+        _record("indicators", bars, tickers, items, items * bars, seconds, peak_mb)
+    )
+
+    # 同一指標的所有週期以批次核心一次算出
+    def run_batch_indicators():
+        cache = IndicatorCache()
+        for ticker, data in datasets.items():
+            prefetch_indicators(ticker, data, specs, fingerprints[ticker], cache)
+            for indicator, params in specs:
+                get_indicator_columns(
+                    ticker, data, indicator, params, fingerprints[ticker], cache
+                )
+
+    seconds, peak_mb = measure(run_batch_indicators, memory, args.min_time)
+    records.append(
+        _record(
+            "indicators_batch", bars, tickers, items, items * bars, seconds, peak_mb
+        )
+    )
+
+    # 逐組量測的階段共用預先產生的回測明細
+    sample = combos[: args.sample]
+    frames = [
+        build_combo_detail(ticker, data, combo, fingerprints[ticker])
+        for ticker, data in datasets.items()
+        for combo in sample
+    ]
+
+    # 2. 信號求值：各種形狀的條件樹
+    # 每檔股票取一份明細，同一份欄位重複求值
+    columns = [
+        {column: frame[column].to_numpy() for column in frame.columns}
+        for frame in frames[:: max(1, len(sample))]
+    ]
+    for name, config in signal_shapes(load_signals().config).items():
+        evaluator = SignalEvaluator(config=config)
+
+        def run_signals():
+            for frame_columns in columns:
+                evaluator.buy_mask(frame_columns)
+                evaluator.sell_mask(frame_columns)
+
+        items = len(columns)
+        seconds, peak_mb = measure(run_signals, memory, args.min_time)
+        records.append(
+            _record(
+                f"signals[{name}]", bars, tickers, items, items * bars, seconds, peak_mb
+            )
+        )
+
+    # 3. 持倉狀態機與獲利欄位
+    def run_process():
+        for frame in frames:
+            process_signals(frame)
+
+    seconds, peak_mb = measure(run_process, memory, args.min_time)
+    records.append(
+        _record(
+            "process_signals",
+            bars,
+            tickers,
+            len(frames),
+            len(frames) * bars,
+            seconds,
+            peak_mb,
+        )
+    )
+
+    # 4. 獲利因子
+    def run_profit():
+        for frame in frames:
+            calculate_profit(frame)
+
+    seconds, peak_mb = measure(run_profit, memory, args.min_time)
+    records.append(
+        _record(
+            "calculate_profit",
+            bars,
+            tickers,
+            len(frames),
+            len(frames) * bars,
+            seconds,
+            peak_mb,
+        )
+    )
+
+    # 5. 完整回測：不使用結果快取，指標快取也從空的開始
+    def run_full():
+        INDICATOR_CACHE.clear()
+        run_backtests(datasets, combos, args.workers, use_cache=False)
+
+    items = tickers * len(combos)
+    seconds, peak_mb = measure(run_full, memory, args.min_time)
+    records.append(
+        _record("backtest", bars, tickers, items, items * bars, seconds, peak_mb)
+    )
+
+    # 6. 矩陣回測：同樣的條件，一次求值一個區塊的組合
+    def run_grid():
+        INDICATOR_CACHE.clear()
+        run_backtests(datasets, combos, args.workers, use_cache=False, grid=True)
+
+    seconds, peak_mb = measure(run_grid, memory, args.min_time)
+    records.append(
+        _record("backtest_grid", bars, tickers, items, items * bars, seconds, peak_mb)
+    )
+    return records
+
+
+def _key(record):
+    return f"{record['stage']}@{record['bars']}x{record['tickers']}"
+
+
+def compare_with_baseline(records, baseline, tolerance=0.2):
+    """
+    與基準結果比較，回傳退步項目的說明清單
+    吞吐量低於基準的 (1 - tolerance) 倍，或峰值記憶體高於 (1 + tolerance) 倍即為退步
+    """
+    previous = {_key(record): record for record in baseline["results"]}
+    regressions = []
+    for record in records:
+        old = previous.get(_key(record))
+        if old is None:
+            continue
+        if (
+            old["items_per_sec"]
+            and record["items_per_sec"]
+            and record["items_per_sec"] < old["items_per_sec"] * (1 - tolerance)
+        ):
+            regressions.append(
+                f"{_key(record)} 吞吐量 {old['items_per_sec']:.1f} -> "
+                f"{record['items_per_sec']:.1f} /秒"
+            )
+        # 記憶體很小時的波動不計入，至少要多 1 MB
+        if (
+            old["peak_mb"] is not None
+            and record["peak_mb"] is not None
+            and record["peak_mb"] > old["peak_mb"] * (1 + tolerance) + 1
+        ):
+            regressions.append(
+                f"{_key(record)} 峰值記憶體 {old['peak_mb']:.1f} -> "
+                f"{record['peak_mb']:.1f} MB"
+            )
+    return regressions
+
+
+def print_table(records):
+    table = pd.DataFrame(records)[
+        [
+            "stage",
+            "bars",
+            "tickers",
+            "items",
+            "seconds",
+            "items_per_sec",
+            "bars_per_sec",
+            "peak_mb",
+        ]
+    ]
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(table.to_string(index=False, float_format=lambda x: f"{x:,.3f}"))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    combos = build_param_grid(args.ma, args.rsi, args.macd, args.willr, args.kdj)
+    print(f"共 {args.tickers} 檔合成股票，每檔 {len(combos)} 組參數")
+
+    records = []
+    for bars in args.bars:
+        records.extend(benchmark_size(bars, args, combos))
+
+    imports = None
+    if args.import_times:
+        # 每個頁面在新的直譯器中量測，吞吐量為每秒可完成的冷啟動匯入次數
+        imports = import_report()
+        print_report(imports)
+        for page, result in imports.items():
+            records.append(
+                _record(f"import[{page}]", 0, 0, 1, 0, result["seconds"], None)
+            )
+
+    report = {
+        "meta": {
+            "created": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "combos": len(combos),
+            "args": {k: v for k, v in vars(args).items() if k != "baseline"},
+        },
+        "results": records,
+        "imports": imports,
+    }
+    print_table(records)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2, default=str)
+    print(f"結果已儲存至 {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2, default=str)
+        print(f"基準已儲存至 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare_with_baseline(records, baseline, args.tolerance)
+        if regressions:
+            print("效能退步：")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print("與基準相比沒有退步")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
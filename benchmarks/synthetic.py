@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_ohlcv(bars, seed=0, start="2000-01-03", start_price=100.0, freq=None):
+    """
+    產生可重現的合成 K 棒資料，欄位與 data 資料夾內的歷史資料相同
+    收盤價的對數偏離為均值回歸的 AR(1)，長序列的價格也維持在合理範圍
+    最高、最低價包住開盤與收盤價
+    freq 預設為日 K，筆數超過日期可表示的範圍時改用分 K
+    """
+    if freq is None:
+        freq = "B" if bars <= 50_000 else "min"
+    rng = np.random.default_rng(seed)
+    shocks = rng.normal(0, 0.02, bars)
+    # y[t] = 0.999 * y[t-1] + shock[t]，即 alpha 為 0.001 的指數平滑乘上 1000
+    deviation = (
+        pd.Series(np.concatenate([[0.0], shocks]))
+        .ewm(alpha=0.001, adjust=False)
+        .mean()
+        .to_numpy()[1:]
+        * 1000
+    )
+    close = start_price * np.exp(deviation)
+    open_ = np.concatenate([[start_price], close[:-1]]) * np.exp(
+        rng.normal(0, 0.005, bars)
+    )
+    spread = np.abs(rng.normal(0, 0.01, bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.integers(1_000, 10_000_000, bars)
+
+    return pd.DataFrame(
+        {
+            "Date": pd.date_range(start, periods=bars, freq=freq),
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Volume": volume,
+        }
+    )
+
+
+def generate_universe(tickers, bars, seed=0):
+    """產生多檔合成股票，回傳 ticker -> DataFrame，每檔使用不同的亂數種子"""
+    return {f"SYN{i:04d}": generate_ohlcv(bars, seed=seed + i) for i in range(tickers)}
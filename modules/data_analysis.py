@@ -1,19 +1,93 @@
-import os
+import datetime
 import streamlit as st
 import pandas as pd
 
-from utils.file_utils import read_folder_files
-from utils.plotly_utils import plot_chart
+from utils.plotly_utils import build_fast_chart, plot_chart
+from utils.results_index import row_combo
+from utils.data_access import (
+    list_tickers,
+    load_chart_range,
+    load_combo_detail,
+    load_strategy_results,
+    query_results,
+)
+
+# 明細超過此筆數時預設使用快速圖表
+FAST_CHART_BARS = 5000
+
+
+def show_fast_chart(ticker, combo, df_result):
+    """
+    WebGL 快速圖表，只傳送依圖表寬度降採樣後的點
+    在圖上拖曳選取時間區間即放大，區間明細由快取取得
+    """
+    dates = pd.to_datetime(df_result["Date"])
+    first = dates.iloc[0].to_pydatetime()
+    last = dates.iloc[-1].to_pydatetime()
+    range_key = f"chart_range_{ticker}_{combo}"
+    if range_key not in st.session_state:
+        st.session_state[range_key] = (first, last)
+
+    def zoom():
+        box = st.session_state["fast_chart"].selection.get("box")
+        if box:
+            x = pd.to_datetime(box[0]["x"])
+            st.session_state[range_key] = (
+                max(first, x.min().to_pydatetime()),
+                min(last, x.max().to_pydatetime()),
+            )
+
+    def reset():
+        st.session_state[range_key] = (first, last)
+
+    start, end = st.slider(
+        "顯示區間",
+        min_value=first,
+        max_value=last,
+        step=max(datetime.timedelta(minutes=1), (last - first) / 1000),
+        key=range_key,
+    )
+    st.button("顯示完整區間", on_click=reset)
+
+    df_chart = load_chart_range(ticker, combo, pd.Timestamp(start), pd.Timestamp(end))
+    st.caption(f"顯示 {len(df_chart)} 點（共 {len(df_result)} 筆），拖曳選取區間可放大")
+    st.plotly_chart(
+        build_fast_chart(df_chart),
+        key="fast_chart",
+        on_select=zoom,
+        selection_mode="box",
+    )
+
+
+def show_ranking():
+    """跨股票的參數組合排行，由結果索引直接篩選排序"""
+    with st.expander("全部股票排行"):
+        col1, col2, col3 = st.columns(3)
+        limit = col1.number_input("顯示前幾名", 1, 1000, 50)
+        min_count = col2.number_input("最少交易次數", 0, None, 10)
+        min_profit_factor = col3.number_input("最低獲利因子", 0.0, None, 0.0)
+        st.dataframe(
+            query_results(
+                min_count=min_count or None,
+                min_profit_factor=min_profit_factor or None,
+                limit=limit,
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
 
 
 def main():
     st.subheader("資料分析圖表")
+    show_ranking()
 
-    ticker_list = sorted(set(read_folder_files("data")))
+    ticker_list = sorted(set(list_tickers("data")))
     ticker = st.selectbox("請選擇股票", ticker_list)
 
-    file_path = os.path.join("data", f"{ticker}_strategy_results.csv")
-    data = pd.read_csv(file_path)
+    data = load_strategy_results(ticker)
+    if data is None:
+        st.info("尚未產生回測結果")
+        return
     df = pd.DataFrame(data)
     selected_row = st.dataframe(
         df,
@@ -22,23 +96,20 @@ def main():
         selection_mode="single-row",
         hide_index=True,
     )
-    print(selected_row.selection)
     if selected_row.selection["rows"]:
         index = selected_row.selection["rows"][0]
-        ma_period = df["MA"].iloc[index]
-        rsi_period = df["RSI"].iloc[index]
-        macd = df["MACD"].iloc[index]
-        willr_period = df["WILLR"].iloc[index]
-        kdj = df["KDJ"].iloc[index]
-
-        file_name = f"{ticker}_MA({ma_period})_RSI({rsi_period})_MACD{macd}_WILLR({willr_period})_KDJ{kdj}.csv"
-        file_path = os.path.join("data_results", file_name)
-        print(file_path)
-        if os.path.exists(file_path):
-            df_result = pd.read_csv(file_path)
+        combo = row_combo(df.iloc[index])
+        df_result = load_combo_detail(ticker, combo)
+        if df_result is not None:
             with st.expander("策略分析結果"):
                 st.dataframe(df_result, use_container_width=True)
-            _ = plot_chart(df_result)
+            fast = st.toggle(
+                "快速圖表（WebGL、降採樣）", value=len(df_result) > FAST_CHART_BARS
+            )
+            if fast:
+                show_fast_chart(ticker, combo, df_result)
+            else:
+                _ = plot_chart(df_result)
 
         else:
             st.write("資料尚未產生")
@@ -1,31 +1,29 @@
-import os
-import pandas as pd
+import time
+import json
 import streamlit as st
-import ast
 
-from utils.talib_utils import calculate_indicators
-from utils.file_utils import read_folder_files
+from utils.jobs import ACTIVE, DONE, job_outputs
+from utils.results_index import parameter_values
+from utils.talib_utils import PARAM_OPTIONS, build_param_grid, calculate_indicators
+from utils.optimizer import optimize_indicators
+from utils.parallel_utils import default_workers, format_progress
+from utils.profiler import start_profiling, stop_profiling
+from utils.data_access import (
+    invalidate,
+    job_scheduler,
+    list_tickers,
+    load_raw_data,
+    load_strategy_results,
+)
 
 
-def load_existing_results(file_path):
+def load_existing_results(ticker):
     """加載已計算的技術指標結果"""
-    if os.path.exists(file_path):
-        result_data = pd.read_csv(file_path)
+    result_data = load_strategy_results(ticker)
+    if result_data is not None:
         with st.expander("已計算的技術指標結果"):
             st.dataframe(result_data, use_container_width=True)
-        return {
-            "ma": result_data["MA"].sort_values().unique().tolist(),
-            "rsi": result_data["RSI"].sort_values().unique().tolist(),
-            "macd": [
-                ast.literal_eval(item)
-                for item in result_data["MACD"].sort_values().unique().tolist()
-            ],
-            "willr": result_data["WILLR"].sort_values().unique().tolist(),
-            "kdj": [
-                ast.literal_eval(item)
-                for item in result_data["KDJ"].sort_values().unique().tolist()
-            ],
-        }
+        return parameter_values(result_data)
 
     st.info("請先執行計算指標的功能，並選擇適合的參數組合。")
     return {"ma": [], "rsi": [], "macd": [], "willr": [], "kdj": []}
@@ -38,27 +36,27 @@ def get_user_inputs(defaults):
     with col1:
         ma_periods = st.multiselect(
             "選擇移動平均線週期",
-            [5, 10, 20, 60, 120],
+            PARAM_OPTIONS["ma"],
             default=defaults["ma"] or [5, 10, 20],
         )
         rsi_periods = st.multiselect(
             "選擇相對強弱指數週期",
-            [5, 10, 20, 60, 120],
+            PARAM_OPTIONS["rsi"],
             default=defaults["rsi"] or [5, 10, 20],
         )
         macd_params = st.multiselect(
             "選擇MACD參數",
-            [(5, 34, 5), (12, 26, 9), (24, 52, 9), (48, 104, 9)],
+            PARAM_OPTIONS["macd"],
             default=defaults["macd"] or [(12, 26, 9), (24, 52, 9), (48, 104, 9)],
         )
         willr_periods = st.multiselect(
             "選擇Williams %R週期",
-            [5, 10, 20, 30, 60, 120],
+            PARAM_OPTIONS["willr"],
             default=defaults["willr"] or [5, 10, 20],
         )
         kdj_params = st.multiselect(
             "選擇KDJ參數",
-            [(9, 3, 3), (18, 3, 3), (36, 3, 3), (14, 3, 3)],
+            PARAM_OPTIONS["kdj"],
             default=defaults["kdj"] or [(9, 3, 3), (18, 3, 3), (36, 3, 3)],
         )
 
@@ -106,15 +104,152 @@ def parse_tuple_input(input_text):
         return []
 
 
+def make_progress_callback():
+    """建立回測進度條，顯示完成組數、每秒組數與預估剩餘時間"""
+    progress_bar = st.progress(0.0, text="準備回測...")
+    start_time = time.time()
+
+    def update(done, total):
+        elapsed = time.time() - start_time
+        progress_bar.progress(
+            done / total if total else 1.0,
+            text=format_progress(done, total, elapsed),
+        )
+
+    return update
+
+
+def show_performance(profiler):
+    """顯示上一次回測的各階段耗時，可下載 JSON 或 Chrome trace"""
+    with st.expander("performance"):
+        st.write("各階段彙總")
+        st.dataframe(profiler.summary(), use_container_width=True, hide_index=True)
+        st.write("各參數組合耗時（毫秒）")
+        st.dataframe(
+            profiler.combo_summary(), use_container_width=True, hide_index=True
+        )
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "下載 JSON",
+            json.dumps(profiler.to_json(), ensure_ascii=False, default=str),
+            file_name="profile.json",
+            mime="application/json",
+        )
+        col2.download_button(
+            "下載 Chrome trace",
+            json.dumps(profiler.to_chrome_trace(), default=str),
+            file_name="profile.trace.json",
+            mime="application/json",
+        )
+
+
+def get_search_options(combo_count):
+    """
+    搜尋方式：完整網格，或逐輪淘汰（先以較短的歷史淘汰，再以完整歷史回測留下的組合）
+    回傳 None 表示完整網格，否則為 optimize_indicators 的參數
+    """
+    search = st.radio(
+        "搜尋方式",
+        ["完整網格", "逐輪淘汰"],
+        horizontal=True,
+        help=f"目前共 {combo_count} 組參數",
+    )
+    if search == "完整網格":
+        return None
+
+    col1, col2, col3 = st.columns(3)
+    eta = col1.number_input("每輪保留 1/N", 2, 10, 3)
+    max_evals = col2.number_input("評估組數上限（0 為不限）", 0, None, 0, step=100)
+    time_budget = col3.number_input("時間上限（秒，0 為不限）", 0, None, 0, step=10)
+    return {
+        "eta": eta,
+        "max_evals": max_evals or None,
+        "time_budget": time_budget or None,
+    }
+
+
+def get_walk_forward_options():
+    """滾動視窗驗證的 (訓練筆數, 測試筆數, 間隔)，未啟用時為 None"""
+    if not st.toggle(
+        "滾動視窗驗證",
+        value=False,
+        help="指標只在完整歷史上計算一次，再切出各視窗分別回測訓練與測試區間",
+    ):
+        return None
+    col1, col2, col3 = st.columns(3)
+    train = col1.number_input("訓練筆數", 1, None, 250)
+    test = col2.number_input("測試筆數", 1, None, 60)
+    step = col3.number_input("間隔（0 為與測試筆數相同）", 0, None, 0)
+    return (train, test, step or None)
+
+
+# 有工作在排隊或執行時，工作清單的更新間隔（秒）
+JOB_POLL_SECONDS = 2
+
+
+def _clock(seconds):
+    return time.strftime("%m-%d %H:%M:%S", time.localtime(seconds))
+
+
+def job_panel():
+    """背景工作清單：狀態與進度、取消執行中的工作、查看已完成工作的輸出"""
+    scheduler = job_scheduler()
+    jobs = scheduler.store.list()
+    active = jobs["status"].isin(ACTIVE)
+    if st.session_state.get("jobs_polling") and not active.any():
+        # 工作都結束了，整頁重新執行以更新結果並停止輪詢
+        st.session_state["jobs_polling"] = False
+        st.rerun()
+    st.session_state["jobs_polling"] = bool(active.any())
+    if jobs.empty:
+        return
+
+    st.write("回測工作")
+    now = time.time()
+    table = jobs[["job_id", "owner", "ticker", "status", "message"]].assign(
+        progress=(jobs["done"] / jobs["total"].where(jobs["total"] > 0)).fillna(0),
+        created=jobs["created"].map(_clock),
+        seconds=(jobs["finished"].fillna(now) - jobs["started"]).round(1),
+    )
+    st.dataframe(
+        table,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "progress": st.column_config.ProgressColumn(
+                "progress", min_value=0, max_value=1
+            )
+        },
+    )
+
+    col1, col2 = st.columns(2)
+    running = jobs.loc[active, "job_id"].tolist()
+    if running:
+        target = col1.selectbox("取消工作", running)
+        if col1.button("取消"):
+            scheduler.cancel(target)
+    finished = jobs.loc[jobs["status"] == DONE, "job_id"].tolist()
+    if finished:
+        job_id = col2.selectbox("查看工作結果", finished)
+        for name, frame in job_outputs(scheduler.store.get(job_id)).items():
+            with st.expander(f"{job_id} {name}"):
+                st.dataframe(frame, use_container_width=True, hide_index=True)
+
+
+def show_jobs():
+    """有工作在排隊或執行時定時更新工作清單，只重新執行清單本身"""
+    polling = job_scheduler().store.has_active()
+    st.fragment(job_panel, run_every=JOB_POLL_SECONDS if polling else None)()
+
+
 def main():
     st.subheader("濾網交易訊號")
-    ticker_list = sorted(set(read_folder_files("data")))
+    ticker_list = sorted(set(list_tickers("data")))
     if not ticker_list:
         st.stop()
 
     selected_ticker = st.selectbox("選擇股票代碼", ticker_list)
-    result_file_path = os.path.join("data", f"{selected_ticker}_strategy_results.csv")
-    default_params = load_existing_results(result_file_path)
+    default_params = load_existing_results(selected_ticker)
 
     ma_periods, rsi_periods, macd_params, willr_periods, kdj_params = get_user_inputs(
         default_params
@@ -126,26 +261,103 @@ def main():
         st.write("選擇的MACD參數:", macd_params)
         st.write("選擇的Williams %R週期:", willr_periods)
         st.write("選擇的KDJ參數:", kdj_params)
-    save_condition = st.number_input("儲存獲利因子大於", 0, 10, 4, 1)
 
-    if st.button("回測獲利因子", type="primary"):
-        file_path = os.path.join("data", f"{selected_ticker}_raw_data.csv")
+    col1, col2, col3, col4 = st.columns(4)
+    use_parallel = col1.toggle("平行運算", value=False)
+    workers = col2.number_input(
+        "程序數量", 1, default_workers(), default_workers(), disabled=not use_parallel
+    )
+    use_grid = col3.toggle(
+        "矩陣回測", value=False, help="一次求值一個區塊的參數組合，參數組合多時較快"
+    )
+    use_profiler = col4.toggle(
+        "記錄效能資料", value=False, help="只用於不在背景執行的回測"
+    )
+
+    combo_count = len(
+        build_param_grid(
+            ma_periods, rsi_periods, macd_params, willr_periods, kdj_params
+        )
+    )
+    search_options = get_search_options(combo_count)
+    walk_forward = get_walk_forward_options()
+
+    col1, col2 = st.columns(2)
+    in_background = col1.toggle(
+        "背景執行",
+        value=True,
+        help="送出到工作佇列，重新整理或切換頁面不會中斷，多位使用者可同時執行",
+    )
+    owner = col2.text_input("使用者名稱", key="job_owner", disabled=not in_background)
+
+    clicked = st.button("回測獲利因子", type="primary")
+    if clicked and in_background:
+        job_id = job_scheduler().submit(
+            {
+                "ticker": selected_ticker,
+                "ma": ma_periods,
+                "rsi": rsi_periods,
+                "macd": macd_params,
+                "willr": willr_periods,
+                "kdj": kdj_params,
+                "workers": workers if use_parallel else 1,
+                "grid": use_grid,
+                "walk_forward": walk_forward,
+                "search": search_options,
+            },
+            owner,
+        )
+        st.session_state["jobs_polling"] = True
+        st.success(f"已送出工作 {job_id}")
+    elif clicked:
+        profiler = start_profiling() if use_profiler else None
         try:
-            data = pd.read_csv(file_path)
-            with st.spinner("正在計算獲利因子..."):
+            data = load_raw_data(selected_ticker)
+            params = (ma_periods, rsi_periods, macd_params, willr_periods, kdj_params)
+            if search_options is None:
                 calculate_indicators(
                     selected_ticker,
                     data,
-                    ma_periods,
-                    rsi_periods,
-                    macd_params,
-                    willr_periods,
-                    kdj_params,
-                    save_condition,
+                    *params,
+                    workers=workers if use_parallel else 1,
+                    progress_callback=make_progress_callback(),
+                    grid=use_grid,
+                    walk_forward=walk_forward,
                 )
+                st.session_state["halving"] = None
+            else:
+                st.session_state["halving"] = optimize_indicators(
+                    selected_ticker,
+                    data,
+                    *params,
+                    **search_options,
+                    workers=workers if use_parallel else 1,
+                    progress_callback=make_progress_callback(),
+                    grid=use_grid,
+                    walk_forward=walk_forward,
+                )
+            invalidate()
             st.success("計算完成！")
         except Exception as e:
             st.error(f"處理數據時發生錯誤: {e}")
+        finally:
+            # 只停用這次回測啟用的記錄器，其他工作階段的記錄器不受影響
+            if profiler is not None:
+                stop_profiling(profiler)
+            # 保留到下一次回測，切換元件時不會消失
+            st.session_state["profiler"] = profiler
+
+    if st.session_state.get("halving") is not None:
+        results, rounds = st.session_state["halving"]
+        with st.expander("逐輪淘汰", expanded=True):
+            st.dataframe(rounds, use_container_width=True, hide_index=True)
+            st.write("留下的組合（另存，不取代完整網格的結果）")
+            st.dataframe(results, use_container_width=True, hide_index=True)
+
+    if st.session_state.get("profiler") is not None:
+        show_performance(st.session_state["profiler"])
+
+    show_jobs()
 
 
 main()
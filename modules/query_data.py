@@ -1,14 +1,18 @@
-import os
 import pandas as pd
 import streamlit as st
-from datetime import datetime
 from utils.yfinance_utils import get_data
-from utils.file_utils import read_folder_files
+from utils.data_access import invalidate, list_tickers, load_raw_data
+from utils.ingest_utils import (
+    delete_history,
+    load_manifest,
+    merge_history,
+    update_all_histories,
+)
 
 
 def main():
     st.subheader("歷史資料更新")
-    ticker_list = sorted(set(read_folder_files("data")))
+    ticker_list = sorted(set(list_tickers("data")))
 
     ticker_choice = st.selectbox("請選擇股票代號", ["新增股票代號"] + ticker_list)
     ticker = (
@@ -17,16 +21,19 @@ def main():
         else ticker_choice
     )
 
-    file_path = os.path.join("data", f"{ticker}_raw_data.csv")
     latest_date = pd.Timestamp("2020-01-01")
 
-    if os.path.exists(file_path):
-        data = pd.read_csv(file_path, parse_dates=["Date"])
+    # 顯示頁面時只讀取：儲存層讀取不轉換格式，舊資料建立摘要也留待下載或更新時進行
+    manifest = load_manifest(ticker)
+    data = load_raw_data(ticker)
+    if data is not None:
         with st.expander("檢視歷史資料"):
             st.dataframe(
                 data.sort_values("Date", ascending=False), use_container_width=True
             )
-        latest_date = data["Date"].max()
+        latest_date = (
+            manifest["last_date"] if manifest else pd.to_datetime(data["Date"]).max()
+        )
 
     start_date = st.date_input("起始日期", latest_date)
     end_date = st.date_input("結束日期", pd.Timestamp.now())
@@ -38,42 +45,36 @@ def main():
             with st.spinner("下載中..."):
                 data = get_data(ticker, start_date, end_date)
                 if not data.empty:
-                    data.to_csv(file_path, index=False)
-                    st.success("資料下載完成！")
+                    added = merge_history(ticker, data)
+                    invalidate()
+                    st.success(f"資料下載完成！新增 {added} 筆")
                 else:
                     st.warning("未獲取到新數據，請檢查股票代號或日期範圍！")
         except Exception as e:
             st.error(f"下載失敗: {e}")
 
     if col2.button("刪除歷史資料", type="primary"):
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if delete_history(ticker):
+            invalidate()
             st.success("歷史資料已刪除！")
         else:
             st.warning("文件不存在，無需刪除！")
 
     if col3.button("更新所有資料", type="secondary"):
+        with st.spinner("更新中..."):
+            report = update_all_histories(ticker_list, end_date)
+        invalidate()
         for ticker in ticker_list:
-            file_path = os.path.join("data", f"{ticker}_raw_data.csv")
-            if os.path.exists(file_path):
-                existing_data = pd.read_csv(file_path, parse_dates=["Date"])
-                latest_date = existing_data["Date"].max()
-                try:
-                    new_data = get_data(ticker, latest_date, end_date)
-                    if not new_data.empty:
-                        updated_data = (
-                            pd.concat([existing_data, new_data])
-                            .drop_duplicates(subset="Date")
-                            .sort_values("Date", ascending=False)
-                        )
-                        updated_data.to_csv(file_path, index=False)
-                        st.success(f"{ticker} 資料更新完成！")
-                    else:
-                        st.info(f"{ticker} 無新數據。")
-                except Exception as e:
-                    st.error(f"更新 {ticker} 失敗: {e}")
-            else:
+            if ticker not in report:
                 st.warning(f"{ticker} 的資料文件不存在，無法更新！")
+                continue
+            added, error = report[ticker]
+            if error:
+                st.error(f"更新 {ticker} 失敗: {error}")
+            elif added:
+                st.success(f"{ticker} 資料更新完成！新增 {added} 筆")
+            else:
+                st.info(f"{ticker} 無新數據。")
 
 
 main()
@@ -1,11 +1,11 @@
 import streamlit as st
 import yaml
-import os
 import pandas as pd
 from datetime import date, timedelta
 
-from utils.file_utils import read_folder_files
-from utils.signal_utils import SignalEvaluator
+from utils.signal_utils import SignalEvaluator, validate_config
+from utils.talib_utils import SIGNAL_COLUMNS
+from utils.data_access import list_tickers, load_raw_data, load_screen
 
 
 def parse_conditions(conditions):
@@ -43,6 +43,7 @@ def main():
 
     is_valid_yaml = True
     parsed_buy_yaml, parsed_sell_yaml = None, None
+    problems = []
 
     try:
         parsed_buy_yaml = yaml.safe_load(buy_yaml_text)
@@ -60,9 +61,17 @@ def main():
             f"賣出條件:\n{parse_conditions(parsed_sell_yaml.get('sell_signal', '無'))}",
             wrap_lines=True,
         )
+        # 儲存前先檢查運算符與欄位名稱
+        problems = validate_config(
+            {**parsed_buy_yaml, **parsed_sell_yaml}, SIGNAL_COLUMNS
+        )
+        for problem in problems:
+            st.warning(problem)
 
     if st.button("💾 儲存設定"):
-        if is_valid_yaml:
+        if problems:
+            st.error("❌ 無法儲存，請先修正信號條件！")
+        elif is_valid_yaml:
             config.update(parsed_buy_yaml)
             config.update(parsed_sell_yaml)
             evaluator.save_yaml_config(config)
@@ -72,20 +81,44 @@ def main():
 
     st.subheader("📈 測試市場數據")
     c1, c2, c3 = st.columns(3)
-    ticker_list = sorted(set(read_folder_files("data")))
+    ticker_list = sorted(set(list_tickers("data")))
     ticker = c1.selectbox("請選擇股票代號", ticker_list)
     start_date = pd.to_datetime(
         c2.date_input("請選擇開始日期", date.today() - timedelta(days=365))
     )
     end_date = pd.to_datetime(c3.date_input("請選擇結束日期", date.today()))
 
-    file_path = os.path.join("data", f"{ticker}_raw_data.csv")
-    if os.path.exists(file_path):
-        df = pd.read_csv(file_path)
-        df["Date"] = pd.to_datetime(df["Date"])
+    df = load_raw_data(ticker)
+    if df is not None:
         df = df[(df["Date"] >= start_date) & (df["Date"] <= end_date)]
         with st.expander(f"{ticker} 近期交易紀錄"):
             st.dataframe(df, use_container_width=True)
 
+    show_screener()
+
+
+def show_screener():
+    """以目前儲存的信號設定掃描所有股票最新一根 K 棒"""
+    st.subheader("🔎 全市場信號掃描")
+    c1, c2 = st.columns(2)
+    use_best = c1.toggle("使用各股票獲利因子最高的回測參數", value=False)
+    only_signals = c2.toggle("只顯示有信號的股票", value=False)
+
+    if st.button("掃描最新一根 K 棒"):
+        with st.spinner("掃描中..."):
+            st.session_state["screen"] = load_screen(use_best)
+
+    if st.session_state.get("screen") is not None:
+        table, errors = st.session_state["screen"]
+        if only_signals:
+            table = table[table["Buy"] | table["Sell"]]
+        st.caption(
+            f"買入 {int(table['Buy'].sum())} 檔，賣出 {int(table['Sell'].sum())} 檔"
+        )
+        st.dataframe(table, use_container_width=True, hide_index=True)
+        if errors:
+            with st.expander(f"{len(errors)} 檔無法掃描"):
+                st.write(errors)
+
 
 main()
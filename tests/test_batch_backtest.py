@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+import yaml
+
+import batch_backtest
+from tests.test_streaming_utils import synthetic_bars
+from tests.test_talib_utils import SIGNALS
+from utils.results_index import ResultsIndex
+from utils.storage import get_storage, raw_data_name, strategy_results_name
+
+pytest.importorskip("talib")
+
+GRID_ARGS = ["--ma", "5,20", "--rsi", "14", "--macd", "12,26,9", "--willr", "14"]
+GRID_ARGS += ["--kdj", "9,3,3;14,3,3", "--workers", "1"]
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """在暫存資料夾執行，data、signals.yaml 與快取都不碰到專案本身"""
+    monkeypatch.chdir(tmp_path)
+    with open("signals.yaml", "w", encoding="utf-8") as file:
+        yaml.dump(SIGNALS, file)
+    storage = get_storage("data")
+    storage.write(raw_data_name("AAA"), synthetic_bars(300, seed=1))
+    storage.write(raw_data_name("BBB"), synthetic_bars(300, seed=2))
+    return tmp_path
+
+
+def test_cli_backtests_every_ticker_and_writes_summary(workspace, capsys):
+    output = workspace / "out" / "summary.csv"
+    batch_backtest.main([*GRID_ARGS, "--output", str(output)])
+
+    summary = pd.read_csv(output)
+    assert len(summary) == 2 * 4
+    assert set(summary["Ticker"]) == {"AAA", "BBB"}
+    assert summary["Profit Factor"].is_monotonic_decreasing
+    assert "彙總結果已儲存至" in capsys.readouterr().out
+
+    storage = get_storage("data")
+    for ticker in ("AAA", "BBB"):
+        saved = storage.read(strategy_results_name(ticker))
+        assert len(saved) == 4
+    assert len(ResultsIndex().query()) == 2 * 4
+
+
+def test_unreadable_ticker_is_skipped(workspace, capsys):
+    output = workspace / "summary.csv"
+    summary = batch_backtest.run_batch(
+        ["AAA", "ZZZ"],
+        batch_backtest.build_param_grid([5], [14], [(12, 26, 9)], [14], [(9, 3, 3)]),
+        output=str(output),
+    )
+    assert list(summary["Ticker"]) == ["AAA"]
+    assert "讀取 ZZZ 失敗" in capsys.readouterr().out
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.batch_indicators import (
+    BATCH_INDICATORS,
+    batch_indicator_columns,
+    use_batch_kernel,
+    verify_against_talib,
+)
+from utils.indicator_cache import IndicatorCache
+from utils.talib_utils import INDICATORS, get_indicator_columns, prefetch_indicators
+
+pytest.importorskip("talib")
+
+PARAMS = {
+    "MA": [(5,), (20,), (60,)],
+    "RSI": [(5,), (14,), (60,)],
+    "WILLR": [(5,), (14,), (60,)],
+    "KDJ": [(9, 3, 3), (18, 3, 3), (36, 3, 3), (14, 5, 2)],
+    "MACD": [(12, 26, 9), (5, 34, 5), (48, 104, 9)],
+}
+
+
+def bars(periods, leading_nan=0, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    spread = rng.uniform(0.1, 2.0, periods)
+    data = pd.DataFrame(
+        {
+            "Date": pd.bdate_range("2020-01-01", periods=periods),
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+        }
+    )
+    data.loc[: leading_nan - 1, ["High", "Low", "Close"]] = np.nan
+    return data
+
+
+# 一般長度、剛好夠長、短序列（部分參數的週期大於資料筆數）、前段為 NaN
+CASES = {
+    "long": bars(500),
+    "exact": bars(60),
+    "short": bars(12),
+    "leading_nan": bars(300, leading_nan=25),
+    # 只有最高價開頭缺值：MA、RSI 只用收盤價，不應受影響
+    "leading_high_nan": bars(300).assign(
+        High=lambda df: df["High"].where(df.index >= 7)
+    ),
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("indicator", BATCH_INDICATORS)
+def test_batch_kernel_matches_talib(indicator, case):
+    verify_against_talib(CASES[case], indicator, PARAMS[indicator])
+
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("indicator", PARAMS)
+def test_prefetched_columns_match_talib(indicator, case):
+    """預先計算後由快取取得的欄位與 TA-Lib 逐組計算相同，沒有批次核心的 MACD 也一樣"""
+    data = CASES[case]
+    cache = IndicatorCache()
+    specs = [(indicator, params) for params in PARAMS[indicator]]
+    prefetch_indicators("T", data, specs, cache=cache)
+
+    func, columns = INDICATORS[indicator]
+    for params in PARAMS[indicator]:
+        actual = get_indicator_columns("T", data, indicator, params, cache=cache)
+        expected = func(data[["High", "Low", "Close"]].copy(), *params)
+        for column in columns:
+            np.testing.assert_allclose(
+                actual[column], expected[column].to_numpy(float), atol=1e-8
+            )
+
+
+def test_macd_has_no_batch_kernel():
+    assert not use_batch_kernel("MACD", 500)
+    with pytest.raises(KeyError):
+        batch_indicator_columns(CASES["long"], "MACD", PARAMS["MACD"])
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.run_benchmarks import compare_with_baseline, main
+from benchmarks.synthetic import generate_ohlcv, generate_universe
+
+
+def record(stage, items_per_sec, peak_mb, bars=1000):
+    return {
+        "stage": stage,
+        "bars": bars,
+        "tickers": 2,
+        "items_per_sec": items_per_sec,
+        "peak_mb": peak_mb,
+    }
+
+
+def test_synthetic_bars_are_reproducible_and_consistent():
+    data = generate_ohlcv(2000, seed=3)
+    pd.testing.assert_frame_equal(data, generate_ohlcv(2000, seed=3))
+    assert not data.equals(generate_ohlcv(2000, seed=4))
+    assert (data["High"] >= data[["Open", "Close"]].max(axis=1)).all()
+    assert (data["Low"] <= data[["Open", "Close"]].min(axis=1)).all()
+    assert data["Date"].is_monotonic_increasing
+    # 均值回歸的價格不會隨長度發散
+    assert np.all(np.isfinite(generate_ohlcv(200_000)["Close"]))
+
+    universe = generate_universe(3, 100)
+    assert list(universe) == ["SYN0000", "SYN0001", "SYN0002"]
+    assert not universe["SYN0000"].equals(universe["SYN0001"])
+
+
+def test_regressions_beyond_tolerance_are_reported():
+    baseline = {
+        "results": [
+            record("backtest", 100.0, 50.0),
+            record("indicators", 100.0, 0.2),
+        ]
+    }
+    records = [
+        record("backtest", 85.0, 59.0),  # 都在 20% 以內
+        record("indicators", 70.0, 1.0),  # 吞吐量退步，記憶體只多不到 1 MB
+        record("backtest", 1.0, 500.0, bars=5000),  # 基準沒有的項目不比較
+    ]
+    assert compare_with_baseline(records, baseline, tolerance=0.2) == [
+        "indicators@1000x2 吞吐量 100.0 -> 70.0 /秒"
+    ]
+    regressions = compare_with_baseline(
+        [record("backtest", 100.0, 80.0)], baseline, 0.2
+    )
+    assert regressions == ["backtest@1000x2 峰值記憶體 50.0 -> 80.0 MB"]
+
+
+def test_cli_writes_report_and_fails_on_regression(tmp_path, monkeypatch):
+    pytest.importorskip("talib")
+    output = tmp_path / "latest.json"
+    args = ["--bars", "300", "--tickers", "1", "--min-time", "0", "--no-memory"]
+    args += ["--ma", "5", "--rsi", "14", "--willr", "14", "--output", str(output)]
+    assert main(args) == 0
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    stages = {result["stage"] for result in report["results"]}
+    assert {"indicators", "backtest", "backtest_grid"} <= stages
+
+    # 基準的吞吐量遠高於實際時視為退步
+    for result in report["results"]:
+        result["items_per_sec"] *= 100
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(report), encoding="utf-8")
+    assert main([*args, "--baseline", str(baseline)]) == 1
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from utils import data_access
+from utils.storage import get_storage
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """記錄實際從儲存層讀取的資料表與資料夾掃描"""
+    data_access.invalidate()
+    names = []
+
+    class Counting:
+        def __init__(self, folder):
+            self.storage = get_storage(folder)
+
+        def __getattr__(self, attr):
+            return getattr(self.storage, attr)
+
+        def read(self, name):
+            names.append(name)
+            return self.storage.read(name)
+
+        def list_tickers(self):
+            names.append("list_tickers")
+            return self.storage.list_tickers()
+
+    monkeypatch.setattr(data_access, "get_storage", Counting)
+    yield names
+    data_access.invalidate()
+
+
+def bars(count):
+    return pd.DataFrame(
+        {"Date": pd.bdate_range("2024-01-01", periods=count), "Close": range(count)}
+    )
+
+
+def test_table_is_read_again_only_after_rewrite(tmp_path, reads):
+    folder = str(tmp_path)
+    storage = get_storage(folder)
+    storage.write("AAA_raw_data", bars(3))
+
+    first = data_access.load_table(folder, "AAA_raw_data")
+    second = data_access.load_table(folder, "AAA_raw_data")
+    assert reads == ["AAA_raw_data"]
+    pd.testing.assert_frame_equal(first, second)
+
+    storage.write("AAA_raw_data", bars(5))
+    assert len(data_access.load_table(folder, "AAA_raw_data")) == 5
+    assert reads == ["AAA_raw_data"] * 2
+    assert data_access.load_table(folder, "missing") is None
+
+
+def test_ticker_list_is_rescanned_when_folder_changes(tmp_path, reads):
+    folder = str(tmp_path)
+    storage = get_storage(folder)
+    storage.write("AAA_raw_data", bars(3))
+    assert data_access.list_tickers(folder) == ["AAA"]
+    assert data_access.list_tickers(folder) == ["AAA"]
+    assert reads == ["list_tickers"]
+
+    storage.write("BBB_raw_data", bars(3))
+    assert data_access.list_tickers(folder) == ["AAA", "BBB"]
+    assert reads == ["list_tickers"] * 2
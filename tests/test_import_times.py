@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import subprocess
+
+import pytest
+
+from benchmarks.import_times import ROOT, page_imports, parse_importtime
+
+# 各頁面匯入時都不應載入的套件，只在用到的功能中才匯入
+DEFERRED = ["talib", "yfinance"]
+# 只讀取資料的頁面也不需要回測、掃描與背景工作的模組
+READ_ONLY_DEFERRED = [*DEFERRED, "utils.talib_utils", "utils.jobs", "utils.screener"]
+
+
+def loaded_after_import(page, candidates):
+    """在新的直譯器中匯入頁面頂層 import 的模組，回傳 candidates 中已載入的模組"""
+    code = "\n".join(f"import {module}" for module in page_imports(page))
+    code += f"\nimport sys\nprint([m for m in {candidates!r} if m in sys.modules])"
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    assert completed.returncode == 0, completed.stderr
+    return completed.stdout.strip().splitlines()[-1]
+
+
+@pytest.mark.parametrize(
+    "page, deferred",
+    [
+        ("modules/query_data.py", READ_ONLY_DEFERRED),
+        ("modules/data_analysis.py", READ_ONLY_DEFERRED),
+        ("modules/signal_definition.py", DEFERRED),
+        ("modules/futures_filter.py", DEFERRED),
+    ],
+)
+def test_pages_do_not_import_deferred_packages(page, deferred):
+    assert loaded_after_import(os.path.join(ROOT, page), deferred) == "[]"
+
+
+def test_page_imports_lists_top_level_modules(tmp_path):
+    page = tmp_path / "page.py"
+    page.write_text(
+        "import os, json\n"
+        "from utils.storage import get_storage\n"
+        "from . import sibling\n"
+        "import os\n"
+        "def main():\n"
+        "    import talib\n",
+        encoding="utf-8",
+    )
+    assert page_imports(str(page)) == ["os", "json", "utils.storage"]
+
+
+def test_parse_importtime_sums_self_time_per_package():
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |   pandas._libs",
+            "import time:       300 |        400 | pandas",
+            "import time:        50 |         50 |   utils.profiler",
+            "import time:        20 |         70 | utils.signal_utils",
+            "some other line",
+        ]
+    )
+    total, packages = parse_importtime(stderr)
+    assert total == 470
+    assert packages == {"pandas": 400, "utils.profiler": 50, "utils.signal_utils": 20}
+
+
+def test_app_pages_exist():
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as file:
+        pages = re.findall(r'st\.Page\(\s*"([^"]+)"', file.read())
+    assert len(pages) == 4
+    for page in pages:
+        assert os.path.isfile(os.path.join(ROOT, page)), page
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from tests.test_streaming_utils import synthetic_bars
+from utils.indicator_cache import IndicatorCache, data_fingerprint
+from utils.talib_utils import get_indicator_columns
+
+pytest.importorskip("talib")
+
+
+def test_hit_for_same_data_and_miss_after_change():
+    cache = IndicatorCache()
+    data = synthetic_bars(200)
+
+    first = get_indicator_columns("AAA", data, "MA", (20,), cache=cache)
+    again = get_indicator_columns("AAA", data.copy(), "MA", (20,), cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert again["MA"] is first["MA"]
+    assert not first["MA"].flags.writeable
+
+    # 其他參數與改過的資料都要重新計算
+    get_indicator_columns("AAA", data, "MA", (10,), cache=cache)
+    changed = data.copy()
+    changed.loc[150, "Close"] += 1.0
+    assert data_fingerprint(changed) != data_fingerprint(data)
+    updated = get_indicator_columns("AAA", changed, "MA", (20,), cache=cache)
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert updated["MA"][150] != first["MA"][150]
+    np.testing.assert_array_equal(updated["MA"][:150], first["MA"][:150])
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = IndicatorCache(max_entries=2)
+    cache.get_or_compute("a", lambda: {"x": np.zeros(1)})
+    cache.get_or_compute("b", lambda: {"x": np.zeros(1)})
+    cache.get_or_compute("a", lambda: {"x": np.ones(1)})
+    cache.get_or_compute("c", lambda: {"x": np.zeros(1)})
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert len(cache) == 2
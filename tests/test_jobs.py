@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from tests.test_batch_backtest import workspace  # noqa: F401
+from tests.test_talib_utils import SIGNALS
+from utils import jobs
+from utils.jobs import (
+    CANCELLED,
+    DONE,
+    INTERRUPTED,
+    QUEUED,
+    RUNNING,
+    JobScheduler,
+    JobStore,
+)
+from utils.results_index import ResultsIndex
+
+
+def wait_for(store, job_id, statuses, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"{job_id} 停在 {store.get(job_id)['status']}")
+
+
+def scheduler(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    return JobScheduler(store, folder=str(tmp_path / "jobs"))
+
+
+def test_cancel_stops_running_job(tmp_path, monkeypatch):
+    def endless(params, output, progress_callback):
+        done = 0
+        while True:
+            done += 1
+            progress_callback(done, 10**9)
+            time.sleep(0.01)
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "endless", endless)
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 0)
+    runner = scheduler(tmp_path)
+    job_id = runner.submit({"signals": SIGNALS}, kind="endless")
+    wait_for(runner.store, job_id, {RUNNING})
+
+    assert runner.cancel(job_id)
+    job = wait_for(runner.store, job_id, {CANCELLED})
+    assert job["done"] > 0 and job["finished"] is not None
+    # 已結束的工作不能再取消
+    assert not runner.cancel(job_id)
+
+
+def test_backtest_job_publishes_results(workspace):  # noqa: F811
+    pytest.importorskip("talib")
+    runner = JobScheduler()
+    params = {"ticker": "AAA", "ma": [5, 20], "rsi": [14], "macd": [[12, 26, 9]]}
+    params.update({"willr": [14], "kdj": [[9, 3, 3]], "signals": SIGNALS})
+    job_id = runner.submit(params, owner="tester")
+
+    job = wait_for(runner.store, job_id, {DONE}, timeout=60)
+    assert job["message"] == "2 組結果"
+    assert set(jobs.job_outputs(job)) == {"results"}
+    assert len(ResultsIndex().query(["AAA"])) == 2
+
+
+def test_only_orphaned_jobs_are_interrupted(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    for job_id in ("mine", "other", "dead", "reused"):
+        store.create(job_id, "backtest", "", "AAA", {}, str(tmp_path / job_id))
+    # 另一個仍在執行的程序、已結束的程序、以及與本程序 ID 相同的舊程序
+    store.update("other", pid=os.getppid(), process="other")
+    store.update("dead", pid=2**22 + 12345, process="dead", status=RUNNING)
+    store.update("reused", process="old-server")
+
+    assert sorted(store.interrupt_orphaned()) == ["dead", "reused"]
+    assert store.get("dead")["message"] == "執行的程序已結束"
+
+    # 重新建立佇列（例如 Streamlit 清除資源快取）不影響仍在執行的工作
+    JobScheduler(store)
+    statuses = {job_id: store.get(job_id)["status"] for job_id in ("mine", "other")}
+    assert statuses == {"mine": QUEUED, "other": QUEUED}
+    assert store.get("reused")["status"] == INTERRUPTED
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from tests.test_batch_backtest import workspace  # noqa: F401
+from tests.test_streaming_utils import synthetic_bars
+from tests.test_talib_utils import SIGNALS
+from utils.optimizer import halving_schedule, optimize_indicators, successive_halving
+from utils.results_index import ResultsIndex
+from utils.storage import (
+    get_storage,
+    halving_results_name,
+    raw_data_name,
+    strategy_results_name,
+)
+from utils.talib_utils import build_param_grid, calculate_indicators
+
+pytest.importorskip("talib")
+
+PARAMS = ([5, 10, 20], [5, 14, 20], [(12, 26, 9)], [5, 14, 20], [(9, 3, 3)])
+
+
+def run(time_budget=None):
+    progress = []
+    rows, rounds = successive_halving(
+        "AAA",
+        synthetic_bars(3000, seed=1),
+        build_param_grid(*PARAMS),
+        time_budget=time_budget,
+        progress_callback=lambda done, total: progress.append((done, total)),
+        signals=SIGNALS,
+    )
+    return rows, rounds, progress
+
+
+def test_rounds_follow_schedule(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    schedule = halving_schedule(3000, 27)
+    assert schedule == [(334, 27), (1000, 9), (3000, 3)]
+
+    rows, rounds, progress = run()
+    assert list(rounds["Bars"]) == [bars for bars, _ in schedule]
+    assert list(rounds["Combos"]) == [count for _, count in schedule]
+    assert len(rows) == 3
+    assert progress[-1] == (39, 39)
+
+
+def test_time_budget_stops_inside_a_round(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows, rounds, progress = run(time_budget=1e-9)
+
+    # 第一輪在第一次回報進度時就中止，直接以完整歷史回測最後要留下的組數
+    assert list(rounds["Round"]) == [3]
+    assert list(rounds["Bars"]) == [3000]
+    assert len(rows) == 3
+    assert progress[0] == (1, 39)
+    assert progress[-1][0] == progress[-1][1] == 4
+
+
+def test_halving_results_do_not_replace_full_grid(workspace):  # noqa: F811
+    storage = get_storage("data")
+    data = storage.read(raw_data_name("AAA"))
+    calculate_indicators("AAA", data, *PARAMS)
+    full = storage.read(strategy_results_name("AAA"))
+    version = ResultsIndex().version()
+
+    results, rounds = optimize_indicators("AAA", data, *PARAMS)
+    assert len(full) == 27 and len(results) == rounds["Combos"].iloc[-1]
+    pd.testing.assert_frame_equal(storage.read(strategy_results_name("AAA")), full)
+    assert ResultsIndex().version() == version
+    assert len(ResultsIndex().query(["AAA"])) == 27
+    saved = storage.read(halving_results_name("AAA"))
+    assert (
+        saved["Profit Factor"].is_monotonic_decreasing
+        or saved["Profit Factor"].isna().any()
+    )
+    assert len(saved) == len(results)
@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils.plotly_utils import build_fast_chart, downsample_frame
+from utils.talib_utils import build_combo_detail
+
+pytest.importorskip("talib")
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data", "2330.TW_raw_data.csv")
+
+
+def test_fast_chart_has_macd_row():
+    data = pd.read_csv(DATA, parse_dates=["Date"])
+    detail = build_combo_detail("2330.TW", data, (20, 14, (12, 26, 9), 14, (9, 3, 3)))
+
+    fig = build_fast_chart(downsample_frame(detail, points=200))
+
+    names = [trace.name for trace in fig.data]
+    assert "MACD_Hist" in names and "RSI" in names
+    macd = fig.data[names.index("MACD_Hist")]
+    assert macd.yaxis == "y3"
+    assert fig.layout.yaxis3.title.text == "MACD_Hist"
@@ -0,0 +1,60 @@
+import threading
+
+from utils.profiler import get_profiler, profile_stage, start_profiling, stop_profiling
+
+
+def run_stages(name, depth, barrier):
+    """巢狀記錄 depth 層，每層等所有執行緒到齊後再進入下一層"""
+    if depth == 0:
+        return
+    with profile_stage(name, depth=depth):
+        barrier.wait()
+        run_stages(name, depth - 1, barrier)
+
+
+def test_profilers_are_per_thread():
+    barrier = threading.Barrier(3)
+    profilers = {}
+
+    def profiled(name):
+        profiler = start_profiling()
+        try:
+            run_stages(name, 3, barrier)
+        finally:
+            profilers[name] = stop_profiling(profiler)
+
+    def plain():
+        # 未啟用記錄的執行緒不會記錄、也不會停用其他執行緒的記錄器
+        assert get_profiler() is None
+        run_stages("plain", 3, barrier)
+        assert stop_profiling() is None
+
+    threads = [
+        threading.Thread(target=profiled, args=("a",)),
+        threading.Thread(target=profiled, args=("b",)),
+        threading.Thread(target=plain),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name, profiler in profilers.items():
+        events = {event["id"]: event for event in profiler.events}
+        assert {event["name"] for event in events.values()} == {name}
+        by_depth = {event["args"]["depth"]: event for event in events.values()}
+        assert by_depth[3]["parent"] is None
+        assert by_depth[2]["parent"] == by_depth[3]["id"]
+        assert by_depth[1]["parent"] == by_depth[2]["id"]
+
+
+def test_stop_only_the_given_profiler():
+    outer = start_profiling()
+    inner = start_profiling()
+    assert stop_profiling(outer) is None
+    assert get_profiler() is inner
+
+    assert stop_profiling(inner) is inner
+    assert get_profiler() is outer
+    assert stop_profiling(outer) is outer
+    assert get_profiler() is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tests.test_streaming_utils import synthetic_bars
+from tests.test_talib_utils import COMBOS, SIGNALS, assert_same_rows
+from utils import talib_utils
+from utils.result_cache import ResultCache, combo_key
+
+pytest.importorskip("talib")
+
+
+@pytest.fixture
+def computed(tmp_path, monkeypatch):
+    """在暫存資料夾執行，並記錄實際回測的 (ticker, 參數組合)"""
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    original = talib_utils.backtest_chunk
+
+    def spy(shared, chunk):
+        calls.extend(chunk)
+        return original(shared, chunk)
+
+    monkeypatch.setattr(talib_utils, "backtest_chunk", spy)
+    return calls
+
+
+def test_unchanged_combos_come_from_cache(computed):
+    datasets = {"AAA": synthetic_bars(300, seed=1), "BBB": synthetic_bars(300, seed=2)}
+    first = talib_utils.run_backtests(datasets, COMBOS, signals=SIGNALS)
+    assert len(computed) == 2 * len(COMBOS)
+
+    computed.clear()
+    again = talib_utils.run_backtests(datasets, COMBOS, signals=SIGNALS)
+    assert computed == []
+    assert_same_rows(again, first)
+
+    # 只有資料變動的股票重新回測
+    changed = dict(datasets, BBB=datasets["BBB"].assign(Close=lambda df: df.Close + 1))
+    talib_utils.run_backtests(changed, COMBOS, signals=SIGNALS)
+    assert {ticker for ticker, _ in computed} == {"BBB"}
+
+    # 信號設定變動時全部重新回測
+    computed.clear()
+    signals = {**SIGNALS, "sell_signal": {"or": [{"K": "> 90"}]}}
+    talib_utils.run_backtests(datasets, COMBOS, signals=signals)
+    assert len(computed) == 2 * len(COMBOS)
+
+
+def test_round_trip_and_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"), max_entries=2)
+    combos = COMBOS[:3]
+    rows = [{"Profit Factor": np.float64(1.5), "Count": np.int64(3)}] * 2
+    rows.append({"Profit Factor": np.nan, "Count": 0})
+    cache.put_many("AAA", "data", "signals", list(zip(combos[:2], rows[:2])))
+    # 讀取過的項目較新，不會先被淘汰
+    assert cache.get_many("AAA", "data", "signals", combos[:1])
+    cache.put_many("AAA", "data", "signals", [(combos[2], rows[2])])
+
+    found = cache.get_many("AAA", "data", "signals", combos)
+    assert set(found) == {combo_key(combos[0]), combo_key(combos[2])}
+    assert found[combo_key(combos[0])] == {"Profit Factor": 1.5, "Count": 3}
+    assert pd.isna(found[combo_key(combos[2])]["Profit Factor"])
+    assert cache.get_many("AAA", "other", "signals", combos) == {}
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pandas as pd
+
+from utils.results_index import ResultsIndex
+from utils.storage import CsvStorage
+
+
+def result_rows(profit_factor):
+    return [
+        {
+            "MA": ma,
+            "RSI": 14,
+            "MACD": "(12,26,9)",
+            "WILLR": 14,
+            "KDJ": "(9,3,3)",
+            "Gross Profit": 10.0,
+            "Gross Loss": 5.0,
+            "Profit Factor": profit_factor + ma / 100,
+            "Count": 12,
+        }
+        for ma in (5, 10, 20)
+    ]
+
+
+def test_sync_skips_tables_without_history(tmp_path):
+    storage = CsvStorage(tmp_path / "data")
+    bars = pd.DataFrame({"Date": pd.bdate_range("2024-01-01", periods=3)})
+    for ticker in ("AAA", "BBB"):
+        storage.write(f"{ticker}_raw_data", bars)
+        storage.write(f"{ticker}_strategy_results", pd.DataFrame(result_rows(1.0)))
+    # 批次回測的彙總表也以 _strategy_results 結尾，但不是股票
+    summary = pd.DataFrame(result_rows(9.0)).assign(Ticker="AAA")
+    storage.write("all_strategy_results", summary)
+
+    index = ResultsIndex(str(tmp_path / "index.sqlite"))
+    index.record_run("all", summary)
+    assert index.sync_from_storage(storage) == ["AAA", "BBB"]
+
+    assert index.tickers() == ["AAA", "BBB"]
+    assert sorted(index.best_per_ticker()["Ticker"]) == ["AAA", "BBB"]
+    assert set(index.query()["Ticker"]) == {"AAA", "BBB"}
+
+
+def walk_forward_rows():
+    return [
+        dict(row, **{"Windows": 4, "Test Count": 3, "Profitable Windows": 0.75})
+        for row in result_rows(1.0)
+    ]
+
+
+def column_type(path, column):
+    with sqlite3.connect(path) as conn:
+        for _, name, declared, *_ in conn.execute("PRAGMA table_info(results)"):
+            if name == column:
+                return declared
+
+
+def test_profitable_windows_is_real(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    index = ResultsIndex(path)
+    index.record_run("AAA", walk_forward_rows())
+
+    assert column_type(path, "profitable_windows") == "REAL"
+    frame = index.query()
+    assert (frame["Profitable Windows"] == 0.75).all()
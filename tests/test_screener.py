@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import utils.screener as screener
+from utils.ingest_utils import append_history, merge_history
+from utils.storage import get_storage, raw_data_name
+from utils.talib_utils import IndicatorCache, INDICATORS
+from tests.test_streaming_utils import synthetic_bars
+
+pytest.importorskip("talib")
+
+SIGNALS = {
+    "buy_signal": {"or": [{"K": "crosses_above D"}, {"MACD_Hist[1]": "< 0"}]},
+    "sell_signal": {"and": [{"K": "> 80"}, {"RSI": "> 50"}]},
+}
+
+
+def full_history_signals(data, combo):
+    """以完整歷史的 TA-Lib 指標逐欄求值，作為掃描結果的對照"""
+    from utils.signal_utils import evaluator_for_config
+    from utils.talib_utils import combo_indicator_params
+
+    columns = {"Close": data["Close"].to_numpy(float)}
+    for indicator, params in combo_indicator_params(combo):
+        func, names = INDICATORS[indicator]
+        frame = func(data[["High", "Low", "Close"]].copy(), *params)
+        columns.update({name: frame[name].to_numpy() for name in names})
+    evaluator = evaluator_for_config(SIGNALS)
+    return evaluator.buy_mask(columns)[-1], evaluator.sell_mask(columns)[-1]
+
+
+def test_screen_reads_stream_state(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    data = {ticker: synthetic_bars(600, seed) for seed, ticker in enumerate("AB")}
+    for ticker, bars in data.items():
+        merge_history(ticker, bars.iloc[:550], folder)
+        append_history(ticker, bars.iloc[550:], folder)
+    # 沒有串流狀態的股票（直接寫入的舊資料）才以 TA-Lib 重算
+    get_storage(folder).write(raw_data_name("C"), synthetic_bars(600, 7))
+    data["C"] = synthetic_bars(600, 7)
+
+    computed = []
+    original = screener.get_indicator_columns
+
+    def spy(ticker, *args, **kwargs):
+        computed.append(ticker)
+        return original(ticker, *args, cache=IndicatorCache(), **kwargs)
+
+    monkeypatch.setattr(screener, "get_indicator_columns", spy)
+    table, errors = screener.screen_universe(
+        ["A", "B", "C"], folder=folder, signals=SIGNALS
+    )
+
+    assert errors == {}
+    assert set(computed) == {"C"}
+    table = table.set_index("Ticker")
+    assert table.loc[["A", "B"], "Source"].eq("state").all()
+    assert table.loc["C", "Source"] == "talib"
+    for ticker, bars in data.items():
+        buy, sell = full_history_signals(bars, screener.DEFAULT_COMBO)
+        assert table.loc[ticker, "Buy"] == buy
+        assert table.loc[ticker, "Sell"] == sell
+        assert table.loc[ticker, "Date"] == bars["Date"].iloc[-1]
+
+
+def test_stale_state_falls_back(tmp_path):
+    folder = str(tmp_path)
+    bars = synthetic_bars(300)
+    merge_history("A", bars.iloc[:250], folder)
+    # 繞過匯入流程改寫歷史，狀態的最後日期不再是最新
+    get_storage(folder).write(raw_data_name("A"), bars)
+
+    table, _ = screener.screen_universe(["A"], folder=folder, signals=SIGNALS)
+
+    assert table["Source"].tolist() == ["talib"]
+    buy, sell = full_history_signals(bars, screener.DEFAULT_COMBO)
+    assert table["Buy"].iloc[0] == buy and table["Sell"].iloc[0] == np.bool_(sell)
@@ -0,0 +1,181 @@
+import os
+import operator as op
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.signal_utils import (
+    Column,
+    Comparison,
+    Constant,
+    SignalEvaluator,
+    compile_node,
+    evaluator_for_config,
+    load_signals,
+    max_lookback,
+    parse_condition,
+    parse_logic,
+    referenced_columns,
+    validate_config,
+)
+
+CONFIG = {
+    "buy_signal": {
+        "or": [
+            {"and": [{"Close": "> 100"}, {"RSI": "< 30"}]},
+            {"and": [{"MACD_Diff": "> 0"}, {"WILLR": "< -80"}]},
+            {"J": "< 0"},
+        ]
+    },
+    "sell_signal": {
+        "or": [
+            {"and": [{"RSI": "> 70"}, {"K": "= 50"}]},
+            {"J": "> 100"},
+        ]
+    },
+}
+
+# 逐筆迴圈版本使用的運算符，與向量化前的 evaluate_condition 相同
+ROW_OPERATORS = {">": op.gt, "<": op.lt, "=": op.eq}
+
+
+def row_signal(logic, row):
+    """向量化前的逐筆求值，作為比對基準"""
+    if "or" in logic:
+        return any(row_signal(cond, row) for cond in logic["or"])
+    if "and" in logic:
+        return all(row_signal(cond, row) for cond in logic["and"])
+    key, text = list(logic.items())[0]
+    operator, value = text.split()
+    return bool(ROW_OPERATORS[operator](row[key], float(value)))
+
+
+def random_columns(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(
+        {
+            "Close": rng.normal(100, 5, n),
+            "RSI": rng.uniform(0, 100, n),
+            "MACD_Diff": rng.normal(0, 1, n),
+            "WILLR": rng.uniform(-100, 0, n),
+            "K": rng.choice([20.0, 50.0, 80.0], n),
+            "J": rng.normal(50, 40, n),
+        }
+    )
+    # 指標開頭的 NaN 與逐筆比較相同，一律不成立
+    frame.loc[:19, ["RSI", "J"]] = np.nan
+    return frame
+
+
+def test_masks_match_row_loop():
+    evaluator = SignalEvaluator(config=CONFIG)
+    frame = random_columns()
+    columns = {name: frame[name].to_numpy() for name in frame}
+
+    buy = evaluator.buy_mask(columns)
+    sell = evaluator.sell_mask(columns)
+
+    rows = [row for _, row in frame.iterrows()]
+    expected_buy = [row_signal(CONFIG["buy_signal"], row) for row in rows]
+    expected_sell = [row_signal(CONFIG["sell_signal"], row) for row in rows]
+    assert buy.dtype == bool and sell.dtype == bool
+    np.testing.assert_array_equal(buy, expected_buy)
+    np.testing.assert_array_equal(sell, expected_sell)
+    assert buy.any() and sell.any()
+    # 單筆判斷與整段的遮罩一致
+    assert [evaluator.is_buy_signal(row) for row in rows[:50]] == expected_buy[:50]
+
+
+def test_empty_or_never_fires():
+    evaluator = SignalEvaluator(
+        config={"buy_signal": {"or": []}, "sell_signal": {"and": []}}
+    )
+    columns = {"Close": np.arange(5.0)}
+    assert not evaluator.buy_mask(columns).any()
+    assert evaluator.sell_mask(columns).all()
+
+
+def test_cross_with_lookback_parses_and_compiles():
+    node = parse_condition({"K[2]": "crosses_above D"})
+    assert node == Comparison(Column("K", 2), "crosses_above", Column("D", 0))
+    assert max_lookback(node) == 3
+    assert referenced_columns(node) == {"K", "D"}
+
+    rng = np.random.default_rng(1)
+    k, d = rng.normal(50, 10, 200), rng.normal(50, 10, 200)
+    k[:5] = np.nan
+    mask = compile_node(node)({"K": k, "D": d})
+
+    expected = [
+        i >= 3 and k[i - 2] > d[i] and k[i - 3] <= d[i - 1] for i in range(len(k))
+    ]
+    np.testing.assert_array_equal(mask, expected)
+    assert mask.any()
+    # 前一根只要有 NaN 就不成立
+    assert not mask[:8].any()
+
+
+def test_cross_below_constant_on_grid_columns():
+    node = parse_logic({"and": [{"RSI": "crosses_below 30"}, {"Close": "> MA[1]"}]})
+    rsi = np.array([[40.0, 20.0], [25.0, 35.0], [20.0, 25.0], [35.0, 28.0]])
+    close = np.array([10.0, 11.0, 12.0, 13.0])[:, None]
+    ma = np.array([[9.0, 9.0], [9.5, 20.0], [10.0, 10.0], [10.5, 10.5]])
+    mask = compile_node(node)({"RSI": rsi, "Close": close, "MA": ma})
+    # 沿時間軸平移：第二欄在第 2 根跌破 30，但前一根的 MA 高於收盤價
+    np.testing.assert_array_equal(
+        mask, [[False, False], [True, False], [False, False], [False, False]]
+    )
+
+
+@pytest.mark.parametrize(
+    "condition",
+    [
+        {"K": "crosses D"},
+        {"1": "> 2"},
+        {"K[x]": "> 2"},
+        {"K": "> 2 3"},
+        {"K": "> 1", "D": "< 2"},
+    ],
+)
+def test_invalid_conditions_are_rejected(condition):
+    with pytest.raises(ValueError):
+        parse_condition(condition)
+
+
+def test_validate_lists_every_problem():
+    config = {
+        "buy_signal": {"or": [{"K": "crosses_above Foo[1]"}, {"K": "~ 3"}]},
+        "sell_signal": {"and": {"K": "> 80"}},
+    }
+    problems = validate_config(config, ["K", "D"])
+    assert len(problems) == 3
+    assert "未知的欄位 Foo" in problems[0]
+    assert parse_condition({"0": "< K"}).left == Constant(0.0)
+
+
+def test_signals_file_is_parsed_once_per_change(tmp_path):
+    import yaml
+
+    path = str(tmp_path / "signals.yaml")
+    with open(path, "w", encoding="utf-8") as file:
+        yaml.dump(CONFIG, file)
+
+    evaluator = load_signals(path)
+    assert load_signals(path) is evaluator
+    assert evaluator.config == CONFIG
+
+    # 只有修改時間變動、內容相同時沿用已編譯的 evaluator
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_signals(path) is evaluator
+
+    changed = {**CONFIG, "sell_signal": {"or": [{"K": "> 90"}]}}
+    SignalEvaluator(path).save_yaml_config(changed)
+    reloaded = load_signals(path)
+    assert reloaded is not evaluator
+    assert reloaded.config == changed
+
+    # 同一份設定內容在程序內共用同一個 evaluator
+    assert evaluator_for_config(changed) is evaluator_for_config(dict(changed))
+    assert evaluator_for_config(changed).config_hash() == reloaded.config_hash()
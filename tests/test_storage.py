@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils.storage import CsvStorage, ParquetStorage, HAS_PYARROW
+
+pytestmark = pytest.mark.skipif(not HAS_PYARROW, reason="需要 pyarrow")
+
+NAME = "TEST_raw_data"
+
+
+def bars(start, periods):
+    dates = pd.date_range(start, periods=periods, freq="D")
+    return pd.DataFrame({"Date": dates, "Close": [float(i) for i in range(periods)]})
+
+
+def snapshot(folder):
+    return {
+        os.path.join(root, file): os.stat(os.path.join(root, file)).st_mtime_ns
+        for root, _, files in os.walk(folder)
+        for file in files
+    }
+
+
+def test_read_does_not_convert_or_delete(tmp_path):
+    CsvStorage(tmp_path).write(NAME, bars("2024-01-01", 5))
+    before = snapshot(tmp_path)
+
+    parquet = ParquetStorage(tmp_path)
+    assert parquet.exists(NAME)
+    assert len(parquet.read(NAME)) == 5
+    assert snapshot(tmp_path) == before
+    assert parquet.list_names() == [NAME]
+
+
+def test_write_replaces_the_other_format(tmp_path):
+    csv, parquet = CsvStorage(tmp_path), ParquetStorage(tmp_path)
+    csv.write(NAME, bars("2024-01-01", 1))
+    assert parquet.import_all() == [NAME]
+    assert os.path.exists(csv.path(NAME))
+
+    # 以 Parquet 後端寫入後切回 CSV 後端，讀到相同的新資料
+    parquet.write(NAME, bars("2024-02-01", 2))
+    pd.testing.assert_frame_equal(csv.read(NAME), parquet.read(NAME))
+    assert len(csv.read(NAME)) == 2
+
+    csv.write(NAME, bars("2024-03-01", 3))
+    pd.testing.assert_frame_equal(parquet.read(NAME), csv.read(NAME))
+
+
+def test_append_updates_every_format(tmp_path):
+    csv, parquet = CsvStorage(tmp_path), ParquetStorage(tmp_path)
+    csv.write(NAME, bars("2024-01-01", 5))
+    parquet.import_all()
+
+    parquet.append(NAME, bars("2024-01-06", 3))
+    csv.append(NAME, bars("2024-01-09", 2))
+
+    assert len(parquet.read(NAME)) == 10
+    pd.testing.assert_frame_equal(csv.read(NAME), parquet.read(NAME))
+
+
+def test_append_without_import_keeps_csv_only(tmp_path):
+    csv, parquet = CsvStorage(tmp_path), ParquetStorage(tmp_path)
+    csv.write(NAME, bars("2024-01-01", 4))
+
+    parquet.append(NAME, bars("2024-01-05", 2))
+
+    assert not os.path.exists(parquet.path(NAME))
+    assert len(csv.read(NAME)) == 6
+
+
+def test_delete_removes_every_format(tmp_path):
+    csv, parquet = CsvStorage(tmp_path), ParquetStorage(tmp_path)
+    parquet.write(NAME, bars("2024-01-01", 4))
+    csv.import_all()
+    parquet.append(NAME, bars("2024-01-05", 2))
+
+    assert csv.delete(NAME)
+    assert not parquet.exists(NAME)
+    assert os.listdir(tmp_path) == []
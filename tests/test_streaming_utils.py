@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.ingest_utils import append_history, indicator_specs, merge_history
+from utils.streaming_utils import TAIL_BARS, IndicatorStreams, verify_against_talib
+from utils.talib_utils import INDICATORS
+
+pytest.importorskip("talib")
+
+
+def synthetic_bars(periods, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    spread = rng.uniform(0.1, 2.0, periods)
+    return pd.DataFrame(
+        {
+            "Date": pd.bdate_range("2020-01-01", periods=periods),
+            "Open": close,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(1000, 5000, periods).astype(float),
+        }
+    )
+
+
+def test_ingest_creates_state_that_advances_with_appends(tmp_path):
+    folder = str(tmp_path)
+    data = synthetic_bars(400)
+
+    merge_history("AAA", data.iloc[:300], folder)
+    streams = IndicatorStreams.load("AAA", folder)
+    assert streams is not None
+    assert streams.last_date == data["Date"].iloc[299]
+    assert {
+        (indicator, params) for indicator, params, _ in streams.streams.values()
+    } == set(indicator_specs())
+
+    assert append_history("AAA", data.iloc[300:350], folder) == 50
+    assert append_history("AAA", data.iloc[340:], folder) == 50
+    streams = IndicatorStreams.load("AAA", folder)
+    assert streams.last_date == data["Date"].iloc[-1]
+
+    # 只以新 K 棒推進的最新值與 TA-Lib 對完整歷史重算的結果相同
+    for key, (indicator, params, _) in streams.streams.items():
+        func, columns = INDICATORS[indicator]
+        expected = func(data[["High", "Low", "Close"]].copy(), *params)
+        tail = streams.columns(indicator, params)
+        for column in columns:
+            assert streams.latest[key][column] == pytest.approx(
+                expected[column].iloc[-1], abs=1e-6
+            ), f"{key} {column}"
+            np.testing.assert_allclose(
+                tail[column], expected[column].to_numpy()[-TAIL_BARS:], atol=1e-6
+            )
+
+
+def test_rewrite_keeps_existing_streams(tmp_path):
+    folder = str(tmp_path)
+    data = synthetic_bars(200)
+    merge_history("AAA", data.iloc[50:], folder)
+    streams = IndicatorStreams.load("AAA", folder)
+    streams.add("MA", (7,), data.iloc[50:])
+    streams.save(folder)
+
+    # 併入更早的資料時整份重寫，既有的指標組合一併重建
+    merge_history("AAA", data.iloc[:60], folder)
+    streams = IndicatorStreams.load("AAA", folder)
+    assert "MA(7)" in streams.streams
+    assert streams.latest["MA(7)"]["MA"] == pytest.approx(
+        data["Close"].iloc[-7:].mean()
+    )
+
+
+@pytest.mark.parametrize("indicator, params", indicator_specs())
+def test_streams_match_talib(indicator, params):
+    verify_against_talib(synthetic_bars(400, seed=1), indicator, params)
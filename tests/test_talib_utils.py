@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tests.test_streaming_utils import synthetic_bars
+from utils.talib_utils import (
+    ComboBacktest,
+    backtest_combo,
+    build_param_grid,
+    calculate_profit,
+    grid_trades,
+    run_backtests,
+    run_combo,
+    run_state_machine,
+    walk_forward_metrics,
+    walk_forward_windows,
+)
+from utils.signal_utils import evaluator_for_config
+
+pytest.importorskip("talib")
+
+SIGNALS = {
+    "buy_signal": {"or": [{"and": [{"MACD_Hist": "< 0"}, {"K": "< 30"}]}]},
+    "sell_signal": {"or": [{"and": [{"MACD_Hist": "> 0"}, {"K": "> 70"}]}]},
+}
+
+COMBOS = build_param_grid(
+    [5, 20], [14], [(12, 26, 9), (5, 34, 5)], [14], [(9, 3, 3), (14, 3, 3)]
+)
+
+
+def datasets():
+    return {"AAA": synthetic_bars(400, seed=1), "BBB": synthetic_bars(300, seed=2)}
+
+
+def serial_results(**kwargs):
+    return run_backtests(datasets(), COMBOS, use_cache=False, signals=SIGNALS, **kwargs)
+
+
+def assert_same_rows(actual, expected):
+    assert actual.keys() == expected.keys()
+    for ticker in expected:
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(actual[ticker]), pd.DataFrame(expected[ticker])
+        )
+
+
+def test_process_pool_matches_serial_and_reports_progress():
+    progress = []
+    parallel = run_backtests(
+        datasets(),
+        COMBOS,
+        workers=2,
+        progress_callback=lambda done, total: progress.append((done, total)),
+        use_cache=False,
+        signals=SIGNALS,
+    )
+    assert_same_rows(parallel, serial_results())
+    total = 2 * len(COMBOS)
+    assert progress[-1] == (total, total)
+    assert [done for done, _ in progress] == sorted(done for done, _ in progress)
+    assert any(np.isfinite(row["Profit Factor"]) for row in parallel["AAA"])
+
+
+def serial_summary(buy_mask, sell_mask, close):
+    """逐組以持倉狀態機回測的結果，作為矩陣回測的比對基準"""
+    data = pd.DataFrame({"Close": close})
+    result = ComboBacktest(
+        data, {"Close": close}, *run_state_machine(buy_mask, sell_mask)
+    )
+    return result.summary()
+
+
+def test_grid_trades_match_state_machine_per_column():
+    rng = np.random.default_rng(0)
+    n, count = 300, 40
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    buy_mask = rng.random((n, count)) < np.linspace(0.01, 0.3, count)
+    sell_mask = rng.random((n, count)) < np.linspace(0.3, 0.01, count)
+    # 沒有信號、只有買訊、同一根同時有買賣訊的組合
+    buy_mask[:, 0] = sell_mask[:, 0] = False
+    sell_mask[:, 1] = False
+    buy_mask[:, 2] = sell_mask[:, 2] = True
+
+    gross_profit, gross_loss, profit_factor, trades = grid_trades(
+        buy_mask, sell_mask, close
+    )
+    for j in range(count):
+        expected = serial_summary(buy_mask[:, j], sell_mask[:, j], close)
+        np.testing.assert_allclose(
+            [gross_profit[j], gross_loss[j], profit_factor[j]],
+            expected[:3],
+            atol=1e-9,
+        )
+        assert trades[j] == expected[3]
+    assert trades[0] == trades[1] == 0
+    assert trades[2] > 0
+
+
+def test_grid_mode_matches_per_combo_backtest():
+    assert_same_rows(serial_results(grid=True), serial_results())
+    assert_same_rows(serial_results(grid=True, workers=2), serial_results())
+
+
+def loop_backtest(frame, buy_mask, sell_mask):
+    """向量化前 process_signals 的逐筆迴圈，作為持倉狀態機的比對基準"""
+    df = frame.copy()
+    df["Signal"] = 0
+    df["Profit"] = np.nan
+    df["Buy Date"] = pd.NaT
+    bought, buy_price, buy_date = False, 0, None
+    for i in range(len(df)):
+        row = df.iloc[i]
+        if buy_mask[i] and not bought:
+            df.at[i, "Signal"] = 1
+            buy_price, buy_date, bought = row["Close"], row["Date"], True
+        elif sell_mask[i] and bought:
+            df.at[i, "Signal"] = -1
+            df.at[i, "Profit"] = row["Close"] - buy_price
+            df.at[i, "Buy Date"] = buy_date
+            bought = False
+    return df
+
+
+def test_state_machine_matches_row_loop():
+    data = synthetic_bars(400, seed=1)
+    evaluator = evaluator_for_config(SIGNALS)
+    result = run_combo("AAA", data, COMBOS[0], evaluator=evaluator)
+    buy_mask = evaluator.buy_mask(result.columns)
+    sell_mask = evaluator.sell_mask(result.columns)
+
+    expected = loop_backtest(data, buy_mask, sell_mask)
+    frame = result.to_frame()
+    np.testing.assert_array_equal(frame["Signal"], expected["Signal"])
+    np.testing.assert_allclose(frame["Profit"], expected["Profit"].astype(float))
+    pd.testing.assert_series_equal(
+        frame["Buy Date"], expected["Buy Date"].astype(frame["Buy Date"].dtype)
+    )
+    np.testing.assert_allclose(result.summary(), calculate_profit(expected))
+    # 最後一筆未平倉的買入不列入交易
+    _, buy_index, sell_index = run_state_machine(buy_mask, sell_mask)
+    assert len(buy_index) == len(sell_index) == result.summary()[3]
+
+
+def test_combo_result_shares_market_data():
+    data = synthetic_bars(400, seed=1)
+    result = run_combo("AAA", data, COMBOS[0], evaluator=evaluator_for_config(SIGNALS))
+    assert np.shares_memory(result.columns["Close"], data["Close"].to_numpy())
+    assert not result.columns["Close"].flags.writeable
+    # 本身只保存信號與交易位置
+    assert result.nbytes < len(data) * 2
+
+
+def brute_force_walk_forward(buy_mask, sell_mask, close, train, test, step):
+    """逐視窗切出資料，各自以持倉狀態機回測，作為滾動視窗驗證的比對基準"""
+    train_sums, test_sums, test_count, profitable = [0.0, 0.0], [0.0, 0.0], 0, []
+    start = 0
+    while start + train + test <= len(close):
+        for offset, length, sums in ((0, train, train_sums), (train, test, test_sums)):
+            window = slice(start + offset, start + offset + length)
+            gross_profit, gross_loss, _, count = serial_summary(
+                buy_mask[window], sell_mask[window], close[window]
+            )
+            sums[0] += gross_profit
+            sums[1] += gross_loss
+            if sums is test_sums:
+                test_count += count
+                profitable.append(gross_profit > gross_loss)
+        start += step
+    return {
+        "Windows": len(profitable),
+        "Train Profit Factor": train_sums[0] / train_sums[1],
+        "Test Profit Factor": test_sums[0] / test_sums[1],
+        "Test Count": test_count,
+        "Profitable Windows": np.mean(profitable),
+    }
+
+
+@pytest.mark.parametrize("train, test, step", [(120, 40, None), (100, 30, 7)])
+def test_walk_forward_matches_brute_force_slices(train, test, step):
+    rng = np.random.default_rng(3)
+    n = 700
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    buy_mask = rng.random(n) < 0.08
+    sell_mask = rng.random(n) < 0.08
+
+    metrics = walk_forward_metrics(buy_mask, sell_mask, close, (train, test, step))
+    expected = brute_force_walk_forward(
+        buy_mask, sell_mask, close, train, test, step or test
+    )
+    assert metrics["Windows"] == len(walk_forward_windows(n, train, test, step))
+    assert metrics.keys() == expected.keys()
+    for name, value in expected.items():
+        assert metrics[name] == pytest.approx(value), name
+
+
+def test_too_short_history_has_no_windows():
+    metrics = walk_forward_metrics(
+        np.ones(50, bool), np.ones(50, bool), np.arange(50.0), (40, 20, None)
+    )
+    assert metrics["Windows"] == 0 and np.isnan(metrics["Test Profit Factor"])
+
+
+def test_backtest_combo_evaluates_signals_once():
+    class CountingEvaluator:
+        def __init__(self, evaluator):
+            self.evaluator = evaluator
+            self.calls = 0
+
+        def buy_mask(self, columns):
+            self.calls += 1
+            return self.evaluator.buy_mask(columns)
+
+        def sell_mask(self, columns):
+            self.calls += 1
+            return self.evaluator.sell_mask(columns)
+
+    data = synthetic_bars(400, seed=1)
+    evaluator = CountingEvaluator(evaluator_for_config(SIGNALS))
+    row = backtest_combo(
+        "AAA", data, COMBOS[0], evaluator=evaluator, walk_forward=(120, 40, None)
+    )
+    assert evaluator.calls == 2
+    assert row["Windows"] == 7
+    assert (
+        row["Count"]
+        == run_combo("AAA", data, COMBOS[0], evaluator=evaluator.evaluator).summary()[3]
+    )
@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+
+from utils.ingest_utils import load_manifest, rewrite_history, update_all_histories
+from utils.yfinance_utils import COLUMNS, DataProvider, LocalProvider, bulk_download
+
+OPTIONS = {"rate": 1000.0, "backoff": 0.0}
+
+
+def write_source(folder, ticker, start, periods):
+    dates = pd.bdate_range(start, periods=periods)
+    close = [100.0 + i for i in range(periods)]
+    data = pd.DataFrame(
+        {
+            "Date": dates,
+            "Open": close,
+            "High": close,
+            "Low": close,
+            "Close": close,
+            "Volume": 1000.0,
+        }
+    )
+    data.to_csv(folder / f"{ticker}_raw_data.csv", index=False)
+    return data[COLUMNS]
+
+
+class FlakyProvider(LocalProvider):
+    """前幾次請求漏掉指定的股票，其餘照常回傳"""
+
+    def __init__(self, folder, drop, times):
+        super().__init__(folder)
+        self.drop = drop
+        self.times = times
+        self.requests = []
+
+    def download(self, tickers, start_date, end_date):
+        self.requests.append(list(tickers))
+        results = super().download(tickers, start_date, end_date)
+        if len(self.requests) <= self.times:
+            results.pop(self.drop, None)
+        return results
+
+
+def test_missing_ticker_is_reported_per_ticker(tmp_path):
+    write_source(tmp_path, "AAA", "2024-01-01", 10)
+    write_source(tmp_path, "BBB", "2024-01-01", 10)
+    provider = FlakyProvider(tmp_path, "CCC", times=0)
+
+    results, errors = bulk_download(
+        ["AAA", "BBB", "CCC"], "2024-01-01", "2024-02-01", provider, **OPTIONS
+    )
+
+    assert sorted(results) == ["AAA", "BBB"]
+    assert list(errors) == ["CCC"]
+    # 第一次之後只重試缺少的股票
+    assert provider.requests == [["AAA", "BBB", "CCC"]] + [["CCC"]] * 3
+
+
+def test_dropped_ticker_is_retried(tmp_path):
+    write_source(tmp_path, "AAA", "2024-01-01", 10)
+    write_source(tmp_path, "BBB", "2024-01-01", 10)
+    provider = FlakyProvider(tmp_path, "BBB", times=2)
+
+    results, errors = bulk_download(
+        ["AAA", "BBB"], "2024-01-01", "2024-02-01", provider, **OPTIONS
+    )
+
+    assert errors == {}
+    assert sorted(results) == ["AAA", "BBB"]
+    assert len(results["BBB"]) == 10
+    assert provider.requests == [["AAA", "BBB"], ["BBB"], ["BBB"]]
+
+
+def test_no_data_in_range_is_not_an_error(tmp_path):
+    write_source(tmp_path, "AAA", "2024-01-01", 10)
+
+    results, errors = bulk_download(
+        ["AAA"], "2025-01-01", "2025-02-01", LocalProvider(tmp_path), **OPTIONS
+    )
+
+    assert results == {} and errors == {}
+
+
+def test_update_all_histories(tmp_path):
+    source, folder = tmp_path / "source", tmp_path / "data"
+    source.mkdir()
+    full = write_source(source, "AAA", "2024-01-01", 30)
+    write_source(source, "BBB", "2024-01-01", 30)
+    rewrite_history("AAA", full.iloc[:20], str(folder))
+    rewrite_history("BBB", full.iloc[:20], str(folder))
+    (source / "BBB_raw_data.csv").unlink()
+
+    report = update_all_histories(
+        ["AAA", "BBB"],
+        "2024-03-01",
+        provider=FlakyProvider(source, "AAA", times=1),
+        folder=str(folder),
+        **OPTIONS,
+    )
+
+    assert report["AAA"] == (10, None)
+    assert report["BBB"][0] == 0 and report["BBB"][1]
+    assert load_manifest("AAA", str(folder))["last_date"] == full["Date"].iloc[-1]
+    assert load_manifest("BBB", str(folder))["rows"] == 20
+
+
+def test_incomplete_provider_fails_on_construction():
+    class Incomplete(DataProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,308 @@
+import numpy as np
+
+# 區塊掃描的區塊長度，區塊內以矩陣乘法求值，區塊間的銜接再遞迴掃描
+SCAN_BLOCK = 8
+# 一次處理的週期數上限，限制 RSI 暫存矩陣的記憶體
+PERIOD_GROUP = 8
+
+
+def _as_float(values):
+    return np.ascontiguousarray(values, dtype=float)
+
+
+def _skip_leading_nan(*arrays):
+    """
+    與 TA-Lib 相同，略過任一輸入為 NaN 的開頭部分，回傳 (起始位置, 截去開頭後的各輸入)
+    """
+    valid = np.ones(len(arrays[0]), dtype=bool)
+    for values in arrays:
+        valid &= ~np.isnan(values)
+    first = int(valid.argmax()) if valid.any() else len(valid)
+    return first, [values[first:] for values in arrays]
+
+
+def _pad_leading(rows, first):
+    """在 (列數 × 筆數) 的結果前補回略過的 NaN"""
+    if first == 0:
+        return rows
+    return np.concatenate([np.full((rows.shape[0], first), np.nan), rows], axis=1)
+
+
+def _check_periods(periods, minimum):
+    """與 TA-Lib 相同的參數下限，避免批次結果掩蓋逐組計算時會發生的錯誤"""
+    for period in periods:
+        if period < minimum:
+            raise ValueError(f"週期必須至少為 {minimum}: {period}")
+
+
+def _rolling_mean_rows(rows, periods):
+    """
+    各列以各自的週期計算簡單移動平均，列開頭的 NaN 視為尚未開始
+    與 TA-Lib 相同，第一個完整視窗之前的位置為 NaN
+    每列累加一次後以差分取得視窗總和，累加前先減去平均以降低誤差
+    """
+    count, n = rows.shape
+    out = np.full((count, n), np.nan)
+    csum = np.zeros(n + 1)
+    for j, period in enumerate(periods):
+        row = rows[j]
+        valid = ~np.isnan(row)
+        if not valid.any():
+            continue
+        first = int(valid.argmax())
+        start = first + period - 1
+        if start >= n:
+            continue
+        base = row[first:].mean()
+        np.cumsum(row[first:] - base, out=csum[first + 1 :])
+        csum[first] = 0.0
+        out[j, start:] = (
+            csum[start + 1 :] - csum[start + 1 - period : n + 1 - period]
+        ) / period + base
+    return out
+
+
+def _rolling_extreme(values, periods, func):
+    """
+    多個視窗長度的滾動最大/最小值，回傳 (週期數 × 筆數)
+    先建立長度為 2 的冪次的倍增表，各週期以兩段重疊的視窗取得結果，所有週期共用同一份表
+    """
+    n = len(values)
+    out = np.full((len(periods), n), np.nan)
+    levels = [values]
+    width = 1
+    while width * 2 <= min(max(periods, default=1), n):
+        previous = levels[-1]
+        levels.append(func(previous[:-width], previous[width:]))
+        width *= 2
+
+    for j, period in enumerate(periods):
+        if period > n:
+            continue
+        level = int(period).bit_length() - 1
+        table = levels[level]
+        shift = period - (1 << level)
+        func(
+            table[: n - period + 1],
+            table[shift : shift + n - period + 1],
+            out=out[j, period - 1 :],
+        )
+    return out
+
+
+def _linear_scan(x, a):
+    """
+    對每一列求 y[t] = a * y[t-1] + x[t]（y[-1] = 0），x 為 (列數 × 筆數)，a 為各列的係數
+    區塊內以係數冪次組成的下三角矩陣一次乘出，區塊尾端的值再以 a 的區塊長度次方遞迴掃描
+    """
+    rows, n = x.shape
+    blocks = -(-n // SCAN_BLOCK)
+    padded = np.zeros((rows, blocks * SCAN_BLOCK))
+    padded[:, :n] = x
+    padded = padded.reshape(rows, blocks, SCAN_BLOCK)
+
+    steps = np.arange(SCAN_BLOCK + 1)
+    powers = a[:, None] ** steps  # a^0 .. a^L
+    lag = steps[:SCAN_BLOCK, None] - steps[None, :SCAN_BLOCK]
+    kernel = np.where(lag >= 0, powers[:, np.clip(lag, 0, None)], 0.0)
+
+    local = np.matmul(padded, kernel.transpose(0, 2, 1))
+    if blocks > 1:
+        ends = _linear_scan(local[:, :, -1], powers[:, -1])
+        carry = np.zeros((rows, blocks))
+        carry[:, 1:] = ends[:, :-1]
+        local += powers[:, None, 1:] * carry[:, :, None]
+    return local.reshape(rows, -1)[:, :n]
+
+
+def _ma_rows(close, periods):
+    _check_periods(periods, 1)
+    n = len(close)
+    out = np.full((len(periods), n), np.nan)
+    if n == 0:
+        return out
+    base = close.mean()
+    csum = np.zeros(n + 1)
+    np.cumsum(close - base, out=csum[1:])
+    for j, period in enumerate(periods):
+        if period <= n:
+            np.subtract(csum[period:], csum[:-period], out=out[j, period - 1 :])
+            out[j, period - 1 :] /= period
+            out[j, period - 1 :] += base
+    return out
+
+
+def _rsi_rows(close, periods):
+    _check_periods(periods, 2)
+    n = len(close)
+    out = np.full((len(periods), n), np.nan)
+    if n < 2:
+        return out
+    diff = np.diff(close, prepend=close[0])
+    gain = np.maximum(diff, 0.0)
+    loss = np.maximum(-diff, 0.0)
+
+    for group_start in range(0, len(periods), PERIOD_GROUP):
+        group = list(periods[group_start : group_start + PERIOD_GROUP])
+        usable = [j for j, p in enumerate(group) if p < n]
+        if not usable:
+            continue
+        period = np.array([group[j] for j in usable], dtype=float)
+
+        # 第 p 筆放入前 p 筆的總和，之後的平滑即與 TA-Lib 的起點相同
+        x = np.zeros((2 * len(usable), n))
+        for row, j in enumerate(usable):
+            p = group[j]
+            for offset, values in ((0, gain), (len(usable), loss)):
+                x[offset + row, p] = values[1 : p + 1].sum()
+                x[offset + row, p + 1 :] = values[p + 1 :]
+        factor = np.concatenate([period, period])
+        smoothed = _linear_scan(x / factor[:, None], (factor - 1) / factor)
+        up, down = smoothed[: len(usable)], smoothed[len(usable) :]
+
+        # 與 TA-Lib 相同，只有漲跌都完全為 0 時才輸出 0
+        total = up + down
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(total == 0, 0.0, 100 * (up / total))
+        for row, j in enumerate(usable):
+            p = group[j]
+            out[group_start + j, p:] = rsi[row, p:]
+    return out
+
+
+def _willr_rows(high, low, close, periods):
+    _check_periods(periods, 2)
+    highest = _rolling_extreme(high, periods, np.maximum)
+    lowest = _rolling_extreme(low, periods, np.minimum)
+    diff = (highest - lowest) / -100.0
+    # 視窗未滿時 diff 為 NaN，結果也維持 NaN
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(diff != 0, (highest - close) / diff, 0.0)
+
+
+def _kdj_rows(high, low, close, params):
+    params = [tuple(param) for param in params]
+    _check_periods([period for param in params for period in param], 1)
+    fastk_periods = sorted({param[0] for param in params})
+    highest = _rolling_extreme(high, fastk_periods, np.maximum)
+    lowest = _rolling_extreme(low, fastk_periods, np.minimum)
+    diff = (highest - lowest) / 100.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fastk = np.where(diff != 0, (close - lowest) / diff, 0.0)
+
+    row = {period: j for j, period in enumerate(fastk_periods)}
+    rsv = fastk[[row[param[0]] for param in params]]
+    k = _rolling_mean_rows(rsv, [param[1] for param in params])
+    d = _rolling_mean_rows(k, [param[2] for param in params])
+
+    # TA-Lib 的 K 與 D 從同一位置開始輸出
+    for j, (fastk_period, slowk_period, slowd_period) in enumerate(params):
+        k[j, : fastk_period + slowk_period + slowd_period - 3] = np.nan
+    j_values = _rolling_mean_rows(3 * k - 2 * d, [3] * len(params))
+    return {"K": k, "D": d, "J": j_values}
+
+
+def batch_ma(close, periods):
+    """
+    多個週期的簡單移動平均，回傳 (筆數 × 週期數)
+    累加一次後以差分取得各週期，先減去平均價格以降低累加誤差
+    """
+    first, (close,) = _skip_leading_nan(_as_float(close))
+    return _pad_leading(_ma_rows(close, list(periods)), first).T
+
+
+def batch_rsi(close, periods):
+    """
+    多個週期的 RSI（Wilder 平滑），回傳 (筆數 × 週期數)
+    漲跌幅只計算一次，各週期的平滑以區塊掃描一起推進
+    """
+    first, (close,) = _skip_leading_nan(_as_float(close))
+    return _pad_leading(_rsi_rows(close, list(periods)), first).T
+
+
+def batch_willr(high, low, close, periods):
+    """多個週期的 Williams %R，回傳 (筆數 × 週期數)，各週期共用滾動極值表"""
+    first, (high, low, close) = _skip_leading_nan(
+        _as_float(high), _as_float(low), _as_float(close)
+    )
+    return _pad_leading(_willr_rows(high, low, close, list(periods)), first).T
+
+
+def batch_kdj(high, low, close, params):
+    """
+    多組 (fastk, slowk, slowd) 的 KDJ，回傳 K、D、J 各為 (筆數 × 組數)
+    相同 fastk 的 RSV 只計算一次
+    """
+    first, (high, low, close) = _skip_leading_nan(
+        _as_float(high), _as_float(low), _as_float(close)
+    )
+    rows = _kdj_rows(high, low, close, params)
+    return {name: _pad_leading(values, first).T for name, values in rows.items()}
+
+
+# 有批次核心的指標；MACD 的 EMA 起始方式與 TA-Lib 綁定，仍逐組計算
+BATCH_INDICATORS = ("MA", "RSI", "WILLR", "KDJ")
+
+# RSI 的 Wilder 平滑是遞迴式，以 NumPy 區塊掃描在長序列時反而比逐組呼叫 TA-Lib 慢
+RSI_BATCH_MAX_BARS = 10_000
+
+
+def use_batch_kernel(indicator, bars):
+    """此長度的資料是否以批次核心計算該指標"""
+    if indicator == "RSI":
+        return bars <= RSI_BATCH_MAX_BARS
+    return indicator in BATCH_INDICATORS
+
+
+def batch_indicator_columns(data, indicator, params_list):
+    """
+    以批次核心計算同一指標的多組參數，回傳與 params_list 對應的欄位字典清單
+    欄位名稱與 talib_utils.INDICATORS 相同，可直接放入指標快取
+    """
+    params_list = [tuple(params) for params in params_list]
+    high, low, close = data["High"], data["Low"], data["Close"]
+    # 各核心只略過自身輸入開頭的 NaN，與 TA-Lib 逐組計算相同
+    if indicator == "KDJ":
+        rows = batch_kdj(high, low, close, params_list)
+    else:
+        periods = [params[0] for params in params_list]
+        if indicator == "MA":
+            rows = {"MA": batch_ma(close, periods)}
+        elif indicator == "RSI":
+            rows = {"RSI": batch_rsi(close, periods)}
+        elif indicator == "WILLR":
+            rows = {"WILLR": batch_willr(high, low, close, periods)}
+        else:
+            raise KeyError(f"{indicator} 沒有批次核心")
+
+    # 每組參數取一欄，轉置前每組是一列，在記憶體中是連續的，不需複製
+    return [
+        {name: values[:, j] for name, values in rows.items()}
+        for j in range(len(params_list))
+    ]
+
+
+def verify_against_talib(data, indicator, params_list, atol=1e-8):
+    """
+    比較批次核心與 TA-Lib 逐組計算的結果
+    回傳各參數、各欄位的最大誤差，超過 atol 或 NaN 位置不一致時拋出 AssertionError
+    """
+    from utils.talib_utils import INDICATORS
+
+    func, columns = INDICATORS[indicator]
+    errors = {}
+    for params, actual in zip(
+        params_list, batch_indicator_columns(data, indicator, params_list)
+    ):
+        expected = func(data[["High", "Low", "Close"]].copy(), *params)
+        for column in columns:
+            target = expected[column].to_numpy(float)
+            if not np.array_equal(np.isnan(actual[column]), np.isnan(target)):
+                raise AssertionError(
+                    f"{indicator}{tuple(params)} {column} NaN 位置不一致"
+                )
+            diff = np.nanmax(np.abs(actual[column] - target), initial=0.0)
+            if diff > atol:
+                raise AssertionError(f"{indicator}{tuple(params)} {column} 誤差 {diff}")
+            errors[(tuple(params), column)] = diff
+    return errors
@@ -0,0 +1,173 @@
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.signal_utils import load_signals
+from utils.storage import get_storage, raw_data_name
+from utils.plotly_utils import CHART_POINTS, downsample_frame
+from utils.results_index import ResultsIndex
+
+
+@st.cache_data(show_spinner=False)
+def _list_tickers(folder, folder_signature):
+    return get_storage(folder).list_tickers()
+
+
+def list_tickers(folder="data"):
+    """列出有歷史資料的股票代號，資料夾內容沒有變動時不重新掃描"""
+    if not os.path.isdir(folder):
+        st.error("數據文件夾未找到，請檢查路徑是否正確。")
+        return []
+    return _list_tickers(folder, os.stat(folder).st_mtime_ns)
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _read_table(folder, name, signature):
+    return get_storage(folder).read(name)
+
+
+def load_table(folder, name):
+    """
+    讀取資料表，不存在時回傳 None
+    以檔案的修改時間與大小作為快取鍵值，檔案被改寫後自動重新讀取
+    """
+    storage = get_storage(folder)
+    if not storage.exists(name):
+        return None
+    return _read_table(folder, name, storage.signature(name))
+
+
+def load_raw_data(ticker):
+    """讀取股票的歷史資料"""
+    return load_table("data", raw_data_name(ticker))
+
+
+@st.cache_resource(show_spinner=False)
+def results_index():
+    """結果索引，第一次使用時匯入還沒有索引的舊結果表"""
+    index = ResultsIndex()
+    index.sync_from_storage(get_storage("data"))
+    return index
+
+
+@st.cache_resource(show_spinner=False)
+def job_scheduler():
+    """伺服器程序內共用的背景回測佇列，所有工作階段送出的工作都在這裡排隊"""
+    from utils.jobs import JobScheduler
+
+    return JobScheduler()
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _query_results(version, tickers, min_count, min_profit_factor, limit):
+    return results_index().query(tickers, min_count, min_profit_factor, limit)
+
+
+def query_results(tickers=None, min_count=None, min_profit_factor=None, limit=None):
+    """
+    從結果索引查詢各股票最新一次回測的結果，依獲利因子由高到低排序
+    以索引的版本（最新 run_id）作為快取鍵值，有新的回測結果時自動重新查詢
+    """
+    return _query_results(
+        results_index().version(),
+        None if tickers is None else tuple(tickers),
+        min_count,
+        min_profit_factor,
+        limit,
+    )
+
+
+def load_strategy_results(ticker):
+    """讀取股票最新一次的綜合回測結果，沒有結果時回傳 None"""
+    results = query_results([ticker])
+    return None if results.empty else results
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _combo_detail(ticker, combo, raw_signature, signals_hash):
+    # 回測、掃描與背景工作的模組在用到時才載入，只讀取資料的頁面啟動時不需要 TA-Lib
+    from utils.talib_utils import build_combo_detail
+
+    # 明細只用於顯示，指標欄位以 float32 保存；信號與獲利仍以 float64 計算
+    return build_combo_detail(
+        ticker, load_raw_data(ticker), combo, float_dtype=np.float32
+    )
+
+
+def load_combo_detail(ticker, combo):
+    """
+    取得單一參數組合的回測明細，由快取的指標即時重新產生
+    最近選取的組合保留在記憶體中，歷史資料或信號設定變動後自動重算
+    """
+    storage = get_storage("data")
+    if not storage.exists(raw_data_name(ticker)):
+        return None
+    return _combo_detail(
+        ticker,
+        combo,
+        storage.signature(raw_data_name(ticker)),
+        load_signals().config_hash(),
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _chart_range(ticker, combo, raw_signature, signals_hash, start, end, points):
+    detail = _combo_detail(ticker, combo, raw_signature, signals_hash)
+    dates = pd.to_datetime(detail["Date"])
+    if start is not None:
+        detail = detail[dates >= start]
+        dates = dates[dates >= start]
+    if end is not None:
+        detail = detail[dates <= end]
+    return downsample_frame(detail, points)
+
+
+def load_chart_range(ticker, combo, start=None, end=None, points=CHART_POINTS):
+    """
+    取得圖表用的回測明細：只取 start ~ end 的區間，再依圖表寬度降採樣
+    完整明細與各區間的降採樣結果都有快取，放大區間時不需重新傳送或計算整段歷史
+    """
+    storage = get_storage("data")
+    if not storage.exists(raw_data_name(ticker)):
+        return None
+    return _chart_range(
+        ticker,
+        combo,
+        storage.signature(raw_data_name(ticker)),
+        load_signals().config_hash(),
+        start,
+        end,
+        points,
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _screen(folder, signatures, signals_hash, use_best, results_version):
+    from utils.screener import screen_universe
+
+    return screen_universe(folder=folder, use_best=use_best)
+
+
+def load_screen(use_best=False, folder="data"):
+    """
+    掃描所有股票最新一根 K 棒的買賣信號，回傳 (結果表, ticker -> 錯誤訊息)
+    以各檔資料的檔案簽章、信號設定雜湊與結果索引版本為快取鍵值，沒有更新時直接取用上次的結果
+    """
+    storage = get_storage(folder)
+    names = [raw_data_name(ticker) for ticker in list_tickers(folder)]
+    signatures = tuple(
+        (name, storage.signature(name)) for name in names if storage.exists(name)
+    )
+    version = results_index().version() if use_best else None
+    return _screen(folder, signatures, load_signals().config_hash(), use_best, version)
+
+
+def invalidate():
+    """寫入資料後主動清除快取"""
+    _list_tickers.clear()
+    _read_table.clear()
+    _combo_detail.clear()
+    _chart_range.clear()
+    _screen.clear()
+    _query_results.clear()
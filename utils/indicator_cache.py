@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def data_fingerprint(data):
+    """計算行情資料的內容指紋，資料有任何變動都會得到不同的值"""
+    hashed = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+class IndicatorCache:
+    """
+    技術指標欄位快取
+    鍵值為 (ticker, 資料指紋, 指標名稱, 參數)，值為該指標各欄位的唯讀陣列
+    可由多個執行緒（Streamlit 的各個工作階段、背景回測工作）共用，計算本身不持有鎖
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._store = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """取得快取的指標欄位，未命中時呼叫 compute() 計算並存入"""
+        with self._lock:
+            columns = self._store.get(key)
+            if columns is not None:
+                self._store.move_to_end(key)
+                self.hits += 1
+                return columns
+            self.misses += 1
+        return self.put(key, compute())
+
+    def put(self, key, columns):
+        """存入已計算的指標欄位，例如批次核心一次算出的多個週期"""
+        for array in columns.values():
+            array.setflags(write=False)  # 快取內容會被多組參數共用，禁止就地修改
+        with self._lock:
+            self._store[key] = columns
+            self._store.move_to_end(key)
+
+            # 超過上限時淘汰最久未使用的項目
+            while self.max_entries and len(self._store) > self.max_entries:
+                self._store.popitem(last=False)
+        return columns
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._store.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._store
+
+    def __len__(self):
+        return len(self._store)
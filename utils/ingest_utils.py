@@ -0,0 +1,200 @@
+import os
+import json
+import hashlib
+from collections import defaultdict
+
+import pandas as pd
+
+from utils.storage import get_storage, raw_data_name
+from utils.yfinance_utils import bulk_download
+from utils.streaming_utils import (
+    rebuild_indicator_state,
+    state_path,
+    update_indicator_state,
+)
+
+
+def manifest_path(ticker, folder="data"):
+    """股票歷史資料摘要檔的路徑"""
+    return os.path.join(folder, f"{ticker}_manifest.json")
+
+
+def _chain_checksum(previous, rows):
+    """以前一次的檢查碼串接新資料列的雜湊，附加時不需重讀整份歷史"""
+    hashed = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+    return hashlib.sha256(previous.encode() + hashed.tobytes()).hexdigest()
+
+
+def load_manifest(ticker, folder="data"):
+    """讀取摘要（first_date、last_date、rows、checksum），不存在時回傳 None"""
+    path = manifest_path(ticker, folder)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    manifest["first_date"] = pd.Timestamp(manifest["first_date"])
+    manifest["last_date"] = pd.Timestamp(manifest["last_date"])
+    return manifest
+
+
+def save_manifest(ticker, manifest, folder="data"):
+    """儲存摘要"""
+    content = dict(
+        manifest,
+        first_date=manifest["first_date"].strftime("%Y-%m-%d"),
+        last_date=manifest["last_date"].strftime("%Y-%m-%d"),
+    )
+    path = manifest_path(ticker, folder)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(content, file, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _normalize(data):
+    """統一欄位型別並依日期由舊到新排序、去除重複日期"""
+    data = data.copy()
+    data["Date"] = pd.to_datetime(data["Date"])
+    return (
+        data.drop_duplicates(subset="Date", keep="last")
+        .sort_values("Date")
+        .reset_index(drop=True)
+    )
+
+
+def indicator_specs():
+    """
+    建立串流狀態時預先涵蓋的 (指標名稱, 參數)：參數選單的所有選項與掃描器的預設參數
+    之後附加新 K 棒時這些指標只以新 K 棒推進
+    """
+    from utils.screener import DEFAULT_COMBO
+    from utils.talib_utils import (
+        PARAM_OPTIONS,
+        build_param_grid,
+        grid_indicator_specs,
+    )
+
+    combos = build_param_grid(*PARAM_OPTIONS.values()) + [DEFAULT_COMBO]
+    return grid_indicator_specs(combos)
+
+
+def rewrite_history(ticker, data, folder="data"):
+    """整份重寫歷史資料並重建摘要"""
+    data = _normalize(data)
+    get_storage(folder).write(raw_data_name(ticker), data)
+    manifest = {
+        "first_date": data["Date"].min(),
+        "last_date": data["Date"].max(),
+        "rows": len(data),
+        "columns": list(data.columns),
+        "checksum": _chain_checksum("", data),
+    }
+    save_manifest(ticker, manifest, folder)
+    rebuild_indicator_state(ticker, data, indicator_specs(), folder)
+    return manifest
+
+
+def get_manifest(ticker, folder="data"):
+    """
+    取得股票的摘要
+    舊資料沒有摘要時讀取一次完整歷史，整理為由舊到新排序後建立
+    """
+    manifest = load_manifest(ticker, folder)
+    if manifest is not None:
+        return manifest
+
+    storage = get_storage(folder)
+    if not storage.exists(raw_data_name(ticker)):
+        return None
+    return rewrite_history(ticker, storage.read(raw_data_name(ticker)), folder)
+
+
+def append_history(ticker, new_data, folder="data"):
+    """
+    附加最後一筆之後的新資料列，回傳實際新增的筆數
+    成本只與新資料筆數有關，不會重讀或重寫既有歷史
+    """
+    manifest = get_manifest(ticker, folder)
+    if manifest is None:
+        return rewrite_history(ticker, new_data, folder)["rows"]
+
+    new_data = _normalize(new_data)
+    new_data = new_data[new_data["Date"] > manifest["last_date"]]
+    if new_data.empty:
+        return 0
+
+    # 依既有欄位順序寫入，CSV 附加時欄位才會對齊
+    new_data = new_data[manifest["columns"]]
+    get_storage(folder).append(raw_data_name(ticker), new_data)
+
+    manifest["last_date"] = new_data["Date"].max()
+    manifest["rows"] += len(new_data)
+    manifest["checksum"] = _chain_checksum(manifest["checksum"], new_data)
+    save_manifest(ticker, manifest, folder)
+
+    # 已建立串流狀態的指標只以新 K 棒推進，不需重算整段歷史
+    update_indicator_state(ticker, new_data, folder)
+    return len(new_data)
+
+
+def merge_history(ticker, new_data, folder="data"):
+    """
+    將下載的資料併入歷史，回傳新增的筆數
+    只延伸到最後一筆之後時走附加路徑；包含更早的日期時才整份合併重寫
+    """
+    manifest = get_manifest(ticker, folder)
+    if manifest is None:
+        return rewrite_history(ticker, new_data, folder)["rows"]
+
+    if pd.to_datetime(new_data["Date"]).min() >= manifest["first_date"]:
+        return append_history(ticker, new_data, folder)
+
+    storage = get_storage(folder)
+    existing_data = storage.read(raw_data_name(ticker))
+    manifest = rewrite_history(
+        ticker, pd.concat([existing_data, new_data], ignore_index=True), folder
+    )
+    return manifest["rows"] - len(existing_data)
+
+
+def delete_history(ticker, folder="data"):
+    """刪除歷史資料與摘要，回傳是否有資料被刪除"""
+    deleted = get_storage(folder).delete(raw_data_name(ticker))
+    for path in (manifest_path(ticker, folder), state_path(ticker, folder)):
+        if os.path.exists(path):
+            os.remove(path)
+    return deleted
+
+
+def update_all_histories(tickers, end_date, provider=None, folder="data", **kwargs):
+    """
+    批次更新多檔股票：依各自最後一筆日期分組並行下載，再逐檔附加
+    回傳 ticker -> (新增筆數, 錯誤訊息)，沒有歷史資料的股票不會更新
+    """
+    groups = defaultdict(list)
+    for ticker in tickers:
+        manifest = get_manifest(ticker, folder)
+        if manifest is not None:
+            groups[manifest["last_date"] + pd.Timedelta(days=1)].append(ticker)
+
+    report = {}
+    for start_date, group in groups.items():
+        if start_date >= pd.Timestamp(end_date):
+            report.update({ticker: (0, None) for ticker in group})
+            continue
+        results, errors = bulk_download(
+            group, start_date, end_date, provider=provider, **kwargs
+        )
+        for ticker in group:
+            if ticker in errors:
+                report[ticker] = (0, errors[ticker])
+                continue
+            try:
+                added = (
+                    append_history(ticker, results[ticker], folder)
+                    if ticker in results
+                    else 0
+                )
+                report[ticker] = (added, None)
+            except Exception as e:
+                report[ticker] = (0, str(e))
+    return report
@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from utils.optimizer import save_halving_results, successive_halving
+from utils.signal_utils import load_signals
+from utils.storage import get_storage, raw_data_name
+from utils.talib_utils import build_param_grid, run_backtests, save_strategy_results
+
+# 各工作的輸出資料夾所在位置
+JOB_FOLDER = os.path.join("data_cache", "jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# 伺服器結束時仍在排隊或執行中的工作
+INTERRUPTED = "interrupted"
+ACTIVE = (QUEUED, RUNNING)
+
+# 進度寫入資料庫與檢查取消的最短間隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+# 寫入共用的結果表與結果索引時互斥，同一檔股票不會被兩個工作交錯寫入
+_PUBLISH_LOCK = threading.Lock()
+
+# 本程序的識別碼，與程序 ID 一起記錄在工作上；程序 ID 被重複使用時仍可分辨
+PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def _process_alive(pid):
+    """程序是否仍在執行"""
+    if os.name == "nt":
+        # Windows 的 os.kill 會結束程序，改以查詢結束代碼判斷（259 為 STILL_ACTIVE）
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobCancelled(Exception):
+    """工作被取消，由進度回報拋出以中止回測"""
+
+
+class JobStore:
+    """
+    背景工作的狀態、進度與參數（SQLite）
+    與 Streamlit 的工作階段無關，重新執行、切換頁面或其他使用者都查得到同樣的狀態
+    """
+
+    def __init__(self, path=os.path.join("data_cache", "jobs.sqlite")):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT,
+                    owner TEXT,
+                    ticker TEXT,
+                    params TEXT,
+                    output TEXT,
+                    status TEXT,
+                    done INTEGER DEFAULT 0,
+                    total INTEGER DEFAULT 0,
+                    message TEXT DEFAULT '',
+                    cancel INTEGER DEFAULT 0,
+                    pid INTEGER,
+                    process TEXT,
+                    created REAL,
+                    started REAL,
+                    finished REAL
+                )
+                """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created)")
+
+    @contextmanager
+    def _connect(self):
+        """開啟連線，結束時提交並關閉"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, job_id, kind, owner, ticker, params, output):
+        """新增排隊中的工作，記錄執行它的程序（本程序）"""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (
+                    job_id, kind, owner, ticker, params, output, status,
+                    pid, process, created
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id,
+                    kind,
+                    owner,
+                    ticker,
+                    json.dumps(params, ensure_ascii=False),
+                    output,
+                    QUEUED,
+                    os.getpid(),
+                    PROCESS_TOKEN,
+                    time.time(),
+                ),
+            )
+
+    def update(self, job_id, **fields):
+        """更新工作的欄位，例如 status、done、total、message"""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                [*fields.values(), job_id],
+            )
+
+    def get(self, job_id):
+        """取得工作的所有欄位，params 已轉回字典；不存在時回傳 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def list(self, limit=50):
+        """最近建立的工作，新的在前"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT job_id, owner, ticker, status, done, total, message,
+                       created, started, finished
+                FROM jobs ORDER BY created DESC LIMIT ?
+                """,
+                (limit,),
+            ).fetchall()
+        return pd.DataFrame(
+            [dict(row) for row in rows],
+            columns=[
+                "job_id",
+                "owner",
+                "ticker",
+                "status",
+                "done",
+                "total",
+                "message",
+                "created",
+                "started",
+                "finished",
+            ],
+        )
+
+    def has_active(self):
+        """是否有排隊或執行中的工作"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1", ACTIVE
+            ).fetchone()
+        return row is not None
+
+    def request_cancel(self, job_id):
+        """要求取消工作，回傳工作是否仍在排隊或執行中"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET cancel = 1 WHERE job_id = ? AND status IN (?, ?)",
+                (job_id, *ACTIVE),
+            )
+        return cursor.rowcount > 0
+
+    def cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT cancel FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row["cancel"])
+
+    def interrupt_orphaned(self):
+        """
+        將執行程序已結束、卻仍標記為排隊或執行中的工作改為 interrupted，回傳其工作 ID
+        其他仍在執行的伺服器程序（或本程序先前建立的佇列）的工作不受影響
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, pid, process FROM jobs WHERE status IN (?, ?)", ACTIVE
+            ).fetchall()
+            orphaned = [
+                row["job_id"]
+                for row in rows
+                if row["process"] != PROCESS_TOKEN
+                and (row["pid"] == os.getpid() or not _process_alive(row["pid"]))
+            ]
+            conn.executemany(
+                "UPDATE jobs SET status = ?, finished = ?, message = ? "
+                "WHERE job_id = ? AND status IN (?, ?)",
+                [
+                    (INTERRUPTED, time.time(), "執行的程序已結束", job_id, *ACTIVE)
+                    for job_id in orphaned
+                ],
+            )
+        return orphaned
+
+    def prune(self, keep=200):
+        """刪除最近 keep 筆以外已結束的工作，回傳其輸出資料夾"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT job_id, output FROM jobs WHERE status NOT IN (?, ?)
+                ORDER BY created DESC LIMIT -1 OFFSET ?
+                """,
+                (*ACTIVE, keep),
+            ).fetchall()
+            conn.executemany(
+                "DELETE FROM jobs WHERE job_id = ?", [(row["job_id"],) for row in rows]
+            )
+        return [row["output"] for row in rows]
+
+
+def _tuples(values):
+    """JSON 讀回的清單轉回參數元組"""
+    return [tuple(value) for value in values]
+
+
+def run_backtest_job(params, output, progress_callback):
+    """
+    執行回測工作：完整網格，或 params["search"] 指定的逐輪淘汰
+    結果先寫入工作自己的輸出資料夾，完成後才寫入共用的結果表與結果索引
+    逐輪淘汰只涵蓋部分參數，另存為逐輪淘汰結果，不取代完整網格的結果
+    回傳結果組數
+    """
+    ticker = params["ticker"]
+    data = get_storage("data").read(raw_data_name(ticker))
+    combos = build_param_grid(
+        params["ma"],
+        params["rsi"],
+        _tuples(params["macd"]),
+        params["willr"],
+        _tuples(params["kdj"]),
+    )
+    walk_forward = params.get("walk_forward")
+    options = {
+        "workers": params.get("workers", 1),
+        "progress_callback": progress_callback,
+        "grid": params.get("grid", False),
+        "walk_forward": tuple(walk_forward) if walk_forward else None,
+        "signals": params.get("signals"),
+    }
+
+    if params.get("search"):
+        rows, rounds = successive_halving(
+            ticker, data, combos, **params["search"], **options
+        )
+        rounds.to_csv(os.path.join(output, "rounds.csv"), index=False)
+        save = save_halving_results
+    else:
+        rows = run_backtests({ticker: data}, combos, **options)[ticker]
+        save = save_strategy_results
+    pd.DataFrame(rows).to_csv(os.path.join(output, "results.csv"), index=False)
+
+    with _PUBLISH_LOCK:
+        save(ticker, rows)
+    return len(rows)
+
+
+# 工作種類 -> 執行函式 func(params, 輸出資料夾, progress_callback)
+JOB_KINDS = {"backtest": run_backtest_job}
+
+
+def job_outputs(job):
+    """工作輸出資料夾內的結果表，回傳 檔名 -> DataFrame"""
+    outputs = {}
+    for name in ("results", "rounds"):
+        path = os.path.join(job["output"], f"{name}.csv")
+        if os.path.exists(path):
+            outputs[name] = pd.read_csv(path)
+    return outputs
+
+
+class JobScheduler:
+    """
+    本機的背景工作佇列，工作在伺服器程序的執行緒中執行，不受 Streamlit 重新執行影響
+    max_jobs 限制同時執行的工作數，其餘排隊；每個工作可再以多個程序平行回測
+    每個工作有自己的輸出資料夾（參數、結果、逐輪摘要），狀態與進度記錄在 JobStore
+    建立時把執行程序已結束卻沒有完成的工作標記為 interrupted，其他程序仍在執行的工作不受影響
+    """
+
+    def __init__(self, store=None, max_jobs=2, folder=JOB_FOLDER, keep=200):
+        self.store = store or JobStore()
+        self.folder = folder
+        self.keep = keep
+        self.store.interrupt_orphaned()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_jobs, thread_name_prefix="backtest-job"
+        )
+
+    def submit(self, params, owner="", kind="backtest"):
+        """
+        送出工作，回傳工作 ID
+        未指定信號設定時以送出當下的 signals.yaml 為快照，執行時修改設定不影響排隊中的工作
+        """
+        params = dict(params)
+        if params.get("signals") is None:
+            params["signals"] = load_signals().config
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        output = os.path.join(self.folder, job_id)
+        os.makedirs(output, exist_ok=True)
+        with open(os.path.join(output, "params.json"), "w", encoding="utf-8") as file:
+            json.dump(params, file, ensure_ascii=False, indent=2)
+
+        self.store.create(job_id, kind, owner, params.get("ticker"), params, output)
+        for path in self.store.prune(self.keep):
+            shutil.rmtree(path, ignore_errors=True)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """要求取消工作，執行中的工作在下一次回報進度時停止"""
+        return self.store.request_cancel(job_id)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job["cancel"]:
+            self.store.update(
+                job_id, status=CANCELLED, finished=time.time(), message="已取消"
+            )
+            return
+        self.store.update(job_id, status=RUNNING, started=time.time())
+        last_report = 0.0
+
+        def progress(done, total):
+            nonlocal last_report
+            now = time.time()
+            if done < total and now - last_report < PROGRESS_INTERVAL:
+                return
+            last_report = now
+            self.store.update(job_id, done=done, total=total)
+            if self.store.cancel_requested(job_id):
+                raise JobCancelled(job_id)
+
+        try:
+            count = JOB_KINDS[job["kind"]](job["params"], job["output"], progress)
+        except JobCancelled:
+            self.store.update(
+                job_id, status=CANCELLED, finished=time.time(), message="已取消"
+            )
+        except Exception as e:
+            self.store.update(
+                job_id,
+                status=FAILED,
+                finished=time.time(),
+                message=f"{type(e).__name__}: {e}",
+            )
+        else:
+            self.store.update(
+                job_id, status=DONE, finished=time.time(), message=f"{count} 組結果"
+            )
@@ -0,0 +1,226 @@
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.signal_utils import load_signals
+from utils.storage import get_storage, halving_results_name
+from utils.talib_utils import build_param_grid, run_backtests
+
+
+def score(row):
+    """淘汰時的排序分數：獲利因子，沒有虧損交易（NaN）時排在最後，與結果表的排序相同"""
+    profit_factor = row["Profit Factor"]
+    if profit_factor is None or np.isnan(profit_factor):
+        return -np.inf
+    return profit_factor
+
+
+def halving_schedule(total_bars, combos, eta=3, min_bars=250):
+    """
+    逐輪淘汰的排程，回傳各輪的 (K 棒數, 組數)
+    每輪只保留前 1/eta 的組合，K 棒數乘以 eta，最後一輪使用完整歷史
+    最後一輪至少留下 eta 組以便比較，第一輪的 K 棒數不少於 min_bars
+    """
+    rounds = 1
+    while (
+        math.ceil(combos / eta ** (rounds - 1)) > eta
+        and total_bars // eta**rounds >= min_bars
+    ):
+        rounds += 1
+    return [
+        (
+            min(total_bars, math.ceil(total_bars / eta ** (rounds - 1 - i))),
+            math.ceil(combos / eta**i),
+        )
+        for i in range(rounds)
+    ]
+
+
+def schedule_cost(schedule):
+    """排程的總評估組數"""
+    return sum(count for _, count in schedule)
+
+
+def first_round_size(total_bars, combos, eta=3, min_bars=250, max_evals=None):
+    """在評估次數上限內，第一輪最多可放入的組數"""
+    if not max_evals:
+        return combos
+    low, high = 1, combos
+    while low < high:
+        middle = (low + high + 1) // 2
+        if (
+            schedule_cost(halving_schedule(total_bars, middle, eta, min_bars))
+            <= max_evals
+        ):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class _OutOfTime(Exception):
+    """中間輪超過時間上限，由進度回報拋出以中止該輪"""
+
+
+def successive_halving(
+    ticker,
+    data,
+    combos,
+    eta=3,
+    min_bars=250,
+    max_evals=None,
+    time_budget=None,
+    workers=1,
+    progress_callback=None,
+    grid=False,
+    seed=0,
+    walk_forward=None,
+    signals=None,
+):
+    """
+    逐輪淘汰搜尋參數組合
+    前幾輪只回測最近的一段歷史，依獲利因子保留前 1/eta 的組合，完整歷史只回測最後留下的組合
+    max_evals 限制總評估組數，超過時第一輪以固定的亂數種子抽樣
+    time_budget（秒）在每輪開始前依已完成各輪的速度估算，中間輪執行時也在每次回報進度時檢查，
+    來不及或已超過時捨棄該輪，依上一輪的排名（第一輪時為原本的順序）直接進入完整歷史；
+    完整歷史這一輪一定會執行完
+    walk_forward 只套用於最後的完整歷史
+    signals 為信號設定的快照，預設為目前的 signals.yaml
+    回傳 (完整歷史的結果清單, 各輪摘要)
+    """
+    combos = list(combos)
+    total_bars = len(data)
+    # 各輪使用同一份信號設定，執行中修改 signals.yaml 不影響淘汰結果
+    signals = load_signals().config if signals is None else signals
+    size = first_round_size(total_bars, len(combos), eta, min_bars, max_evals)
+    if size < len(combos):
+        rng = np.random.default_rng(seed)
+        picked = np.sort(rng.choice(len(combos), size, replace=False))
+        combos = [combos[i] for i in picked]
+    schedule = halving_schedule(total_bars, len(combos), eta, min_bars)
+    keep = schedule[-1][1]
+
+    start_time = time.time()
+    planned = schedule_cost(schedule)
+    done = 0
+    round_done = 0
+    rate = None  # 每組每根 K 棒的秒數，由已完成的輪估算
+    survivors = combos
+    rounds = []
+    index, final = 0, False
+
+    def report(finished, total):
+        nonlocal round_done
+        round_done = finished
+        if progress_callback:
+            progress_callback(done + finished, planned)
+        # 中間輪在回報進度時檢查時間上限，完整歷史這一輪不中止
+        if time_budget and not final and time.time() - start_time > time_budget:
+            raise _OutOfTime()
+
+    while True:
+        bars = schedule[index][0]
+        final = index == len(schedule) - 1
+        if not final and time_budget and rate is not None:
+            elapsed = time.time() - start_time
+            needed = rate * (len(survivors) * bars + keep * total_bars)
+            final = elapsed + needed > time_budget
+        if final:
+            # 來不及跑完中間輪時，依目前排名直接進入完整歷史
+            bars = total_bars
+            survivors = survivors[:keep]
+            planned = done + len(survivors)
+
+        window = data.iloc[total_bars - bars :].reset_index(drop=True)
+        round_start = time.time()
+        round_done = 0
+        try:
+            # 只用於淘汰的截斷歷史不寫入結果快取
+            rows = run_backtests(
+                {ticker: window},
+                survivors,
+                workers,
+                report,
+                use_cache=final,
+                grid=grid,
+                walk_forward=walk_forward if final else None,
+                signals=signals,
+            )[ticker]
+        except _OutOfTime:
+            # 捨棄超時的這一輪，下一輪即為完整歷史
+            done += round_done
+            index = len(schedule) - 1
+            continue
+        seconds = time.time() - round_start
+        done += len(survivors)
+        rate = seconds / max(1, len(survivors) * bars)
+
+        order = sorted(range(len(rows)), key=lambda i: score(rows[i]), reverse=True)
+        rounds.append(
+            {
+                "Round": index + 1,
+                "Bars": bars,
+                "Combos": len(survivors),
+                "Best Profit Factor": (
+                    rows[order[0]]["Profit Factor"] if rows else np.nan
+                ),
+                "Seconds": seconds,
+            }
+        )
+        if final:
+            return rows, pd.DataFrame(rounds)
+        survivors = [survivors[i] for i in order[: schedule[index + 1][1]]]
+        index += 1
+
+
+def save_halving_results(ticker, results):
+    """
+    儲存逐輪淘汰留下組合的結果，依獲利因子由高到低排序
+    只涵蓋部分參數網格，與完整網格的綜合結果分開存放，也不寫入結果索引，
+    不會取代其他頁面查詢的最新結果
+    """
+    result_df = pd.DataFrame(results)
+    if not result_df.empty:
+        result_df = result_df.sort_values("Profit Factor", ascending=False)
+    get_storage("data").write(halving_results_name(ticker), result_df)
+    return result_df
+
+
+def optimize_indicators(
+    ticker,
+    data,
+    ma_periods,
+    rsi_periods,
+    macd_params,
+    willr_periods,
+    kdj_params,
+    eta=3,
+    max_evals=None,
+    time_budget=None,
+    workers=1,
+    progress_callback=None,
+    grid=False,
+    walk_forward=None,
+):
+    """
+    以逐輪淘汰取代完整網格，另外儲存最後留下組合的完整歷史結果
+    參數與 calculate_indicators 相同，回傳 (留下組合的結果表, 各輪摘要)
+    """
+    combos = build_param_grid(
+        ma_periods, rsi_periods, macd_params, willr_periods, kdj_params
+    )
+    results, rounds = successive_halving(
+        ticker,
+        data,
+        combos,
+        eta=eta,
+        max_evals=max_evals,
+        time_budget=time_budget,
+        workers=workers,
+        progress_callback=progress_callback,
+        grid=grid,
+        walk_forward=walk_forward,
+    )
+    return save_halving_results(ticker, results), rounds
@@ -0,0 +1,77 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 子程序內共用的唯讀資料，由 initializer 在程序啟動時設定一次
+_SHARED = None
+
+
+def _init_worker(shared):
+    """子程序初始化：行情資料只在啟動時傳入一次，而不是每個工作單元都序列化"""
+    global _SHARED
+    _SHARED = shared
+
+
+def _run_chunk(chunk_func, chunk):
+    """在子程序中以共用資料執行一個工作單元"""
+    return chunk_func(_SHARED, chunk)
+
+
+def default_workers():
+    """預設的平行程序數量"""
+    return os.cpu_count() or 1
+
+
+def format_progress(done, total, elapsed):
+    """產生進度說明：完成組數、每秒組數與預估剩餘時間"""
+    speed = done / elapsed if elapsed > 0 else 0
+    eta = (total - done) / speed if speed > 0 else 0
+    return f"已完成 {done}/{total} 組，{speed:.1f} 組/秒，預估剩餘 {eta:.0f} 秒"
+
+
+def split_chunks(tasks, workers, chunk_size=None):
+    """將工作切成多個區塊，預設每個程序約分到四個區塊以平衡負載"""
+    if not chunk_size:
+        chunk_size = max(1, math.ceil(len(tasks) / (workers * 4)))
+    return [tasks[i : i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+
+def run_in_pool(
+    chunk_func, tasks, shared, workers=None, chunk_size=None, progress_callback=None
+):
+    """
+    以 ProcessPoolExecutor 平行執行工作，依原順序回傳結果
+    chunk_func(shared, chunk) 必須是可匯入的頂層函式，回傳與 chunk 等長的結果清單
+    progress_callback(done, total) 會在每個區塊完成時呼叫，拋出例外即中止（例如工作被取消），
+    尚未開始的區塊不再執行
+    """
+    workers = workers or default_workers()
+    chunks = split_chunks(list(tasks), workers, chunk_size)
+    total = sum(len(chunk) for chunk in chunks)
+    results = [None] * len(chunks)
+    done = 0
+
+    if not chunks:
+        return []
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(chunks)),
+        initializer=_init_worker,
+        initargs=(shared,),
+    ) as executor:
+        futures = {
+            executor.submit(_run_chunk, chunk_func, chunk): index
+            for index, chunk in enumerate(chunks)
+        }
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                done += len(chunks[index])
+                if progress_callback:
+                    progress_callback(done, total)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return [item for chunk_results in results for item in chunk_results]
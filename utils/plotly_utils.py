@@ -1,6 +1,180 @@
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# 快速圖表每條序列保留的點數，約為圖表寬度的像素數
+CHART_POINTS = 1500
+
+# 各序列的降採樣方式：折線以 LTTB 保留形狀，柱狀以區間極值保留尖峰
+CHART_SERIES = {
+    "Close": "lttb",
+    "Volume": "minmax",
+    "MACD_Hist": "minmax",
+    "RSI": "lttb",
+}
+
+
+def _numeric(x):
+    """日期轉為奈秒整數後以浮點數計算，其餘直接轉為浮點數"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").astype(np.int64)
+        return (x - x[0]).astype(float) if len(x) else x.astype(float)
+    return x.astype(float)
+
+
+def lttb_indices(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，回傳保留的索引
+    首尾固定保留，中間分為 points - 2 個區間，每區取與前一個保留點、下一區平均點圍成面積最大的點
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    y = np.asarray(y, dtype=float)
+
+    edges = (np.arange(points - 1) * (n - 2) // (points - 2)) + 1
+    # 各區間的平均點以累加和一次算出，最後一區的下一點為最後一筆
+    x_sum = np.concatenate([[0.0], np.cumsum(x)])
+    y_sum = np.concatenate([[0.0], np.cumsum(y)])
+    counts = np.diff(edges)
+    next_x = np.append((x_sum[edges[1:]] - x_sum[edges[:-1]])[1:] / counts[1:], x[-1])
+    next_y = np.append((y_sum[edges[1:]] - y_sum[edges[:-1]])[1:] / counts[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        low, high = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[low:high] - y[a])
+            - (x[a] - x[low:high]) * (next_y[i] - y[a])
+        )
+        a = low + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, points):
+    """區間極值降採樣，每個區間保留最小與最大值的位置，回傳排序後的索引"""
+    n = len(y)
+    buckets = points // 2
+    if buckets < 1 or points >= n:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lowest = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1) + offsets
+    highest = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1) + offsets
+    indices = np.concatenate([[0, n - 1], lowest, highest])
+    return np.unique(indices[indices < n])
+
+
+def downsample_indices(x, y, points, method="lttb"):
+    """略過 NaN（指標暖機期）後降採樣，回傳原序列的索引"""
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(y))
+    if method == "lttb":
+        picked = lttb_indices(np.asarray(x)[valid], y[valid], points)
+    else:
+        picked = minmax_indices(y[valid], points)
+    return valid[picked]
+
+
+def downsample_frame(df, points=CHART_POINTS):
+    """
+    依圖表寬度降採樣回測明細，回傳保留列組成的 DataFrame
+    各序列各自挑選的列取聯集，買賣信號所在的列一律保留
+    """
+    if len(df) <= points:
+        return df.reset_index(drop=True)
+    dates = df["Date"].to_numpy()
+    keep = [np.flatnonzero(df["Signal"].to_numpy() != 0)]
+    for column, method in CHART_SERIES.items():
+        if column in df.columns:
+            keep.append(
+                downsample_indices(dates, df[column].to_numpy(), points, method)
+            )
+    return df.iloc[np.unique(np.concatenate(keep))].reset_index(drop=True)
+
+
+def build_fast_chart(df, title="Stock Price with Buy/Sell Signals"):
+    """
+    以 WebGL（Scattergl）繪製的單一圖表，價格、成交量、MACD_Hist、RSI 共用時間軸
+    傳入的資料應先以 downsample_frame 降採樣
+    """
+    df = df.copy()
+    df["Date"] = pd.to_datetime(df["Date"])
+    rows = ["Close", "Volume"] + [c for c in ("MACD_Hist", "RSI") if c in df.columns]
+    heights = {"Close": 0.5, "Volume": 0.15, "MACD_Hist": 0.175, "RSI": 0.175}
+    fig = make_subplots(
+        rows=len(rows),
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.02,
+        row_heights=[heights[name] for name in rows],
+    )
+
+    fig.add_trace(
+        go.Scattergl(
+            x=df["Date"],
+            y=df["Close"],
+            mode="lines",
+            name="Close Price",
+            line=dict(color="blue"),
+        ),
+        row=1,
+        col=1,
+    )
+    for value, name, color, symbol in (
+        (1, "Buy Signal", "green", "triangle-up"),
+        (-1, "Sell Signal", "red", "triangle-down"),
+    ):
+        points = df[df["Signal"] == value]
+        fig.add_trace(
+            go.Scattergl(
+                x=points["Date"],
+                y=points["Close"],
+                mode="markers",
+                marker=dict(color=color, size=10, symbol=symbol),
+                name=name,
+            ),
+            row=1,
+            col=1,
+        )
+
+    # 降採樣後的點間距不一，柱狀圖改以填滿到 0 的折線呈現
+    styles = {
+        "Volume": dict(line=dict(color="gray", width=1), fill="tozeroy"),
+        "MACD_Hist": dict(line=dict(color="purple", width=1), fill="tozeroy"),
+        "RSI": dict(line=dict(color="orange")),
+    }
+    for row, name in enumerate(rows[1:], start=2):
+        fig.add_trace(
+            go.Scattergl(
+                x=df["Date"], y=df[name], mode="lines", name=name, **styles[name]
+            ),
+            row=row,
+            col=1,
+        )
+        fig.update_yaxes(title_text=name, row=row, col=1)
+    if "RSI" in rows:
+        fig.update_yaxes(range=[0, 100], row=rows.index("RSI") + 1, col=1)
+
+    fig.update_yaxes(title_text="Close Price", row=1, col=1)
+    fig.update_layout(
+        title=title,
+        height=250 + 150 * len(rows),
+        hovermode="x unified",
+        dragmode="select",
+        selectdirection="h",
+    )
+    return fig
 
 
 def plot_chart(df_result):
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import pandas as pd
+
+# 目前啟用的效能記錄器，None 表示未啟用，各階段只多一次判斷
+# 以 ContextVar 保存，每個執行緒（Streamlit 工作階段、背景工作）各自啟用，互不影響
+_ACTIVE = contextvars.ContextVar("profiler", default=None)
+
+
+class Profiler:
+    """
+    記錄回測各階段的執行時間、呼叫次數與配置的資料量
+    事件以巢狀結構記錄，可匯出為 JSON 或 Chrome trace（chrome://tracing、Perfetto）
+    """
+
+    def __init__(self):
+        self.events = []
+        self._local = threading.local()
+        self._ids = itertools.count()
+        self._token = None
+
+    @property
+    def _stack(self):
+        """目前執行緒的巢狀階段，各執行緒的父子關係分開記錄"""
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name, **args):
+        """記錄一個階段，產生的陣列大小可寫入回傳事件的 nbytes"""
+        stack = self._stack
+        event = {
+            "id": f"{os.getpid()}-{next(self._ids)}",
+            "parent": stack[-1]["id"] if stack else None,
+            "name": name,
+            "args": args,
+            "nbytes": 0,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "ts": time.time() * 1e6,
+        }
+        stack.append(event)
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event["dur"] = (time.perf_counter() - start) * 1e6
+            stack.pop()
+            self.events.append(event)
+
+    def add(self, events):
+        """合併子程序記錄的事件"""
+        self.events.extend(events)
+
+    def summary(self):
+        """整次執行依階段彙總：呼叫次數、總耗時、平均耗時與配置量"""
+        if not self.events:
+            return pd.DataFrame(
+                columns=["Stage", "Calls", "Total (s)", "Mean (ms)", "Max (ms)", "MB"]
+            )
+        df = pd.DataFrame(self.events)
+        summary = df.groupby("name").agg(
+            Calls=("dur", "size"),
+            total=("dur", "sum"),
+            mean=("dur", "mean"),
+            max=("dur", "max"),
+            nbytes=("nbytes", "sum"),
+        )
+        summary = pd.DataFrame(
+            {
+                "Stage": summary.index,
+                "Calls": summary["Calls"],
+                "Total (s)": summary["total"] / 1e6,
+                "Mean (ms)": summary["mean"] / 1e3,
+                "Max (ms)": summary["max"] / 1e3,
+                "MB": summary["nbytes"] / 1024 / 1024,
+            }
+        )
+        return summary.sort_values("Total (s)", ascending=False).reset_index(drop=True)
+
+    def combo_summary(self):
+        """依參數組合彙總：每組的總耗時、各階段耗時（毫秒）與配置量"""
+        by_id = {event["id"]: event for event in self.events}
+        rows = {}
+        for event in self.events:
+            # 往上找到所屬的 combo 階段
+            root = event
+            while root is not None and root["name"] != "combo":
+                root = by_id.get(root["parent"])
+            if root is None:
+                continue
+            key = (root["args"].get("ticker"), root["args"].get("combo"))
+            row = rows.setdefault(
+                key, {"Ticker": key[0], "Combo": key[1], "Total (ms)": 0, "MB": 0}
+            )
+            if event is root:
+                row["Total (ms)"] = event["dur"] / 1e3
+            else:
+                row[event["name"]] = row.get(event["name"], 0) + event["dur"] / 1e3
+                row["MB"] += event["nbytes"] / 1024 / 1024
+        df = pd.DataFrame(list(rows.values()))
+        if df.empty:
+            return df
+        # 指標取自快取的組合沒有 talib 階段，視為 0
+        df = df.fillna(0)
+        return df.sort_values("Total (ms)", ascending=False).reset_index(drop=True)
+
+    def to_json(self):
+        """匯出事件與彙總"""
+        return {
+            "summary": self.summary().to_dict("records"),
+            "events": self.events,
+        }
+
+    def to_chrome_trace(self):
+        """匯出 Chrome trace 格式（完整事件 ph=X，時間單位為微秒）"""
+        return {
+            "traceEvents": [
+                {
+                    "name": event["name"],
+                    "cat": "backtest",
+                    "ph": "X",
+                    "ts": event["ts"],
+                    "dur": event["dur"],
+                    "pid": event["pid"],
+                    "tid": event["tid"],
+                    "args": dict(event["args"], nbytes=event["nbytes"]),
+                }
+                for event in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def save_json(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_json(), file, ensure_ascii=False, indent=2, default=str)
+
+    def save_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_chrome_trace(), file, ensure_ascii=False, default=str)
+
+
+def start_profiling():
+    """在目前的執行緒啟用效能記錄，回傳新的記錄器；其他執行緒的記錄器不受影響"""
+    profiler = Profiler()
+    profiler._token = _ACTIVE.set(profiler)
+    return profiler
+
+
+def stop_profiling(profiler=None):
+    """
+    停用目前執行緒的效能記錄，回傳停用前的記錄器
+    指定 profiler 時只停用該記錄器，並恢復啟用它之前的記錄器；它不是目前啟用的記錄器時回傳 None
+    """
+    active = _ACTIVE.get()
+    if active is None or (profiler is not None and active is not profiler):
+        return None
+    if active._token is not None:
+        _ACTIVE.reset(active._token)
+        active._token = None
+    else:
+        _ACTIVE.set(None)
+    return active
+
+
+def get_profiler():
+    """目前執行緒啟用的記錄器，未啟用時為 None"""
+    return _ACTIVE.get()
+
+
+@contextmanager
+def profile_stage(name, **args):
+    """
+    記錄一個階段；目前執行緒未啟用時不做任何記錄
+    回傳的事件可設定 nbytes，未啟用時為 None，呼叫端可略過計算配置量
+    """
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name, **args) as event:
+        yield event
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+
+def combo_key(combo):
+    """參數組合的快取鍵值，清單與元組視為相同"""
+    ma_period, rsi_period, macd_param, willr_period, kdj_param = combo
+    return json.dumps(
+        [ma_period, rsi_period, list(macd_param), willr_period, list(kdj_param)]
+    )
+
+
+class ResultCache:
+    """
+    回測結果的持久化快取（SQLite）
+    鍵值為 (ticker, 資料版本, signals.yaml 版本, 參數組合)，超過 max_entries 時淘汰最久未使用的項目
+    """
+
+    def __init__(
+        self, path=os.path.join("data_cache", "results.sqlite"), max_entries=200000
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    ticker TEXT,
+                    data_hash TEXT,
+                    signals_hash TEXT,
+                    combo TEXT,
+                    result TEXT,
+                    last_used REAL,
+                    PRIMARY KEY (ticker, data_hash, signals_hash, combo)
+                )
+                """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """開啟連線，結束時提交並關閉"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, ticker, data_hash, signals_hash, combos):
+        """取得已快取的結果，回傳 combo_key -> 結果列"""
+        keys = [combo_key(combo) for combo in combos]
+        found = {}
+        with self._connect() as conn:
+            # SQLite 參數數量有上限，分批查詢
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                rows = conn.execute(
+                    f"""
+                    SELECT combo, result FROM results
+                    WHERE ticker = ? AND data_hash = ? AND signals_hash = ?
+                    AND combo IN ({",".join("?" * len(batch))})
+                    """,
+                    [ticker, data_hash, signals_hash, *batch],
+                ).fetchall()
+                found.update({key: json.loads(result) for key, result in rows})
+            if found:
+                conn.executemany(
+                    """
+                    UPDATE results SET last_used = ?
+                    WHERE ticker = ? AND data_hash = ? AND signals_hash = ? AND combo = ?
+                    """,
+                    [(time.time(), ticker, data_hash, signals_hash, k) for k in found],
+                )
+        return found
+
+    def put_many(self, ticker, data_hash, signals_hash, items):
+        """寫入 (combo, 結果列) 清單，並淘汰超出上限的舊項目"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        ticker,
+                        data_hash,
+                        signals_hash,
+                        combo_key(combo),
+                        json.dumps(result, default=lambda o: o.item()),
+                        now,
+                    )
+                    for combo, result in items
+                ],
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """刪除超過 max_entries 的最久未使用項目"""
+        (count,) = conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        if self.max_entries and count > self.max_entries:
+            conn.execute(
+                """
+                DELETE FROM results WHERE rowid IN (
+                    SELECT rowid FROM results ORDER BY last_used LIMIT ?
+                )
+                """,
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        """清空快取"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
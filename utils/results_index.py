@@ -0,0 +1,308 @@
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# 結果列欄位 -> 資料庫欄位；參數以整數欄位分開存放，可直接篩選與排序
+PARAM_COLUMNS = {
+    "MA": "ma",
+    "RSI": "rsi",
+    "MACD Fast": "macd_fast",
+    "MACD Slow": "macd_slow",
+    "MACD Signal": "macd_signal",
+    "WILLR": "willr",
+    "KDJ Fast K": "kdj_fastk",
+    "KDJ Slow K": "kdj_slowk",
+    "KDJ Slow D": "kdj_slowd",
+}
+METRIC_COLUMNS = {
+    "Gross Profit": "gross_profit",
+    "Gross Loss": "gross_loss",
+    "Profit Factor": "profit_factor",
+    "Count": "count",
+    "Windows": "windows",
+    "Train Profit Factor": "train_profit_factor",
+    "Test Profit Factor": "test_profit_factor",
+    "Test Count": "test_count",
+    "Profitable Windows": "profitable_windows",
+}
+COLUMNS = {"Ticker": "ticker", **PARAM_COLUMNS, **METRIC_COLUMNS}
+
+
+def _parse_tuple(value):
+    """舊版結果表的 "(12,26,9)" 字串或元組轉為整數元組"""
+    if isinstance(value, str):
+        return tuple(int(part) for part in value.strip("()[] ").split(","))
+    return tuple(int(part) for part in value)
+
+
+def _plain(value):
+    """NumPy 純量轉為 Python 型別，NaN 存為 NULL"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def row_combo(row):
+    """結果列（查詢結果的一列）對應的參數組合"""
+    return (
+        int(row["MA"]),
+        int(row["RSI"]),
+        (int(row["MACD Fast"]), int(row["MACD Slow"]), int(row["MACD Signal"])),
+        int(row["WILLR"]),
+        (int(row["KDJ Fast K"]), int(row["KDJ Slow K"]), int(row["KDJ Slow D"])),
+    )
+
+
+def parameter_values(frame):
+    """查詢結果中用到的各指標參數，格式與參數選單相同"""
+    combos = [row_combo(row) for _, row in frame.iterrows()]
+    return {
+        key: sorted({combo[i] for combo in combos})
+        for i, key in enumerate(["ma", "rsi", "macd", "willr", "kdj"])
+    }
+
+
+class ResultsIndex:
+    """
+    回測結果的索引資料庫（SQLite），每次儲存結果為一次 run，每列為 (run, ticker, 參數組合)
+    只有各股票最新一次 run 的列標記為 latest，跨股票的排行與篩選走索引，不需讀取各檔結果表
+    每檔股票保留最近 keep_runs 次 run
+    """
+
+    def __init__(self, path=os.path.join("data", "results_index.sqlite"), keep_runs=3):
+        self.path = path
+        self.keep_runs = keep_runs
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        params = ", ".join(f"{column} INTEGER" for column in PARAM_COLUMNS.values())
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticker TEXT,
+                    created REAL,
+                    combos INTEGER
+                )
+                """)
+            # 獲利視窗比例（0~1）為 REAL，其餘次數為 INTEGER
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS results (
+                    run_id INTEGER,
+                    ticker TEXT,
+                    latest INTEGER,
+                    {params},
+                    gross_profit REAL,
+                    gross_loss REAL,
+                    profit_factor REAL,
+                    count INTEGER,
+                    windows INTEGER,
+                    train_profit_factor REAL,
+                    test_profit_factor REAL,
+                    test_count INTEGER,
+                    profitable_windows REAL
+                )
+                """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS runs_ticker ON runs (ticker, run_id)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_run ON results (run_id)")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS results_latest_pf
+                ON results (latest, profit_factor DESC)
+                """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS results_ticker_pf
+                ON results (ticker, latest, profit_factor DESC)
+                """)
+
+    @contextmanager
+    def _connect(self):
+        """開啟連線，結束時提交並關閉"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record_run(self, ticker, results):
+        """
+        寫入一檔股票的一次回測結果（結果列清單或 DataFrame），回傳 run_id
+        同一檔股票較早的列不再是 latest，超過 keep_runs 的舊 run 一併刪除
+        """
+        frame = pd.DataFrame(results)
+        rows = []
+        for record in frame.to_dict("records"):
+            macd = _parse_tuple(record["MACD"])
+            kdj = _parse_tuple(record["KDJ"])
+            params = (record["MA"], record["RSI"], *macd, record["WILLR"], *kdj)
+            metrics = [record.get(name) for name in METRIC_COLUMNS]
+            rows.append([_plain(value) for value in (*params, *metrics)])
+
+        names = ", ".join([*PARAM_COLUMNS.values(), *METRIC_COLUMNS.values()])
+        marks = ", ".join("?" * (len(PARAM_COLUMNS) + len(METRIC_COLUMNS) + 3))
+        with self._connect() as conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (ticker, created, combos) VALUES (?, ?, ?)",
+                (ticker, time.time(), len(rows)),
+            ).lastrowid
+            conn.execute(
+                "UPDATE results SET latest = 0 WHERE ticker = ? AND latest = 1",
+                (ticker,),
+            )
+            conn.executemany(
+                f"INSERT INTO results (run_id, ticker, latest, {names}) "
+                f"VALUES ({marks})",
+                [(run_id, ticker, 1, *row) for row in rows],
+            )
+            self._prune(conn, ticker)
+        return run_id
+
+    def _prune(self, conn, ticker):
+        """刪除超過 keep_runs 的舊 run"""
+        if not self.keep_runs:
+            return
+        old = [
+            run_id
+            for (run_id,) in conn.execute(
+                "SELECT run_id FROM runs WHERE ticker = ? "
+                "ORDER BY run_id DESC LIMIT -1 OFFSET ?",
+                (ticker, self.keep_runs),
+            )
+        ]
+        if old:
+            marks = ",".join("?" * len(old))
+            conn.execute(f"DELETE FROM results WHERE run_id IN ({marks})", old)
+            conn.execute(f"DELETE FROM runs WHERE run_id IN ({marks})", old)
+
+    def version(self):
+        """最新的 run_id，有新結果寫入時必定增加，可作為快取鍵值"""
+        with self._connect() as conn:
+            (run_id,) = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return run_id or 0
+
+    def tickers(self):
+        """有回測結果的股票代號"""
+        with self._connect() as conn:
+            return [
+                ticker
+                for (ticker,) in conn.execute(
+                    "SELECT DISTINCT ticker FROM runs ORDER BY ticker"
+                )
+            ]
+
+    def query(
+        self,
+        tickers=None,
+        min_count=None,
+        min_profit_factor=None,
+        limit=None,
+        run_id=None,
+    ):
+        """
+        查詢回測結果，依獲利因子由高到低排序（沒有虧損交易的 NaN 排在最後）
+        預設只查各股票最新一次 run，指定 run_id 時查該次 run
+        回傳欄位為 Ticker、各參數的整數欄位與績效欄位
+        """
+        where, args = [], []
+        if run_id is None:
+            where.append("latest = 1")
+        else:
+            where.append("run_id = ?")
+            args.append(run_id)
+        if tickers is not None:
+            tickers = list(tickers)
+            where.append(f"ticker IN ({','.join('?' * len(tickers))})")
+            args += tickers
+        if min_count is not None:
+            where.append("count >= ?")
+            args.append(min_count)
+        if min_profit_factor is not None:
+            where.append("profit_factor >= ?")
+            args.append(min_profit_factor)
+        sql = (
+            f"SELECT {', '.join(COLUMNS.values())} FROM results "
+            f"WHERE {' AND '.join(where)} ORDER BY profit_factor DESC"
+        )
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return self._frame(rows)
+
+    def best_per_ticker(self, tickers=None):
+        """
+        各股票最新一次 run 中獲利因子最高的一列
+        每檔股票以 (ticker, latest, profit_factor) 索引直接取第一列，不需掃描全部結果
+        """
+        where, args = "", []
+        if tickers is not None:
+            tickers = list(tickers)
+            where = f"WHERE ticker IN ({','.join('?' * len(tickers))})"
+            args = tickers
+        sql = f"""
+            SELECT {', '.join(COLUMNS.values())} FROM results WHERE rowid IN (
+                SELECT (
+                    SELECT rowid FROM results
+                    WHERE ticker = runs.ticker AND latest = 1
+                    ORDER BY profit_factor DESC LIMIT 1
+                ) FROM (SELECT DISTINCT ticker FROM runs {where}) AS runs
+            ) ORDER BY profit_factor DESC
+            """
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return self._frame(rows)
+
+    def _frame(self, rows):
+        frame = pd.DataFrame(rows, columns=list(COLUMNS))
+        # 沒有滾動視窗驗證的 run 不顯示這些空欄位
+        if frame["Windows"].isna().all():
+            frame = frame.drop(columns=list(METRIC_COLUMNS)[4:])
+        return frame
+
+    def sync_from_storage(self, storage):
+        """
+        匯入還沒有索引的舊結果表（{ticker}_strategy_results），回傳匯入的股票
+        只索引有歷史資料（{ticker}_raw_data）的股票，其他同名結尾的表（例如批次回測的彙總）
+        不是股票的結果；已索引但沒有歷史資料的股票會從索引移除
+        之後的回測會在儲存結果時直接寫入索引
+        """
+        from utils.storage import STRATEGY_RESULTS
+
+        key_name = f"_{STRATEGY_RESULTS}"
+        tickers = set(storage.list_tickers())
+        indexed = set(self.tickers())
+        self.forget(indexed - tickers)
+        imported = []
+        for name in storage.list_names(key_name):
+            ticker = name[: -len(key_name)]
+            if ticker in tickers and ticker not in indexed:
+                results = storage.read(name)
+                if not results.empty:
+                    self.record_run(ticker, results)
+                    imported.append(ticker)
+        return imported
+
+    def forget(self, tickers):
+        """從索引移除股票的所有 run"""
+        tickers = list(tickers)
+        if not tickers:
+            return
+        marks = ",".join("?" * len(tickers))
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM results WHERE ticker IN ({marks})", tickers)
+            conn.execute(f"DELETE FROM runs WHERE ticker IN ({marks})", tickers)
+
+    def clear(self):
+        """清空索引"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
+            conn.execute("DELETE FROM runs")
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+from utils.signal_utils import (
+    evaluator_for_config,
+    load_signals,
+    max_lookback,
+    parse_logic,
+    referenced_columns,
+)
+from utils.results_index import ResultsIndex, row_combo
+from utils.storage import get_storage, raw_data_name
+from utils.streaming_utils import TAIL_BARS, IndicatorStreams
+from utils.talib_utils import (
+    INDICATOR_OF_COLUMN,
+    base_columns,
+    combo_indicator_params,
+    get_indicator_columns,
+)
+
+# 沒有指定參數、或股票沒有回測結果時，使用各指標函式的預設參數
+DEFAULT_COMBO = (20, 14, (12, 26, 9), 14, (9, 3, 3))
+
+
+def best_combos(tickers, index=None):
+    """
+    各股票最新一次回測中獲利因子最高的參數組合，回傳 ticker -> (參數組合, 獲利因子)
+    沒有回測結果的股票不在結果中
+    """
+    best = (index or ResultsIndex()).best_per_ticker(tickers)
+    return {
+        row["Ticker"]: (row_combo(row), row["Profit Factor"])
+        for _, row in best.iterrows()
+    }
+
+
+def _tail_values(values, depth):
+    """最後 depth 筆的浮點數值，資料不足時前面補 NaN"""
+    values = np.asarray(values, dtype=float)[-depth:]
+    if len(values) < depth:
+        values = np.concatenate([np.full(depth - len(values), np.nan), values])
+    return values
+
+
+def _state_columns(state, data, specs, depth):
+    """
+    由指標串流狀態取得各指標最近的值，狀態不存在、不是最新或缺少任一組指標時回傳 None
+    串流狀態以完整歷史推進，與回測及其他頁面的指標值相同
+    """
+    if state is None or depth > TAIL_BARS or state.last_date is None:
+        return None
+    last_date = pd.Timestamp(data["Date"].iloc[-1]).normalize()
+    if state.last_date.normalize() != last_date:
+        return None
+    columns = {}
+    for indicator, params in specs:
+        values = state.columns(indicator, params)
+        if values is None:
+            return None
+        columns.update(values)
+    return columns
+
+
+def screen_universe(
+    tickers=None,
+    folder="data",
+    use_best=False,
+    combo=DEFAULT_COMBO,
+    bars=None,
+    signals=None,
+):
+    """
+    以信號設定掃描多檔股票的最新一根 K 棒
+    指標值優先讀取匯入資料時建立的串流狀態（只以新 K 棒推進，不需重算）
+    狀態缺少時才以 TA-Lib 重算：以最近 bars 根計算（None 為完整歷史），指標放入指標快取
+    條件用到的欄位依回溯深度取最後幾筆，排成 (筆數 × 股票數) 後一次求值
+    use_best 時各檔使用結果索引中獲利因子最高的參數，沒有結果的股票使用 combo
+    回傳 (每檔一列的結果表, ticker -> 錯誤訊息)
+    """
+    storage = get_storage(folder)
+    tickers = list(tickers) if tickers is not None else storage.list_tickers()
+    evaluator = evaluator_for_config(
+        load_signals().config if signals is None else signals
+    )
+    trees = [
+        parse_logic(evaluator.config[name]) for name in ("buy_signal", "sell_signal")
+    ]
+    depth = max(max_lookback(tree) for tree in trees) + 1
+    needed = set().union(*(referenced_columns(tree) for tree in trees)) | {"Close"}
+    used_indicators = {
+        INDICATOR_OF_COLUMN[name] for name in needed if name in INDICATOR_OF_COLUMN
+    }
+
+    best = best_combos(tickers) if use_best else {}
+    rows, tails, errors = [], [], {}
+    for ticker in tickers:
+        try:
+            data = storage.read(raw_data_name(ticker))
+            if data.empty:
+                raise ValueError("沒有資料")
+            problems = evaluator.validate([*data.columns, *INDICATOR_OF_COLUMN])
+            if problems:
+                raise ValueError("；".join(problems))
+
+            ticker_combo, profit_factor = best.get(ticker, (combo, np.nan))
+            # 只取條件用到的指標
+            specs = [
+                (indicator, params)
+                for indicator, params in combo_indicator_params(ticker_combo)
+                if indicator in used_indicators
+            ]
+            state = IndicatorStreams.load(ticker, folder)
+            indicators = _state_columns(state, data, specs, depth)
+            source = "state"
+            tail = data.iloc[-bars:] if bars else data
+            tail = tail.reset_index(drop=True)
+            if indicators is None:
+                source = "talib"
+                indicators = {}
+                for indicator, params in specs:
+                    indicators.update(
+                        get_indicator_columns(ticker, tail, indicator, params)
+                    )
+            columns = {**base_columns(tail), **indicators}
+        except Exception as e:
+            errors[ticker] = f"{type(e).__name__}: {e}"
+            continue
+
+        ma_period, rsi_period, macd_param, willr_period, kdj_param = ticker_combo
+        rows.append(
+            {
+                "Ticker": ticker,
+                "Date": tail["Date"].iloc[-1],
+                "Close": tail["Close"].iloc[-1],
+                "MA": ma_period,
+                "RSI": rsi_period,
+                "MACD": "({},{},{})".format(*macd_param),
+                "WILLR": willr_period,
+                "KDJ": "({},{},{})".format(*kdj_param),
+                "Profit Factor": profit_factor,
+                "Source": source,
+            }
+        )
+        tails.append({name: _tail_values(columns[name], depth) for name in needed})
+
+    table = pd.DataFrame(
+        rows,
+        columns=[
+            "Ticker",
+            "Date",
+            "Close",
+            "MA",
+            "RSI",
+            "MACD",
+            "WILLR",
+            "KDJ",
+            "Profit Factor",
+            "Source",
+        ],
+    )
+    if tails:
+        # 所有股票的條件欄位排成 (筆數 × 股票數)，買賣條件各只求值一次
+        matrix = {
+            name: np.column_stack([tail[name] for tail in tails]) for name in needed
+        }
+        table["Buy"] = evaluator.buy_mask(matrix)[-1]
+        table["Sell"] = evaluator.sell_mask(matrix)[-1]
+        table = table.sort_values(
+            ["Buy", "Sell", "Profit Factor"], ascending=False
+        ).reset_index(drop=True)
+    else:
+        table["Buy"] = pd.Series(dtype=bool)
+        table["Sell"] = pd.Series(dtype=bool)
+    return table, errors
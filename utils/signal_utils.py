@@ -1,54 +1,95 @@
 import os
-import yaml
+import re
+import json
+import hashlib
+import operator as op
+from collections import namedtuple
+from functools import reduce
+
+import numpy as np
+
+from utils.profiler import profile_stage
+
+# 條件字串中的比較運算符，對應到可直接作用於整個陣列的 NumPy 運算
+OPERATORS = {
+    ">": op.gt,
+    "<": op.lt,
+    ">=": op.ge,
+    "<=": op.le,
+    "=": op.eq,
+    "==": op.eq,
+    "!=": op.ne,
+}
+
+# 交叉運算符：此根成立、前一根不成立
+CROSSES = {
+    "crosses_above": (op.gt, op.le),
+    "crosses_below": (op.lt, op.ge),
+}
+
+# 欄位運算元，可加上 [n] 取 n 根 K 棒前的值，例如 MA[1]
+OPERAND_PATTERN = re.compile(r"^([A-Za-z_]\w*)(?:\[(\d+)\])?$")
+
+# 已載入的信號設定檔：檔名 -> (檔案簽章, 內容雜湊, 編譯好的 SignalEvaluator)
+_LOADED = {}
+# 依設定內容編譯的 evaluator：設定雜湊 -> SignalEvaluator，供子程序使用主程序的設定快照
+_COMPILED = {}
+_COMPILED_MAX_ENTRIES = 16
+
+# 條件的語法樹節點
+Column = namedtuple("Column", ["name", "lookback"])
+Constant = namedtuple("Constant", ["value"])
+Comparison = namedtuple("Comparison", ["left", "operator", "right"])
+Logic = namedtuple("Logic", ["operator", "children"])
 
 
 class SignalEvaluator:
-    def __init__(self, filename="signals.yaml"):
+    def __init__(self, filename="signals.yaml", config=None):
         self.filename = filename
-        self.config = self.load_yaml_config()
+        self.config = self.load_yaml_config() if config is None else config
+        self._compiled = {}
 
     def load_yaml_config(self):
         """讀取 YAML 設定"""
+        import yaml  # 只在讀寫設定檔時載入
+
         if os.path.exists(self.filename):
             with open(self.filename, "r", encoding="utf-8") as file:
                 return yaml.safe_load(file)
-        return {"buy_signal": {"conditions": []}, "sell_signal": {"conditions": []}}
+        # 空的 or 條件永遠不成立
+        return {"buy_signal": {"or": []}, "sell_signal": {"or": []}}
+
+    def save_yaml_config(self, config=None):
+        """儲存 YAML 設定，指定 config 時先取代目前的設定"""
+        import yaml
 
-    def save_yaml_config(self):
-        """儲存 YAML 設定"""
+        if config is not None:
+            self.config = config
+            self._compiled = {}
         with open(self.filename, "w", encoding="utf-8") as file:
             yaml.dump(self.config, file, default_flow_style=False, allow_unicode=True)
+        # 已載入的設定在下次 load_signals 時重新讀取
+        _LOADED.pop(self.filename, None)
+
+    def config_hash(self):
+        """信號設定內容的雜湊，設定有變動時回測快取即失效"""
+        content = json.dumps(self.config, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def validate(self, columns):
+        """檢查目前的信號設定，回傳問題清單（格式錯誤、不支援的運算符與不存在的欄位）"""
+        return validate_config(self.config, columns)
 
     def evaluate_condition(self, condition, row):
-        """根據條件進行比較"""
-        # 解析條件格式，例如："MACD_Diff: < 0" 轉換為 key、operator 和 value
-        key, operator_value = list(condition.items())[0]
-        operator, value = operator_value.split()
-
-        # 轉換條件中的 value 為數字
-        value = float(value)
-
-        # 根據不同的運算符進行比較
-        if operator == ">":
-            return row[key] > value
-        elif operator == "<":
-            return row[key] < value
-        elif operator == "=":
-            return row[key] == value
-        else:
-            return False
+        """
+        根據條件進行比較，row 為單筆資料
+        回溯與交叉條件需要整段資料，請改用 buy_mask/sell_mask
+        """
+        return bool(compile_node(parse_condition(condition))(row))
 
     def evaluate_logic(self, logic, row):
         """根據邏輯條件進行遞歸評估"""
-        if "or" in logic:
-            # 如果是 "or" 條件，任何一個條件為真就返回真
-            return any(self.evaluate_logic(cond, row) for cond in logic["or"])
-        elif "and" in logic:
-            # 如果是 "and" 條件，所有條件必須為真
-            return all(self.evaluate_logic(cond, row) for cond in logic["and"])
-        else:
-            # 如果是基本條件，直接評估
-            return self.evaluate_condition(logic, row)
+        return bool(self.compile_logic(logic)(row))
 
     def is_buy_signal(self, row):
         """判斷是否為買入信號"""
@@ -57,3 +98,267 @@ class SignalEvaluator:
     def is_sell_signal(self, row):
         """判斷是否為賣出信號"""
         return self.evaluate_logic(self.config["sell_signal"], row)
+
+    def compile_condition(self, condition):
+        """將單一條件解析一次，編譯為 func(columns) -> 布林陣列"""
+        return compile_node(parse_condition(condition))
+
+    def compile_logic(self, logic):
+        """將 and/or 條件樹解析為語法樹後編譯為向量化函式，整段資料一次求值"""
+        return compile_node(parse_logic(logic))
+
+    def compile(self):
+        """解析並編譯買賣信號，格式錯誤時拋出 ValueError"""
+        for name in ("buy_signal", "sell_signal"):
+            self._compiled_signal(name)
+        return self
+
+    def _compiled_signal(self, name):
+        """取得已編譯的信號函式，每個 evaluator 只編譯一次"""
+        if name not in self._compiled:
+            self._compiled[name] = self.compile_logic(self.config[name])
+        return self._compiled[name]
+
+    def buy_mask(self, columns):
+        """計算整段資料的買入信號布林陣列"""
+        return self._evaluate_signal("buy_signal", columns)
+
+    def sell_mask(self, columns):
+        """計算整段資料的賣出信號布林陣列"""
+        return self._evaluate_signal("sell_signal", columns)
+
+    def _evaluate_signal(self, name, columns):
+        with profile_stage(name) as event:
+            mask = self._compiled_signal(name)(columns)
+            if event is not None:
+                event["nbytes"] = mask.nbytes
+        return mask
+
+
+def _file_signature(filename):
+    """檔案的修改時間與大小，不存在時為 None"""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_signals(filename="signals.yaml"):
+    """
+    取得已載入的信號設定，回測時以此取代每組參數各自建立 SignalEvaluator
+    檔案簽章沒有變動時直接回傳同一個 evaluator，條件只在第一次求值時編譯一次
+    有變動時比對內容雜湊，內容不同才重新解析
+    """
+    signature = _file_signature(filename)
+    cached = _LOADED.get(filename)
+    if cached is not None and cached[0] == signature:
+        return cached[2]
+
+    content = b""
+    if signature is not None:
+        with open(filename, "rb") as file:
+            content = file.read()
+    digest = hashlib.sha1(content).hexdigest()
+    if cached is not None and cached[1] == digest:
+        evaluator = cached[2]
+    else:
+        import yaml
+
+        config = yaml.safe_load(content.decode("utf-8")) if signature else None
+        evaluator = SignalEvaluator(filename, config)
+    _LOADED[filename] = (signature, digest, evaluator)
+    return evaluator
+
+
+def evaluator_for_config(config):
+    """
+    依設定內容取得 evaluator，同一份設定在同一個程序內只編譯一次
+    平行回測時子程序以主程序開始時的設定快照求值，執行中修改 signals.yaml 不影響結果
+    """
+    evaluator = SignalEvaluator(config=config)
+    key = evaluator.config_hash()
+    if key not in _COMPILED:
+        if len(_COMPILED) >= _COMPILED_MAX_ENTRIES:
+            _COMPILED.clear()
+        _COMPILED[key] = evaluator
+    return _COMPILED[key]
+
+
+def _combine(logical_op, funcs, columns, empty_value):
+    """以 logical_op 合併子條件結果；空條件清單比照 any()/all() 的回傳值"""
+    if not funcs:
+        return np.full(np.shape(columns["Close"]), empty_value, dtype=bool)
+    return reduce(logical_op, (func(columns) for func in funcs))
+
+
+def parse_operand(text):
+    """解析運算元：數字為常數，其他為欄位名稱（可加 [n] 回溯）"""
+    text = str(text).strip()
+    try:
+        return Constant(float(text))
+    except ValueError:
+        pass
+    match = OPERAND_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"無法解析的運算元: {text}")
+    return Column(match.group(1), int(match.group(2) or 0))
+
+
+def parse_condition(condition):
+    """
+    解析基本條件，例如 {"MACD_Hist": "< 0"}、{"Close": "> MA"}、{"K": "crosses_above D"}
+    左右兩邊都可以是欄位或數字，但至少要有一個欄位
+    """
+    if not isinstance(condition, dict) or len(condition) != 1:
+        raise ValueError(f"條件格式錯誤: {condition}")
+    key, operator_value = list(condition.items())[0]
+    parts = str(operator_value).split()
+    if len(parts) != 2:
+        raise ValueError(f"條件格式錯誤，應為「運算符 值」: {condition}")
+    operator, value = parts
+    if operator not in OPERATORS and operator not in CROSSES:
+        raise ValueError(f"不支援的運算符 {operator}: {condition}")
+
+    left, right = parse_operand(key), parse_operand(value)
+    if isinstance(left, Constant) and isinstance(right, Constant):
+        raise ValueError(f"條件至少要有一個欄位: {condition}")
+    return Comparison(left, operator, right)
+
+
+def parse_logic(logic):
+    """將 and/or 條件樹解析為語法樹"""
+    if isinstance(logic, dict) and len(logic) == 1:
+        for key in ("or", "and"):
+            if key in logic:
+                children = logic[key]
+                if not isinstance(children, list):
+                    raise ValueError(f"{key} 條件必須是清單: {logic}")
+                return Logic(key, [parse_logic(child) for child in children])
+    return parse_condition(logic)
+
+
+def referenced_columns(node):
+    """語法樹中用到的欄位名稱"""
+    if isinstance(node, Logic):
+        return {name for child in node.children for name in referenced_columns(child)}
+    return {
+        operand.name
+        for operand in (node.left, node.right)
+        if isinstance(operand, Column)
+    }
+
+
+def max_lookback(node):
+    """語法樹求值時往前回溯的最多 K 棒數，交叉條件需要多看前一根"""
+    if isinstance(node, Logic):
+        return max((max_lookback(child) for child in node.children), default=0)
+    extra = 1 if node.operator in CROSSES else 0
+    return max(
+        (
+            operand.lookback + extra
+            for operand in (node.left, node.right)
+            if isinstance(operand, Column)
+        ),
+        default=0,
+    )
+
+
+def validate_config(config, columns):
+    """
+    檢查信號設定，回傳問題清單，沒有問題時為空清單
+    columns 為求值時可用的欄位名稱，條件用到其他欄位即列為問題
+    """
+    problems = []
+    for name in ("buy_signal", "sell_signal"):
+        if name not in config:
+            problems.append(f"{name}: 缺少設定")
+        else:
+            _collect_problems(name, config[name], set(columns), problems)
+    return problems
+
+
+def _collect_problems(name, logic, columns, problems):
+    """逐一檢查條件樹中的每個條件，一次列出所有問題"""
+    if (
+        isinstance(logic, dict)
+        and len(logic) == 1
+        and ("or" in logic or "and" in logic)
+    ):
+        children = logic.get("or", logic.get("and"))
+        if not isinstance(children, list):
+            problems.append(f"{name}: and/or 條件必須是清單: {logic}")
+            return
+        for child in children:
+            _collect_problems(name, child, columns, problems)
+        return
+    try:
+        node = parse_condition(logic)
+    except ValueError as e:
+        problems.append(f"{name}: {e}")
+        return
+    unknown = sorted(referenced_columns(node) - columns)
+    if unknown:
+        problems.append(f"{name}: 未知的欄位 {', '.join(unknown)}")
+
+
+def _shift(values, periods):
+    """往後平移 periods 根，前面補 NaN；二維時沿第一軸（時間）平移"""
+    if periods == 0:
+        return values
+    if values.ndim == 0:
+        raise ValueError("逐筆求值不支援回溯與交叉條件，請以整段資料求值")
+    shifted = np.full(values.shape, np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[: len(values) - periods]
+    return shifted
+
+
+def _compile_operand(operand, extra_lookback=0):
+    """編譯運算元為 func(columns)，extra_lookback 為額外回溯的根數（交叉條件取前一根用）"""
+    if isinstance(operand, Constant):
+        return lambda columns: operand.value
+    name, lookback = operand.name, operand.lookback + extra_lookback
+    return lambda columns: _shift(np.asarray(columns[name], dtype=float), lookback)
+
+
+def _not_equal(left, right):
+    """不相等；任一邊為 NaN（資料不足）時與其他比較相同，視為不成立"""
+    return np.not_equal(left, right) & ~np.isnan(left) & ~np.isnan(right)
+
+
+def compile_node(node):
+    """將語法樹編譯為 func(columns) -> 布林陣列，所有運算都對整段資料一次進行"""
+    if isinstance(node, Logic):
+        funcs = [compile_node(child) for child in node.children]
+        if node.operator == "or":
+            return lambda columns: _combine(np.logical_or, funcs, columns, False)
+        return lambda columns: _combine(np.logical_and, funcs, columns, True)
+
+    if (
+        node.operator in OPERATORS
+        and node.operator != "!="
+        and isinstance(node.left, Column)
+        and node.left.lookback == 0
+        and isinstance(node.right, Constant)
+    ):
+        # 最常見的「欄位 比較 常數」直接比較，省去運算元的函式呼叫
+        compare, name, value = (
+            OPERATORS[node.operator],
+            node.left.name,
+            node.right.value,
+        )
+        return lambda columns: compare(np.asarray(columns[name], dtype=float), value)
+
+    left, right = _compile_operand(node.left), _compile_operand(node.right)
+    if node.operator in CROSSES:
+        now, before = CROSSES[node.operator]
+        previous_left = _compile_operand(node.left, 1)
+        previous_right = _compile_operand(node.right, 1)
+        return lambda columns: now(left(columns), right(columns)) & before(
+            previous_left(columns), previous_right(columns)
+        )
+    if node.operator == "!=":
+        return lambda columns: _not_equal(left(columns), right(columns))
+    compare = OPERATORS[node.operator]
+    return lambda columns: compare(left(columns), right(columns))
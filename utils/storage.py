@@ -0,0 +1,273 @@
+import os
+import glob
+import shutil
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  # streamlit 已依賴 pyarrow，缺少時退回 CSV
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+# 讀取時統一轉為日期型別的欄位
+DATE_COLUMNS = ["Date", "Buy Date"]
+
+RAW_DATA = "raw_data"
+STRATEGY_RESULTS = "strategy_results"
+HALVING_RESULTS = "halving_results"
+
+
+def raw_data_name(ticker):
+    """歷史資料的儲存名稱"""
+    return f"{ticker}_{RAW_DATA}"
+
+
+def strategy_results_name(ticker):
+    """綜合回測結果的儲存名稱"""
+    return f"{ticker}_{STRATEGY_RESULTS}"
+
+
+def halving_results_name(ticker):
+    """逐輪淘汰結果的儲存名稱，與完整網格的綜合結果分開存放"""
+    return f"{ticker}_{HALVING_RESULTS}"
+
+
+def _coerce_types(df):
+    """將日期欄位轉為 datetime，避免各頁面各自決定是否 parse_dates"""
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+class CsvStorage:
+    """
+    以 CSV 檔案儲存資料表，與既有的資料夾格式相容
+    同名的資料表可能同時有 CSV 與 Parquet 兩種格式（例如版本控制中的 CSV 與匯入後的 Parquet）
+    讀取優先使用本後端的格式，沒有時讀取另一種格式，讀取不會轉換或刪除任何檔案
+    寫入與附加時兩種格式都會更新，切換 STORAGE_BACKEND 後讀到的資料相同
+    """
+
+    suffix = ".csv"
+
+    def __init__(self, folder="data"):
+        self.folder = folder
+
+    def path(self, name, suffix=None):
+        """資料表對應的檔案路徑"""
+        return os.path.join(self.folder, f"{name}{suffix or self.suffix}")
+
+    def parts_folder(self, name):
+        """Parquet 附加分段檔所在的資料夾"""
+        return os.path.join(self.folder, f"{name}.parts")
+
+    def _part_paths(self, name):
+        return sorted(glob.glob(os.path.join(self.parts_folder(name), "*.parquet")))
+
+    def _other(self):
+        """另一種格式的後端，沒有 pyarrow 時沒有 Parquet 格式"""
+        if isinstance(self, ParquetStorage):
+            return CsvStorage(self.folder)
+        return ParquetStorage(self.folder) if HAS_PYARROW else None
+
+    def _formats(self, name):
+        """資料表已存在的格式，本後端的格式在前"""
+        return [
+            storage
+            for storage in (self, self._other())
+            if storage is not None and storage._has_own(name)
+        ]
+
+    def exists(self, name):
+        return bool(self._formats(name))
+
+    def read(self, name):
+        """讀取資料表，只讀不轉換"""
+        formats = self._formats(name)
+        if not formats:
+            raise FileNotFoundError(self.path(name))
+        return formats[0]._read_own(name)
+
+    def signature(self, name):
+        """資料表所有檔案的 (路徑, 修改時間, 大小)，內容變動時必定不同"""
+        return tuple(
+            (path, stat.st_mtime_ns, stat.st_size)
+            for path in self._backing_paths(name)
+            if os.path.exists(path)
+            for stat in [os.stat(path)]
+        )
+
+    def _backing_paths(self, name):
+        return [self.path(name, CsvStorage.suffix), self.path(name, ".parquet")] + (
+            self._part_paths(name)
+        )
+
+    def write(self, name, df):
+        """整份覆寫資料表；另一種格式的檔案存在時一併覆寫，兩者不會不一致"""
+        others = [storage for storage in self._formats(name) if storage is not self]
+        for storage in [self] + others:
+            storage._write_own(name, df)
+
+    def append(self, name, df):
+        """在資料表尾端附加資料列，只寫入新的部分；已存在的各格式都會附加"""
+        formats = self._formats(name)
+        if not formats:
+            self._write_own(name, df)
+            return
+        for storage in formats:
+            storage._append_own(name, df)
+
+    def delete(self, name):
+        """刪除資料表的所有格式，回傳是否有檔案被刪除"""
+        deleted = False
+        for path in self._backing_paths(name):
+            if os.path.exists(path):
+                os.remove(path)
+                deleted = True
+        if os.path.isdir(self.parts_folder(name)):
+            shutil.rmtree(self.parts_folder(name))
+            deleted = True
+        return deleted
+
+    def list_names(self, key_name=""):
+        """列出資料夾內以 key_name 結尾的資料表名稱（任一格式）"""
+        if not os.path.isdir(self.folder):
+            return []
+        names = set()
+        for file in os.listdir(self.folder):
+            name, suffix = os.path.splitext(file)
+            if suffix in (CsvStorage.suffix, ".parquet") and name.endswith(key_name):
+                names.add(name)
+        return sorted(names)
+
+    def list_tickers(self):
+        """列出有歷史資料的股票代號"""
+        key_name = f"_{RAW_DATA}"
+        return [name[: -len(key_name)] for name in self.list_names(key_name)]
+
+    def clear(self):
+        """刪除資料夾內所有資料表"""
+        for name in self.list_names():
+            self.delete(name)
+
+    def export_csv(self, name, path=None):
+        """匯出資料表為 CSV"""
+        path = path or self.path(name, CsvStorage.suffix)
+        self.read(name).to_csv(path, index=False)
+        return path
+
+    def import_all(self):
+        """
+        將只有另一種格式的資料表轉存一份為本後端的格式，保留原檔，回傳轉存的資料表
+        之後寫入時兩種格式同時更新；只在明確要求時執行（例如 batch_backtest --import-storage）
+        """
+        other = self._other()
+        imported = []
+        for name in self.list_names():
+            if not self._has_own(name) and other is not None and other._has_own(name):
+                self._write_own(name, other._read_own(name))
+                imported.append(name)
+        return imported
+
+    # 以下只處理本後端格式的檔案
+
+    def _has_own(self, name):
+        return os.path.exists(self.path(name))
+
+    def _read_own(self, name):
+        return _coerce_types(pd.read_csv(self.path(name)))
+
+    def _write_own(self, name, df):
+        """先寫暫存檔再替換，讀取端不會看到寫到一半的檔案"""
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.path(name)
+        temp_path = f"{path}.tmp"
+        self._write_file(df, temp_path)
+        os.replace(temp_path, path)
+
+    def _write_file(self, df, path):
+        df.to_csv(path, index=False)
+
+    def _append_own(self, name, df):
+        df.to_csv(self.path(name), mode="a", header=False, index=False)
+
+
+class ParquetStorage(CsvStorage):
+    """
+    以壓縮的 Parquet 欄式檔案儲存資料表，保留欄位型別
+    只有 CSV 的資料表直接讀取 CSV；以 import_all 轉存一份 Parquet 後才改讀 Parquet
+    附加的資料寫成 {name}.parts 資料夾內的分段檔，累積超過 max_parts 時合併回主檔
+    """
+
+    suffix = ".parquet"
+
+    def __init__(
+        self, folder="data", memory_map=False, compression="zstd", max_parts=32
+    ):
+        super().__init__(folder)
+        self.memory_map = memory_map
+        self.compression = compression
+        self.max_parts = max_parts
+
+    def _read_own(self, name):
+        frames = [
+            pd.read_parquet(path, memory_map=self.memory_map)
+            for path in [self.path(name)] + self._part_paths(name)
+        ]
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _write_own(self, name, df):
+        """整份覆寫主檔，同時清除既有的附加分段"""
+        super()._write_own(name, df)
+        shutil.rmtree(self.parts_folder(name), ignore_errors=True)
+
+    def _write_file(self, df, path):
+        df.to_parquet(path, index=False, compression=self.compression)
+
+    def _append_own(self, name, df):
+        """以新的分段檔附加資料列，不需重寫主檔"""
+        part_paths = self._part_paths(name)
+        if len(part_paths) >= self.max_parts:
+            # 分段過多時合併一次，避免讀取時開啟大量小檔
+            self._write_own(
+                name, pd.concat([self._read_own(name), df], ignore_index=True)
+            )
+            return
+
+        os.makedirs(self.parts_folder(name), exist_ok=True)
+        part_path = os.path.join(
+            self.parts_folder(name), f"part-{len(part_paths):05d}.parquet"
+        )
+        self._write_file(df, f"{part_path}.tmp")
+        os.replace(f"{part_path}.tmp", part_path)
+
+    def import_csv(self, name, path=None):
+        """由 CSV 匯入資料表並轉存為 Parquet，保留原 CSV"""
+        df = _coerce_types(pd.read_csv(path or self.path(name, CsvStorage.suffix)))
+        self._write_own(name, df)
+        return df
+
+
+_STORAGES = {}
+
+
+def get_storage(folder="data"):
+    """
+    取得資料夾對應的儲存後端
+    以環境變數 STORAGE_BACKEND 選擇 csv 或 parquet，預設在有 pyarrow 時使用 parquet
+    STORAGE_MEMORY_MAP=1 時以 Arrow 記憶體映射讀取 Parquet
+    """
+    backend = os.environ.get(
+        "STORAGE_BACKEND", "parquet" if HAS_PYARROW else "csv"
+    ).lower()
+    key = (folder, backend)
+    if key not in _STORAGES:
+        if backend == "parquet":
+            _STORAGES[key] = ParquetStorage(
+                folder, memory_map=os.environ.get("STORAGE_MEMORY_MAP") == "1"
+            )
+        else:
+            _STORAGES[key] = CsvStorage(folder)
+    return _STORAGES[key]
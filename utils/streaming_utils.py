@@ -0,0 +1,487 @@
+import os
+import json
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+
+class SmaState:
+    """簡單移動平均，只累計有效值，前段 NaN 不計入（與 TA-Lib 相同）"""
+
+    def __init__(self, period, window=None):
+        self.period = period
+        self.window = deque(window or [], maxlen=period)
+
+    def update(self, value):
+        if math.isnan(value):
+            return NAN
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return NAN
+        return sum(self.window) / self.period
+
+    def to_dict(self):
+        return {"period": self.period, "window": list(self.window)}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["period"], state["window"])
+
+
+class EmaState:
+    """指數移動平均，以前 period 筆的平均值作為起點（TA-Lib 預設相容模式）"""
+
+    def __init__(self, period, seed=None, value=None):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.seed = seed or []
+        self.value = value
+
+    def update(self, value):
+        if self.value is None:
+            self.seed.append(value)
+            if len(self.seed) < self.period:
+                return NAN
+            self.value = sum(self.seed) / self.period
+            self.seed = []
+            return self.value
+        self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+    def to_dict(self):
+        return {"period": self.period, "seed": self.seed, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["period"], state["seed"], state["value"])
+
+
+class MaStream:
+    """MA 指標的串流狀態"""
+
+    columns = ["MA"]
+
+    def __init__(self, timeperiod=20, sma=None):
+        self.sma = sma or SmaState(timeperiod)
+
+    def update(self, high, low, close):
+        return {"MA": self.sma.update(close)}
+
+    def to_dict(self):
+        return {"sma": self.sma.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(sma=SmaState.from_dict(state["sma"]))
+
+
+class MacdStream:
+    """
+    MACD 指標的串流狀態
+    TA-Lib 的快線 EMA 起點與慢線對齊：略過前 slow - fast 筆後才開始累計
+    """
+
+    columns = ["MACD", "MACD_Signal", "MACD_Hist"]
+
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9, state=None):
+        if fastperiod > slowperiod:
+            fastperiod, slowperiod = slowperiod, fastperiod
+        state = state or {}
+        self.fastperiod = fastperiod
+        self.slowperiod = slowperiod
+        self.signalperiod = signalperiod
+        self.count = state.get("count", 0)
+        self.fast = EmaState.from_dict(state["fast"]) if state else EmaState(fastperiod)
+        self.slow = EmaState.from_dict(state["slow"]) if state else EmaState(slowperiod)
+        self.signal = (
+            EmaState.from_dict(state["signal"]) if state else EmaState(signalperiod)
+        )
+
+    def update(self, high, low, close):
+        self.count += 1
+        slow = self.slow.update(close)
+        fast = (
+            self.fast.update(close)
+            if self.count > self.slowperiod - self.fastperiod
+            else NAN
+        )
+        if math.isnan(slow):
+            return dict.fromkeys(self.columns, NAN)
+
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        if math.isnan(signal):
+            return dict.fromkeys(self.columns, NAN)
+        return {"MACD": macd, "MACD_Signal": signal, "MACD_Hist": macd - signal}
+
+    def to_dict(self):
+        return {
+            "periods": [self.fastperiod, self.slowperiod, self.signalperiod],
+            "count": self.count,
+            "fast": self.fast.to_dict(),
+            "slow": self.slow.to_dict(),
+            "signal": self.signal.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(*state["periods"], state=state)
+
+
+class RsiStream:
+    """RSI 指標的串流狀態（Wilder 平滑）"""
+
+    columns = ["RSI"]
+
+    def __init__(self, timeperiod=14, state=None):
+        state = state or {}
+        self.period = timeperiod
+        self.count = state.get("count", 0)
+        self.prev_close = state.get("prev_close")
+        self.gain = state.get("gain", 0.0)
+        self.loss = state.get("loss", 0.0)
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return {"RSI": NAN}
+
+        diff = close - self.prev_close
+        self.prev_close = close
+        self.count += 1
+        gain, loss = max(diff, 0.0), max(-diff, 0.0)
+
+        if self.count < self.period:
+            # 前 period 筆變動先累加，之後取平均作為起點
+            self.gain += gain
+            self.loss += loss
+            return {"RSI": NAN}
+        if self.count == self.period:
+            self.gain = (self.gain + gain) / self.period
+            self.loss = (self.loss + loss) / self.period
+        else:
+            self.gain = (self.gain * (self.period - 1) + gain) / self.period
+            self.loss = (self.loss * (self.period - 1) + loss) / self.period
+
+        total = self.gain + self.loss
+        # 與 TA-Lib 相同，只有漲跌都完全為 0 時才輸出 0
+        return {"RSI": 100 * (self.gain / total) if total != 0 else 0.0}
+
+    def to_dict(self):
+        return {
+            "period": self.period,
+            "count": self.count,
+            "prev_close": self.prev_close,
+            "gain": self.gain,
+            "loss": self.loss,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["period"], state=state)
+
+
+class WillrStream:
+    """WILLR 指標的串流狀態"""
+
+    columns = ["WILLR"]
+
+    def __init__(self, timeperiod=14, highs=None, lows=None):
+        self.period = timeperiod
+        self.highs = deque(highs or [], maxlen=timeperiod)
+        self.lows = deque(lows or [], maxlen=timeperiod)
+
+    def update(self, high, low, close):
+        self.highs.append(high)
+        self.lows.append(low)
+        if len(self.highs) < self.period:
+            return {"WILLR": NAN}
+        highest, lowest = max(self.highs), min(self.lows)
+        diff = (highest - lowest) / -100.0
+        return {"WILLR": (highest - close) / diff if diff != 0 else 0.0}
+
+    def to_dict(self):
+        return {
+            "period": self.period,
+            "highs": list(self.highs),
+            "lows": list(self.lows),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["period"], state["highs"], state["lows"])
+
+
+class KdjStream:
+    """
+    KDJ 指標的串流狀態
+    K、D 與 TA-Lib STOCH 一樣要累計滿整段回溯期才輸出，J 為 3K-2D 的 3 日平均
+    """
+
+    columns = ["K", "D", "J"]
+
+    def __init__(self, fastk_period=9, slowk_period=3, slowd_period=3, state=None):
+        state = state or {}
+        self.periods = [fastk_period, slowk_period, slowd_period]
+        self.lookback = fastk_period + slowk_period + slowd_period - 3
+        self.count = state.get("count", 0)
+        self.highs = deque(state.get("highs", []), maxlen=fastk_period)
+        self.lows = deque(state.get("lows", []), maxlen=fastk_period)
+        self.slowk = (
+            SmaState.from_dict(state["slowk"]) if state else SmaState(slowk_period)
+        )
+        self.slowd = (
+            SmaState.from_dict(state["slowd"]) if state else SmaState(slowd_period)
+        )
+        self.j = SmaState.from_dict(state["j"]) if state else SmaState(3)
+
+    def update(self, high, low, close):
+        self.count += 1
+        self.highs.append(high)
+        self.lows.append(low)
+
+        fastk = NAN
+        if len(self.highs) == self.periods[0]:
+            highest, lowest = max(self.highs), min(self.lows)
+            diff = (highest - lowest) / 100.0
+            fastk = (close - lowest) / diff if diff != 0 else 0.0
+
+        k = self.slowk.update(fastk)
+        d = self.slowd.update(k)
+        if self.count <= self.lookback:
+            return dict.fromkeys(self.columns, NAN)
+        return {"K": k, "D": d, "J": self.j.update(3 * k - 2 * d)}
+
+    def to_dict(self):
+        return {
+            "periods": self.periods,
+            "count": self.count,
+            "highs": list(self.highs),
+            "lows": list(self.lows),
+            "slowk": self.slowk.to_dict(),
+            "slowd": self.slowd.to_dict(),
+            "j": self.j.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(*state["periods"], state=state)
+
+
+# 指標名稱對應的串流類別，名稱與參數和 talib_utils.INDICATORS 一致
+STREAMS = {
+    "MA": MaStream,
+    "MACD": MacdStream,
+    "RSI": RsiStream,
+    "WILLR": WillrStream,
+    "KDJ": KdjStream,
+}
+
+
+def extend_stream(stream, data):
+    """以新的 K 棒推進指標狀態，回傳新 K 棒的指標值"""
+    values = {column: [] for column in stream.columns}
+    for high, low, close in zip(
+        data["High"].to_numpy(float),
+        data["Low"].to_numpy(float),
+        data["Close"].to_numpy(float),
+    ):
+        for column, value in stream.update(high, low, close).items():
+            values[column].append(value)
+    return {column: np.array(items) for column, items in values.items()}
+
+
+def state_path(ticker, folder="data"):
+    """股票指標串流狀態檔的路徑"""
+    return os.path.join(folder, f"{ticker}_indicator_state.json")
+
+
+# 狀態中保留各指標欄位最近的筆數，供掃描器判斷需要回溯的條件（交叉、[n] 回溯）
+TAIL_BARS = 30
+
+
+class IndicatorStreams:
+    """
+    一檔股票多組指標的串流狀態
+    保存各序列的尾端狀態與最近 TAIL_BARS 筆指標值，之後只需以新增的 K 棒推進
+    """
+
+    def __init__(self, ticker, streams=None, last_date=None, tail=None):
+        self.ticker = ticker
+        self.streams = streams or {}
+        self.last_date = last_date
+        self.tail = tail or {}
+
+    @property
+    def latest(self):
+        """各序列各欄位的最新值"""
+        return {
+            key: {column: values[-1] for column, values in columns.items()}
+            for key, columns in self.tail.items()
+        }
+
+    def columns(self, indicator, params):
+        """一組指標最近的指標值（欄位 -> 陣列，由舊到新），沒有這組指標時回傳 None"""
+        columns = self.tail.get(self.key(indicator, params))
+        if columns is None:
+            return None
+        return {
+            column: np.array(values, dtype=float) for column, values in columns.items()
+        }
+
+    def _keep_tail(self, key, values):
+        previous = self.tail.get(key, {})
+        self.tail[key] = {
+            column: (previous.get(column, []) + [float(v) for v in array[-TAIL_BARS:]])[
+                -TAIL_BARS:
+            ]
+            for column, array in values.items()
+        }
+
+    @staticmethod
+    def key(indicator, params):
+        """序列名稱，例如 MACD(12,26,9)"""
+        return f"{indicator}({','.join(map(str, params))})"
+
+    def add(self, indicator, params, data):
+        """加入一組指標並以完整歷史建立初始狀態，回傳整段指標值"""
+        stream = STREAMS[indicator](*params)
+        values = extend_stream(stream, data)
+        key = self.key(indicator, params)
+        self.streams[key] = (indicator, tuple(params), stream)
+        if len(data):
+            self.tail.pop(key, None)
+            self._keep_tail(key, values)
+            self.last_date = pd.Timestamp(data["Date"].iloc[-1])
+        return values
+
+    def extend(self, new_data):
+        """
+        以最後日期之後的新 K 棒推進所有指標，回傳新 K 棒的指標 DataFrame
+        欄位名稱為欄位加上參數，例如 K(9,3,3)；成本只與新 K 棒數量有關
+        """
+        new_data = new_data.copy()
+        new_data["Date"] = pd.to_datetime(new_data["Date"])
+        if self.last_date is not None:
+            new_data = new_data[new_data["Date"] > self.last_date]
+
+        result = pd.DataFrame({"Date": new_data["Date"].to_numpy()})
+        if new_data.empty:
+            return result
+
+        for key, (indicator, _, stream) in self.streams.items():
+            values = extend_stream(stream, new_data)
+            self._keep_tail(key, values)
+            for column, array in values.items():
+                result[f"{column}{key[len(indicator):]}"] = array
+        self.last_date = pd.Timestamp(new_data["Date"].iloc[-1])
+        return result
+
+    def save(self, folder="data"):
+        """儲存串流狀態"""
+        content = {
+            "ticker": self.ticker,
+            "last_date": self.last_date and self.last_date.strftime("%Y-%m-%d"),
+            "tail": self.tail,
+            "streams": {
+                key: {
+                    "indicator": indicator,
+                    "params": list(params),
+                    "state": stream.to_dict(),
+                }
+                for key, (indicator, params, stream) in self.streams.items()
+            },
+        }
+        path = state_path(self.ticker, folder)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(content, file)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, ticker, folder="data"):
+        """讀取串流狀態，不存在時回傳 None"""
+        path = state_path(ticker, folder)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            content = json.load(file)
+        streams = {
+            key: (
+                item["indicator"],
+                tuple(item["params"]),
+                STREAMS[item["indicator"]].from_dict(item["state"]),
+            )
+            for key, item in content["streams"].items()
+        }
+        last_date = content["last_date"] and pd.Timestamp(content["last_date"])
+        return cls(ticker, streams, last_date, content["tail"])
+
+
+def init_indicator_state(ticker, data, specs, folder="data"):
+    """以完整歷史建立股票的串流狀態，specs 為 (指標名稱, 參數) 清單"""
+    streams = IndicatorStreams(ticker)
+    for indicator, params in specs:
+        streams.add(indicator, params, data)
+    streams.save(folder)
+    return streams
+
+
+def rebuild_indicator_state(ticker, data, specs=(), folder="data"):
+    """
+    歷史資料被整份寫入時重新建立串流狀態，指標組合為既有狀態的組合加上 specs
+    兩者皆無時不建立，回傳 None
+    """
+    streams = IndicatorStreams.load(ticker, folder)
+    existing = [] if streams is None else list(streams.streams.values())
+    specs = list(
+        dict.fromkeys(
+            [(indicator, tuple(params)) for indicator, params, _ in existing]
+            + [(indicator, tuple(params)) for indicator, params in specs]
+        )
+    )
+    if not specs:
+        return None
+    return init_indicator_state(ticker, data, specs, folder)
+
+
+def update_indicator_state(ticker, new_data, folder="data"):
+    """若股票已有串流狀態，以新 K 棒推進並儲存，回傳新 K 棒的指標值"""
+    streams = IndicatorStreams.load(ticker, folder)
+    if streams is None:
+        return None
+    result = streams.extend(new_data)
+    streams.save(folder)
+    return result
+
+
+def verify_against_talib(data, indicator, params, split=None, atol=1e-6):
+    """
+    以前段資料建立狀態、後段逐筆推進，與 TA-Lib 對整段重算的結果比較
+    回傳各欄位的最大誤差，超過 atol 或 NaN 位置不一致時拋出 AssertionError
+    """
+    from utils.talib_utils import INDICATORS
+
+    split = len(data) // 2 if split is None else split
+    func, columns = INDICATORS[indicator]
+    expected = func(data[["High", "Low", "Close"]].copy(), *params)
+
+    streams = IndicatorStreams("verify")
+    head = streams.add(indicator, params, data.iloc[:split])
+    tail = streams.extend(data.iloc[split:])
+    suffix = IndicatorStreams.key(indicator, params)[len(indicator) :]
+
+    errors = {}
+    for column in columns:
+        actual = np.concatenate([head[column], tail[f"{column}{suffix}"].to_numpy()])
+        target = expected[column].to_numpy(float)
+        if not np.array_equal(np.isnan(actual), np.isnan(target)):
+            raise AssertionError(f"{indicator}{tuple(params)} {column} NaN 位置不一致")
+        diff = np.nanmax(np.abs(actual - target), initial=0.0)
+        if diff > atol:
+            raise AssertionError(f"{indicator}{tuple(params)} {column} 誤差 {diff}")
+        errors[column] = diff
+    return errors
@@ -1,19 +1,28 @@
-import os
-import shutil
 import pandas as pd
 import numpy as np
 from itertools import product
-import talib
-from utils.signal_utils import SignalEvaluator
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.signal_utils import evaluator_for_config, load_signals
+from utils.indicator_cache import IndicatorCache, data_fingerprint
+from utils.batch_indicators import batch_indicator_columns, use_batch_kernel
+from utils.parallel_utils import run_in_pool
+from utils.profiler import get_profiler, profile_stage, start_profiling, stop_profiling
+from utils.storage import get_storage, strategy_results_name
+from utils.result_cache import ResultCache, combo_key
+from utils.results_index import ResultsIndex
 
 
 def get_ma(data, timeperiod=20):
+    import talib  # 計算指標時才載入，只用到常數或結果的頁面不需要
+
     ma = talib.MA(data["Close"], timeperiod=timeperiod)
     data[f"MA"] = ma
     return data
 
 
 def get_macd(data, fastperiod=12, slowperiod=26, signalperiod=9):
+    import talib
+
     macd, signal, hist = talib.MACD(
         data["Close"],
         fastperiod=fastperiod,
@@ -32,18 +41,24 @@ def get_macd(data, fastperiod=12, slowperiod=26, signalperiod=9):
 
 
 def get_rsi(data, timeperiod=14):
+    import talib
+
     rsi = talib.RSI(data["Close"], timeperiod=timeperiod)
     data["RSI"] = rsi
     return data
 
 
 def get_willr(data, timeperiod=14):
+    import talib
+
     willr = talib.WILLR(data["High"], data["Low"], data["Close"], timeperiod=timeperiod)
     data["WILLR"] = willr
     return data
 
 
 def get_kdj(data, fastk_period=9, slowk_period=3, slowd_period=3):
+    import talib
+
     # 计算K值和D值
     k, d = talib.STOCH(
         data["High"],
@@ -67,115 +82,769 @@ def get_kdj(data, fastk_period=9, slowk_period=3, slowd_period=3):
     return data
 
 
-def calculate_indicators(
-    ticker,
-    data,
-    ma_periods,
-    rsi_periods,
-    macd_params,
-    willr_periods,
-    kdj_params,
-    save_condition=0.8,
+# 各指標的計算函式與產生的欄位
+INDICATORS = {
+    "MA": (get_ma, ["MA"]),
+    "MACD": (get_macd, ["MACD", "MACD_Signal", "MACD_Hist"]),
+    "RSI": (get_rsi, ["RSI"]),
+    "WILLR": (get_willr, ["WILLR"]),
+    "KDJ": (get_kdj, ["K", "D", "J"]),
+}
+
+# 指標欄位 -> 產生該欄位的指標
+INDICATOR_OF_COLUMN = {
+    column: indicator
+    for indicator, (_, columns) in INDICATORS.items()
+    for column in columns
+}
+
+# 信號條件可用的欄位：行情欄位與各指標產生的欄位
+SIGNAL_COLUMNS = ["Open", "High", "Low", "Close", "Volume", *INDICATOR_OF_COLUMN]
+
+# 參數選單的選項，新股票建立指標串流狀態時也預先涵蓋這些參數
+PARAM_OPTIONS = {
+    "ma": [5, 10, 20, 60, 120],
+    "rsi": [5, 10, 20, 60, 120],
+    "macd": [(5, 34, 5), (12, 26, 9), (24, 52, 9), (48, 104, 9)],
+    "willr": [5, 10, 20, 30, 60, 120],
+    "kdj": [(9, 3, 3), (18, 3, 3), (36, 3, 3), (14, 3, 3)],
+}
+
+# 同一個程序內共用的指標快取
+INDICATOR_CACHE = IndicatorCache()
+
+
+def get_indicator_columns(
+    ticker, data, indicator, params, fingerprint=None, cache=None
 ):
     """
-    根據不同參數計算技術指標
+    取得單一指標在指定參數下的欄位陣列
+    同一份資料、同一組參數只會計算一次，之後都從快取取得
     """
-    results = []
+    cache = INDICATOR_CACHE if cache is None else cache
+    fingerprint = fingerprint or data_fingerprint(data)
+    func, columns = INDICATORS[indicator]
+
+    def compute():
+        with profile_stage("talib", indicator=indicator, params=list(params)) as event:
+            frame = func(data[["High", "Low", "Close"]].copy(), *params)
+            values = {column: frame[column].to_numpy() for column in columns}
+            if event is not None:
+                event["nbytes"] = sum(array.nbytes for array in values.values())
+        return values
+
+    key = (ticker, fingerprint, indicator, tuple(params))
+    return cache.get_or_compute(key, compute)
+
+
+def combo_indicator_params(combo):
+    """參數組合中各指標的 (指標, 參數)"""
+    ma_period, rsi_period, macd_param, willr_period, kdj_param = combo
+    return [
+        ("MA", (ma_period,)),
+        ("MACD", tuple(macd_param)),
+        ("RSI", (rsi_period,)),
+        ("WILLR", (willr_period,)),
+        ("KDJ", tuple(kdj_param)),
+    ]
+
+
+def grid_indicator_specs(combos):
+    """參數網格內各指標用到的 (指標, 參數)，每組只列一次"""
+    specs = {}
+    for combo in combos:
+        for spec in combo_indicator_params(combo):
+            specs.setdefault(spec, None)
+    return list(specs)
+
+
+def prefetch_indicators(ticker, data, specs, fingerprint=None, cache=None):
+    """
+    以批次核心一次算出同一指標的所有參數並放入指標快取，已在快取中的略過
+    之後逐組回測時直接命中快取；沒有批次核心的指標仍在第一次用到時由 TA-Lib 計算
+    """
+    cache = INDICATOR_CACHE if cache is None else cache
+    # 參數多到快取放不下時，預先算好的欄位會互相淘汰，不如逐組計算
+    if cache.max_entries and len(specs) > cache.max_entries:
+        return
+    fingerprint = fingerprint or data_fingerprint(data)
+
+    missing = {}
+    for indicator, params in specs:
+        key = (ticker, fingerprint, indicator, tuple(params))
+        if use_batch_kernel(indicator, len(data)) and key not in cache:
+            missing.setdefault(indicator, []).append(tuple(params))
+
+    for indicator, params_list in missing.items():
+        with profile_stage(
+            "batch_kernel", indicator=indicator, count=len(params_list)
+        ) as event:
+            columns_list = batch_indicator_columns(data, indicator, params_list)
+            if event is not None:
+                event["nbytes"] = sum(
+                    array.nbytes
+                    for columns in columns_list
+                    for array in columns.values()
+                )
+        for params, columns in zip(params_list, columns_list):
+            cache.put((ticker, fingerprint, indicator, params), columns)
+
+
+def build_param_grid(ma_periods, rsi_periods, macd_params, willr_periods, kdj_params):
+    """產生所有參數組合"""
+    return list(
+        product(ma_periods, rsi_periods, macd_params, willr_periods, kdj_params)
+    )
 
-    if os.path.exists("data_results"):
-        shutil.rmtree("data_results")
 
-    os.makedirs("data_results")
+def base_columns(data):
+    """行情資料各欄位的唯讀陣列，直接參照 data 的記憶體，各組參數共用同一份"""
+    columns = {}
+    for column in data.columns:
+        values = data[column].to_numpy()
+        values.setflags(write=False)
+        columns[column] = values
+    return columns
 
-    for ma_period, rsi_period, macd_param, willr_period, kdj_param in product(
-        ma_periods, rsi_periods, macd_params, willr_periods, kdj_params
-    ):
-        temp_data = data.copy()
 
-        # 顯示目前執行的條件
-        print(
-            f"Processing: MA={ma_period}, RSI={rsi_period}, MACD={macd_param}, WILLR={willr_period}, KDJ={kdj_param}"
+class ComboBacktest:
+    """
+    單一參數組合的精簡回測結果
+    行情與指標欄位參照共用的唯讀陣列，本身只保存 int8 的逐筆信號與每筆交易的買賣位置
+    需要匯出或顯示時才以 to_frame 組出 DataFrame
+    """
+
+    def __init__(self, data, columns, signal, buy_index, sell_index):
+        self.data = data
+        self.columns = columns
+        self.signal = signal
+        self.buy_index = buy_index
+        self.sell_index = sell_index
+        close = np.asarray(columns["Close"], dtype=float)
+        self.profit = close[sell_index] - close[buy_index]
+
+    @property
+    def nbytes(self):
+        """本身配置的記憶體，不含共用的行情與指標陣列"""
+        return (
+            self.signal.nbytes
+            + self.buy_index.nbytes
+            + self.sell_index.nbytes
+            + self.profit.nbytes
         )
 
-        # 計算 MA
-        temp_data = get_ma(temp_data, timeperiod=ma_period)
+    def summary(self):
+        """毛利、毛損、獲利因子與交易次數，與 calculate_profit 的結果相同"""
+        profit = self.profit
+        gross_profit = profit[profit > 0].sum()
+        gross_loss = abs(profit[profit < 0].sum())
+        count = np.count_nonzero(~np.isnan(profit))
+        profit_factor = gross_profit / gross_loss if gross_loss != 0 else np.nan
+        return gross_profit, gross_loss, profit_factor, count
+
+    def to_frame(self, float_dtype=np.float64):
+        """
+        組出回測明細：行情欄位、指標欄位與 Signal、Profit、Buy Date
+        float_dtype 只套用於指標欄位；僅供顯示時可用 np.float32 減少一半記憶體
+        """
+        n = len(self.data)
+        frame = {}
+        for column, values in self.columns.items():
+            if column in INDICATOR_OF_COLUMN:
+                values = values.astype(float_dtype)
+            frame[column] = values
+        frame["Signal"] = self.signal
+
+        profit = np.full(n, np.nan)
+        profit[self.sell_index] = self.profit
+        frame["Profit"] = profit
+
+        buy_date = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+        if len(self.sell_index):
+            dates = pd.to_datetime(self.data["Date"]).to_numpy()
+            buy_date[self.sell_index] = dates[self.buy_index]
+        frame["Buy Date"] = buy_date
+        return pd.DataFrame(frame, index=self.data.index)
+
+
+def run_state_machine(buy_mask, sell_mask):
+    """
+    持倉狀態機：空手遇到買訊買入，持有遇到賣訊賣出
+    回傳 int8 的逐筆信號（1 買入、-1 賣出），以及已平倉交易的買入位置與賣出位置
+    """
+    signal = np.zeros(len(buy_mask), dtype=np.int8)
+    buys, sells = [], []
+    bought = False
+    for i in np.flatnonzero(buy_mask | sell_mask):
+        if buy_mask[i] and not bought:  # 如果符合買入信號並且尚未買入
+            signal[i] = 1
+            buys.append(i)
+            bought = True
+        elif sell_mask[i] and bought:  # 如果符合賣出信號並且已經買入
+            signal[i] = -1
+            sells.append(i)
+            bought = False
+    # 最後一筆未平倉的買入不列入交易
+    buy_index = np.array(buys[: len(sells)], dtype=np.int64)
+    sell_index = np.array(sells, dtype=np.int64)
+    return signal, buy_index, sell_index
+
+
+def combo_masks(ticker, data, combo, fingerprint=None, evaluator=None):
+    """
+    單一參數組合的欄位與買賣信號，回傳 (欄位字典, 買入布林陣列, 賣出布林陣列)
+    不複製行情資料，指標欄位直接取自快取
+    """
+    fingerprint = fingerprint or data_fingerprint(data)
+    if evaluator is None:
+        with profile_stage("load_signals"):
+            evaluator = load_signals()
+
+    # 各指標只依賴自己的參數，從快取組合出這組參數的欄位
+    with profile_stage("indicators"):
+        columns = base_columns(data)
+        for indicator, params in combo_indicator_params(combo):
+            columns.update(
+                get_indicator_columns(ticker, data, indicator, params, fingerprint)
+            )
 
-        # 計算 MACD
-        fastperiod, slowperiod, signalperiod = macd_param
-        temp_data = get_macd(temp_data, fastperiod, slowperiod, signalperiod)
+    # 買賣條件一次對整段資料求值
+    with profile_stage("process_signals"):
+        buy_mask = evaluator.buy_mask(columns)
+        sell_mask = evaluator.sell_mask(columns)
+    return columns, buy_mask, sell_mask
 
-        # 計算 RSI
-        temp_data = get_rsi(temp_data, timeperiod=rsi_period)
 
-        # 計算 WILLR
-        temp_data = get_willr(temp_data, timeperiod=willr_period)
+def _combo_result(data, columns, buy_mask, sell_mask):
+    """以買賣信號推進持倉狀態機，組出 ComboBacktest"""
+    with profile_stage("state_machine") as event:
+        result = ComboBacktest(data, columns, *run_state_machine(buy_mask, sell_mask))
+        if event is not None:
+            event["nbytes"] = result.nbytes
+    return result
 
-        # 計算 KDJ
-        fastk_period, slowk_period, slowd_period = kdj_param
-        temp_data = get_kdj(temp_data, fastk_period, slowk_period, slowd_period)
 
-        # 計算信號和利潤
-        temp_data = process_signals(temp_data)
-        gross_profit, gross_loss, profit_factor, count = calculate_profit(temp_data)
+def run_combo(ticker, data, combo, fingerprint=None, evaluator=None):
+    """
+    對單一參數組合執行回測，回傳 ComboBacktest
+    不複製行情資料，指標欄位直接取自快取
+    """
+    columns, buy_mask, sell_mask = combo_masks(
+        ticker, data, combo, fingerprint, evaluator
+    )
+    return _combo_result(data, columns, buy_mask, sell_mask)
+
+
+def build_combo_detail(ticker, data, combo, fingerprint=None, float_dtype=np.float64):
+    """
+    產生單一參數組合的回測明細：指標欄位與 Signal、Profit、Buy Date
+    指標取自快取，選取結果時可隨時重新產生，不需事先存檔
+    """
+    return run_combo(ticker, data, combo, fingerprint).to_frame(float_dtype)
+
 
-        # 儲存每組參數的結果
+def backtest_combo(
+    ticker, data, combo, fingerprint=None, evaluator=None, walk_forward=None
+):
+    """
+    對單一參數組合進行回測，回傳該組參數的結果
+    walk_forward 為 (訓練筆數, 測試筆數, 間隔) 時，另外附上滾動視窗驗證的彙總欄位
+    """
+    # 目前執行的條件記錄在效能資料的 combo 階段
+    with profile_stage("combo", ticker=ticker, combo=str(combo)):
+        columns, buy_mask, sell_mask = combo_masks(
+            ticker, data, combo, fingerprint, evaluator
+        )
+        result = _combo_result(data, columns, buy_mask, sell_mask)
+        with profile_stage("calculate_profit"):
+            gross_profit, gross_loss, profit_factor, count = result.summary()
+        row = result_row(combo, gross_profit, gross_loss, profit_factor, count)
+
+        # 滾動視窗直接切用同一份買賣信號，不重新求值
+        if walk_forward:
+            with profile_stage("walk_forward"):
+                row.update(
+                    walk_forward_metrics(
+                        buy_mask, sell_mask, columns["Close"], walk_forward
+                    )
+                )
+    return row
+
+
+def result_row(combo, gross_profit, gross_loss, profit_factor, count):
+    """綜合結果表中一組參數的結果列"""
+    ma_period, rsi_period, macd_param, willr_period, kdj_param = combo
+    fastperiod, slowperiod, signalperiod = macd_param
+    fastk_period, slowk_period, slowd_period = kdj_param
+    return {
+        "MA": ma_period,
+        "RSI": rsi_period,
+        "MACD": f"({fastperiod},{slowperiod},{signalperiod})",
+        "WILLR": willr_period,
+        "KDJ": f"({fastk_period},{slowk_period},{slowd_period})",
+        "Gross Profit": gross_profit,
+        "Gross Loss": gross_loss,
+        "Profit Factor": profit_factor,
+        "Count": count,
+    }
+
+
+def shared_evaluator(shared):
+    """工作單元使用的 evaluator：以 run_backtests 開始時的信號設定快照求值"""
+    config = shared.get("signals")
+    return load_signals() if config is None else evaluator_for_config(config)
+
+
+def backtest_chunk(shared, chunk):
+    """
+    平行模式的工作單元：執行一批 (ticker, 參數組合)
+    shared["datasets"] 為 ticker -> (行情資料, 資料指紋)
+    """
+    evaluator = shared_evaluator(shared)
+    results = []
+    for ticker, combo in chunk:
+        data, fingerprint = shared["datasets"][ticker]
+        if shared.get("specs"):
+            prefetch_indicators(ticker, data, shared["specs"], fingerprint)
         results.append(
-            {
-                "MA": ma_period,
-                "RSI": rsi_period,
-                "MACD": f"({fastperiod},{slowperiod},{signalperiod})",
-                "WILLR": willr_period,
-                "KDJ": f"({fastk_period},{slowk_period},{slowd_period})",
-                "Gross Profit": gross_profit,
-                "Gross Loss": gross_loss,
-                "Profit Factor": profit_factor,
-                "Count": count,
-            }
+            backtest_combo(
+                ticker, data, combo, fingerprint, evaluator, shared.get("walk_forward")
+            )
         )
+    return results
+
+
+# 矩陣回測時單一欄位 (筆數 × 組數) 陣列的大小上限，決定每個區塊的組數
+GRID_BLOCK_BYTES = 64 * 1024 * 1024
+# 矩陣回測單一程序執行時，每回報一次進度處理的組數
+GRID_SERIAL_CHUNK = 256
+
+
+class GridColumns:
+    """
+    矩陣回測一個區塊的欄位，供信號條件求值
+    指標欄位為 (筆數 × 組數)，行情欄位為 (筆數 × 1) 可直接廣播；只有條件用到的欄位才會組出
+    """
+
+    def __init__(self, ticker, data, combos, fingerprint):
+        self.ticker = ticker
+        self.data = data
+        self.params = [dict(combo_indicator_params(combo)) for combo in combos]
+        self.fingerprint = fingerprint
+        self._columns = {}
+
+    def __getitem__(self, key):
+        if key not in self._columns:
+            indicator = INDICATOR_OF_COLUMN.get(key)
+            if indicator is None:
+                self._columns[key] = self.data[key].to_numpy()[:, None]
+            else:
+                self._columns[key] = np.column_stack(
+                    [
+                        get_indicator_columns(
+                            self.ticker,
+                            self.data,
+                            indicator,
+                            params[indicator],
+                            self.fingerprint,
+                        )[key]
+                        for params in self.params
+                    ]
+                )
+        return self._columns[key]
+
+
+def _next_true_after(mask):
+    """
+    每個位置之後（不含當筆）第一個為 True 的位置，沒有時為筆數
+    以反向累積最小值一次求出，mask 為 (筆數 × 組數)
+    """
+    n = len(mask)
+    dtype = np.int32 if n < np.iinfo(np.int32).max else np.int64
+    index = np.where(mask, np.arange(n, dtype=dtype)[:, None], dtype(n))
+    first_from = np.minimum.accumulate(index[::-1], axis=0)[::-1]
+    after = np.full_like(first_from, n)
+    after[:-1] = first_from[1:]
+    return first_from, after
+
+
+def grid_trades(buy_mask, sell_mask, close):
+    """
+    以 (筆數 × 組數) 的買賣信號同時回測所有組合，回傳各組的毛利、毛損、獲利因子與交易次數
+    close 可為各組共用的一維收盤價，或與信號同形狀的 (筆數 × 組數)
+    持倉狀態機與 process_signals 相同：空手遇到買訊買入，持有遇到賣訊賣出
+    各組一次前進一筆交易（買入後的第一個賣訊、賣出後的第一個買訊），迴圈次數為最多的交易次數
+    """
+    n, count = buy_mask.shape
+    gross_profit = np.zeros(count)
+    gross_loss = np.zeros(count)
+    trades = np.zeros(count, dtype=np.int64)
+    if n == 0:
+        return gross_profit, gross_loss, np.full(count, np.nan), trades
+
+    first_buy, next_buy = _next_true_after(buy_mask)
+    _, next_sell = _next_true_after(sell_mask)
+    close = np.broadcast_to(np.asarray(close, dtype=float).reshape(n, -1), (n, count))
+    columns = np.arange(count)
+
+    buy_at = first_buy[0].astype(np.int64)
+    active = buy_at < n
+    while active.any():
+        cols = columns[active]
+        sell_at = next_sell[buy_at[active], cols]
+        sold = sell_at < n
+        cols, sell_at = cols[sold], sell_at[sold]
+
+        profit = close[sell_at, cols] - close[buy_at[cols], cols]
+        gross_profit[cols] += np.where(profit > 0, profit, 0.0)
+        gross_loss[cols] += np.where(profit < 0, -profit, 0.0)
+        trades[cols] += 1
+
+        # 賣出當筆的買訊不算，下一次買入在賣出之後
+        active[:] = False
+        buy_at[cols] = next_buy[sell_at, cols]
+        active[cols] = buy_at[cols] < n
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profit_factor = np.where(gross_loss != 0, gross_profit / gross_loss, np.nan)
+    return gross_profit, gross_loss, profit_factor, trades
+
+
+def walk_forward_windows(bars, train, test, step=None):
+    """
+    滾動視窗的起點，第 k 個視窗以 [start, start + train) 為訓練區間，緊接的 test 筆為測試區間
+    step 預設與 test 相同，各視窗的測試區間首尾相接
+    """
+    step = step or test
+    if train < 1 or test < 1 or step < 1:
+        raise ValueError("訓練、測試筆數與間隔都必須至少為 1")
+    return np.arange(0, max(0, bars - train - test + 1), step)
 
-        if profit_factor > save_condition:
-            # 儲存每組條件結果到獨立的CSV文件
-            filepath_data_results = os.path.join(
-                "data_results",
-                f"{ticker}_MA({ma_period})_RSI({rsi_period})_MACD({fastperiod},{slowperiod},{signalperiod})_WILLR({willr_period})_KDJ({fastk_period},{slowk_period},{slowd_period}).csv",
+
+def _window_trades(buy_mask, sell_mask, close, offset, length, count, step):
+    """各視窗自 start + offset 起 length 筆的交易結果；視窗以 stride 取為欄，不複製資料"""
+
+    def windows(values):
+        view = sliding_window_view(np.asarray(values), length)
+        return view[offset : offset + count * step : step].T
+
+    return grid_trades(windows(buy_mask), windows(sell_mask), windows(close))
+
+
+def _pooled_factor(gross_profit, gross_loss):
+    """多個區間合計的獲利因子"""
+    total_loss = gross_loss.sum()
+    return gross_profit.sum() / total_loss if total_loss != 0 else np.nan
+
+
+def walk_forward_metrics(buy_mask, sell_mask, close, walk_forward):
+    """
+    滾動視窗驗證：以整段資料求得的買賣信號切出各視窗，分別回測訓練與測試區間
+    指標與信號都不重新計算；每個區間從空手開始，結束時未平倉的部位不計
+    walk_forward 為 (訓練筆數, 測試筆數, 間隔)，回傳附加到結果列的彙總欄位
+    """
+    train, test, step = walk_forward
+    step = step or test
+    starts = walk_forward_windows(len(close), train, test, step)
+    count = len(starts)
+    if count == 0:
+        return {
+            "Windows": 0,
+            "Train Profit Factor": np.nan,
+            "Test Profit Factor": np.nan,
+            "Test Count": 0,
+            "Profitable Windows": np.nan,
+        }
+
+    train_profit, train_loss, _, _ = _window_trades(
+        buy_mask, sell_mask, close, 0, train, count, step
+    )
+    test_profit, test_loss, _, test_trades = _window_trades(
+        buy_mask, sell_mask, close, train, test, count, step
+    )
+    return {
+        "Windows": count,
+        "Train Profit Factor": _pooled_factor(train_profit, train_loss),
+        "Test Profit Factor": _pooled_factor(test_profit, test_loss),
+        "Test Count": int(test_trades.sum()),
+        # 測試區間毛利大於毛損的視窗比例
+        "Profitable Windows": float(np.mean(test_profit > test_loss)),
+    }
+
+
+def backtest_grid(
+    ticker, data, combos, fingerprint=None, evaluator=None, walk_forward=None
+):
+    """
+    矩陣模式回測同一檔股票的多組參數，結果與逐組執行 backtest_combo 相同
+    每次處理一個區塊的組合，單一欄位陣列不超過 GRID_BLOCK_BYTES
+    """
+    fingerprint = fingerprint or data_fingerprint(data)
+    evaluator = evaluator or load_signals()
+    close = data["Close"].to_numpy(float)
+    block = max(1, GRID_BLOCK_BYTES // max(1, len(data) * 8))
+
+    rows = []
+    for start in range(0, len(combos), block):
+        block_combos = combos[start : start + block]
+        with profile_stage("grid_block", ticker=ticker, combos=len(block_combos)):
+            columns = GridColumns(ticker, data, block_combos, fingerprint)
+            shape = (len(data), len(block_combos))
+            buy_mask = np.broadcast_to(evaluator.buy_mask(columns), shape)
+            sell_mask = np.broadcast_to(evaluator.sell_mask(columns), shape)
+            with profile_stage("grid_trades"):
+                results = grid_trades(buy_mask, sell_mask, close)
+            block_rows = [
+                result_row(combo, *values)
+                for combo, values in zip(block_combos, zip(*results))
+            ]
+            if walk_forward:
+                with profile_stage("walk_forward"):
+                    for j, row in enumerate(block_rows):
+                        row.update(
+                            walk_forward_metrics(
+                                buy_mask[:, j], sell_mask[:, j], close, walk_forward
+                            )
+                        )
+        rows.extend(block_rows)
+    return rows
+
+
+def backtest_grid_chunk(shared, chunk):
+    """矩陣模式的工作單元：同一檔股票的組合一起回測，回傳順序與 chunk 相同"""
+    evaluator = shared_evaluator(shared)
+    by_ticker = {}
+    for position, (ticker, combo) in enumerate(chunk):
+        by_ticker.setdefault(ticker, []).append((position, combo))
+
+    results = [None] * len(chunk)
+    for ticker, items in by_ticker.items():
+        data, fingerprint = shared["datasets"][ticker]
+        if shared.get("specs"):
+            prefetch_indicators(ticker, data, shared["specs"], fingerprint)
+        rows = backtest_grid(
+            ticker,
+            data,
+            [combo for _, combo in items],
+            fingerprint,
+            evaluator,
+            shared.get("walk_forward"),
+        )
+        for (position, _), row in zip(items, rows):
+            results[position] = row
+    return results
+
+
+def backtest_chunk_profiled(shared, chunk):
+    """
+    平行模式下記錄效能資料的工作單元
+    子程序各自記錄，事件附在該區塊第一組結果上，回到主程序後再合併
+    """
+    chunk_func = backtest_grid_chunk if shared.get("grid") else backtest_chunk
+    profiler = start_profiling()
+    try:
+        rows = chunk_func(shared, chunk)
+    finally:
+        stop_profiling(profiler)
+    return [
+        (row, profiler.events if index == 0 else []) for index, row in enumerate(rows)
+    ]
+
+
+def run_backtests(
+    datasets,
+    combos,
+    workers=1,
+    progress_callback=None,
+    use_cache=True,
+    batch_kernels=True,
+    grid=False,
+    walk_forward=None,
+    signals=None,
+):
+    """
+    對多檔股票執行同一組參數網格，以 (ticker, 參數組合) 為排程單位
+    datasets 為 ticker -> 行情資料，回傳 ticker -> 各組參數的結果清單
+    use_cache 時已算過且資料與信號設定都未變動的組合直接取用快取結果
+    batch_kernels 時各程序第一次遇到一檔股票，就以批次核心算出網格內所有週期的指標
+    grid 時以矩陣模式一次回測一個區塊的組合，而不是逐組建立明細
+    walk_forward 為 (訓練筆數, 測試筆數, 間隔) 時，結果列附上滾動視窗驗證的彙總欄位
+    signals 為信號設定的快照，預設為目前的 signals.yaml；整次執行（含子程序）都使用同一份設定
+    """
+    evaluator = evaluator_for_config(
+        load_signals().config if signals is None else signals
+    )
+    shared = {
+        "datasets": {
+            ticker: (data, data_fingerprint(data)) for ticker, data in datasets.items()
+        },
+        "specs": grid_indicator_specs(combos) if batch_kernels else None,
+        "grid": grid,
+        "walk_forward": tuple(walk_forward) if walk_forward else None,
+        "signals": evaluator.config,
+    }
+    # 設定有誤時在排程前就回報，而不是在每組參數回測時才失敗
+    for ticker, data in datasets.items():
+        problems = evaluator.validate([*data.columns, *INDICATOR_OF_COLUMN])
+        if problems:
+            raise ValueError(f"信號設定有誤（{ticker}）：" + "；".join(problems))
+    evaluator.compile()
+    signals_hash = evaluator.config_hash()
+    if walk_forward:
+        # 有無滾動視窗的結果欄位不同，分開快取
+        signals_hash += ":walk_forward=" + ",".join(map(str, shared["walk_forward"]))
+    cache = ResultCache() if use_cache else None
+
+    results = {ticker: {} for ticker in datasets}
+    tasks = []
+    for ticker, (_, fingerprint) in shared["datasets"].items():
+        with profile_stage("result_cache_get", ticker=ticker):
+            cached = (
+                cache.get_many(ticker, fingerprint, signals_hash, combos)
+                if cache
+                else {}
+            )
+        for combo in combos:
+            row = cached.get(combo_key(combo))
+            if row is None:
+                tasks.append((ticker, combo))
+            else:
+                results[ticker][combo_key(combo)] = row
+
+    # 進度包含直接取自快取的組合
+    hits = len(datasets) * len(combos) - len(tasks)
+
+    def report(done, total):
+        if progress_callback:
+            progress_callback(hits + done, hits + total)
+
+    profiler = get_profiler()
+    if workers > 1 and tasks and profiler:
+        pairs = run_in_pool(
+            backtest_chunk_profiled,
+            tasks,
+            shared,
+            workers=workers,
+            progress_callback=report,
+        )
+        rows = [row for row, _ in pairs]
+        for _, events in pairs:
+            profiler.add(events)
+    elif workers > 1 and tasks:
+        rows = run_in_pool(
+            backtest_grid_chunk if grid else backtest_chunk,
+            tasks,
+            shared,
+            workers=workers,
+            progress_callback=report,
+        )
+    elif grid:
+        rows = []
+        for start in range(0, len(tasks), GRID_SERIAL_CHUNK):
+            rows.extend(
+                backtest_grid_chunk(shared, tasks[start : start + GRID_SERIAL_CHUNK])
             )
-            temp_data.to_csv(filepath_data_results, index=False)
+            report(len(rows), len(tasks))
+    else:
+        rows = []
+        for task in tasks:
+            rows.extend(backtest_chunk(shared, [task]))
+            report(len(rows), len(tasks))
+    if not tasks:
+        report(0, 0)
+
+    computed = {ticker: [] for ticker in datasets}
+    for (ticker, combo), row in zip(tasks, rows):
+        results[ticker][combo_key(combo)] = row
+        computed[ticker].append((combo, row))
+    if cache:
+        for ticker, items in computed.items():
+            if items:
+                _, fingerprint = shared["datasets"][ticker]
+                with profile_stage("result_cache_put", ticker=ticker):
+                    cache.put_many(ticker, fingerprint, signals_hash, items)
+
+    return {
+        ticker: [rows_by_key[combo_key(combo)] for combo in combos]
+        for ticker, rows_by_key in results.items()
+    }
+
+
+def save_strategy_results(ticker, results):
+    """
+    儲存綜合結果，依獲利因子由高到低排序
+    結果表之外同時寫入結果索引，供跨股票查詢
+    """
+    with profile_stage("save_results", ticker=ticker):
+        result_df = pd.DataFrame(results)
+        result_df = result_df.sort_values("Profit Factor", ascending=False)
+        get_storage("data").write(strategy_results_name(ticker), result_df)
+        ResultsIndex().record_run(ticker, result_df)
+    return result_df
+
 
-    # 儲存綜合結果到CSV
-    result_df = pd.DataFrame(results)
-    result_df = result_df.sort_values("Profit Factor", ascending=False)
-    filepath_strategy_results = os.path.join("data", f"{ticker}_strategy_results.csv")
-    result_df.to_csv(filepath_strategy_results, index=False)
+def calculate_indicators(
+    ticker,
+    data,
+    ma_periods,
+    rsi_periods,
+    macd_params,
+    willr_periods,
+    kdj_params,
+    workers=1,
+    progress_callback=None,
+    grid=False,
+    walk_forward=None,
+):
+    """
+    根據不同參數計算技術指標
+    workers 大於 1 時以多個程序平行回測，progress_callback(done, total) 回報進度
+    grid 時以矩陣模式一次回測一個區塊的組合
+    walk_forward 為 (訓練筆數, 測試筆數, 間隔) 時，結果附上滾動視窗驗證的彙總欄位
+    """
+    combos = build_param_grid(
+        ma_periods, rsi_periods, macd_params, willr_periods, kdj_params
+    )
+
+    results = run_backtests(
+        {ticker: data},
+        combos,
+        workers,
+        progress_callback,
+        grid=grid,
+        walk_forward=walk_forward,
+    )
+    save_strategy_results(ticker, results[ticker])
 
 
 def process_signals(df):
     """
     根據買賣信號判斷進行交易操作並計算獲利
     """
-    bought = False
-    buy_price = 0
-    buy_date = None
+    with profile_stage("load_signals"):
+        evaluator = load_signals()
+
+    # 買賣條件一次對整段資料求值，只有持倉狀態機需要逐筆推進
+    buy_mask = evaluator.buy_mask(df)
+    sell_mask = evaluator.sell_mask(df)
+    close = df["Close"].to_numpy()
+
+    with profile_stage("state_machine"):
+        signal, buy_index, sell_index = run_state_machine(buy_mask, sell_mask)
 
     # 初始化信號欄位
-    df["Signal"] = 0
-    df["Profit"] = np.nan
-    df["Buy Date"] = pd.NaT
-
-    evaluator = SignalEvaluator()
-
-    for i in range(len(df)):
-        row = df.iloc[i]
-
-        if evaluator.is_buy_signal(row) and not bought:  # 如果符合買入信號並且尚未買入
-            df.at[i, "Signal"] = 1  # 設為買入信號
-            buy_price = row["Close"]
-            buy_date = row["Date"]
-            bought = True  # 設為已經買入
-        elif evaluator.is_sell_signal(row) and bought:  # 如果符合賣出信號並且已經買入
-            df.at[i, "Signal"] = -1  # 設為賣出信號
-            df.at[i, "Profit"] = row["Close"] - buy_price  # 計算賣出-買入
-            df.at[i, "Buy Date"] = buy_date  # 記錄買入日期
-            bought = False  # 重置為未買入狀態
+    with profile_stage("assign_columns") as event:
+        profit = np.full(len(df), np.nan)
+        profit[sell_index] = close[sell_index] - close[buy_index]
+        df["Signal"] = signal
+        df["Profit"] = profit
+        df["Buy Date"] = pd.NaT
+
+        if len(sell_index):
+            dates = pd.to_datetime(df["Date"]).to_numpy()
+            df.iloc[sell_index, df.columns.get_loc("Buy Date")] = dates[buy_index]
+        if event is not None:
+            event["nbytes"] = signal.nbytes + profit.nbytes + buy_index.nbytes
 
     return df
 
@@ -193,27 +862,3 @@ def calculate_profit(df):
     profit_factor = gross_profit / gross_loss if gross_loss != 0 else np.nan
 
     return gross_profit, gross_loss, profit_factor, count
-
-
-def _is_buy_signal(row):
-    """
-    判斷是否符合買入信號
-    CLOSE > < MA AND RSI < 30 OR MACD > 0 AND WILLR < -80 OR J < 0
-    """
-    return (
-        (row["Close"] > row["MA"] and row["RSI"] < 30)  # 收盤價高於MA日均線且RSI超賣
-        or (row["MACD_Diff"] > 0 and row["WILLR"] < -80)  # MACD動能轉正，WILLR超賣
-        or (row["K"] < 20 and row["D"] < 20 and row["J"] < 0)  # KDJ三線超賣區
-    )
-
-
-def _is_sell_signal(row):
-    """
-    判斷是否符合賣出信號
-    RSI > 70 OR MACD < 0 AND WILLR > -20 OR J > 100
-    """
-    return (
-        (row["Close"] < row["MA"] and row["RSI"] > 70)  # 收盤價低於MA日均線且RSI超買
-        or (row["MACD_Diff"] < 0 and row["WILLR"] > -20)  # MACD動能轉負，WILLR超買
-        or (row["K"] > 80 and row["D"] > 80 and row["J"] > 100)  # KDJ三線超買區
-    )
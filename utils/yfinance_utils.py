@@ -1,7 +1,181 @@
-import yfinance as yf
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+COLUMNS = ["Date", "Open", "High", "Low", "Close", "Volume"]
+
+
+def _normalize_frame(data):
+    """將下載結果整理為 Date/Open/High/Low/Close/Volume，依欄位名稱而非位置對應"""
+    data = data.reset_index()
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    data = data.rename(columns={"Datetime": "Date"})
+    return data[COLUMNS].dropna(subset=["Close"]).reset_index(drop=True)
 
 
 def get_data(ticker, start_date, end_date):
-    data = yf.download(ticker, start=start_date, end=end_date).reset_index()
-    data.columns = ["Date", "Open", "High", "Low", "Close", "Volume"]
-    return data
+    import yfinance as yf  # 只有下載時才載入，頁面啟動時不需要
+
+    data = yf.download(ticker, start=start_date, end=end_date, progress=False)
+    return _normalize_frame(data)
+
+
+class DataProvider(ABC):
+    """
+    行情資料來源介面，download 回傳 ticker -> DataFrame
+    區間內沒有資料的股票對應空的 DataFrame；資料來源沒有回應的股票不放入結果，視為下載失敗
+    """
+
+    @abstractmethod
+    def download(self, tickers, start_date, end_date):
+        """下載 tickers 在 [start_date, end_date) 的日線資料"""
+
+
+class YFinanceProvider(DataProvider):
+    """以 yfinance 的多檔下載一次取得一批股票"""
+
+    def download(self, tickers, start_date, end_date):
+        import yfinance as yf
+        import yfinance.shared as shared
+
+        raw = yf.download(
+            list(tickers),
+            start=start_date,
+            end=end_date,
+            group_by="ticker",
+            threads=False,
+            progress=False,
+        )
+        results = {}
+        if raw.empty:
+            # 整批都沒有資料時，只有 yfinance 記錄為區間內沒有價格的股票算是沒有新資料
+            # _ERRORS 為各次下載共用的全域變數，並行下載時可能已被清空，只作為輔助判斷
+            errors = {
+                ticker: message
+                for ticker, message in dict(shared._ERRORS).items()
+                if "no price data found" not in message
+            }
+            for ticker in tickers:
+                if ticker.upper() not in errors:
+                    results[ticker] = pd.DataFrame(columns=COLUMNS)
+            return results
+
+        for ticker in tickers:
+            if ticker not in raw.columns.get_level_values(0):
+                continue
+            data = _normalize_frame(raw[ticker])
+            # 同一批其他股票有資料、這檔卻整欄空白，是 yfinance 個別股票下載失敗的結果
+            if not data.empty:
+                results[ticker] = data
+        return results
+
+
+class LocalProvider(DataProvider):
+    """
+    從資料夾內的 {ticker}_raw_data.csv 讀取，供離線測試使用，不需要網路
+    沒有檔案的股票不放入結果，與線上來源漏掉股票的情況相同
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def download(self, tickers, start_date, end_date):
+        results = {}
+        for ticker in tickers:
+            path = os.path.join(self.folder, f"{ticker}_raw_data.csv")
+            if not os.path.exists(path):
+                continue
+            data = pd.read_csv(path, parse_dates=["Date"])
+            data = data[
+                (data["Date"] >= pd.Timestamp(start_date))
+                & (data["Date"] < pd.Timestamp(end_date))
+            ]
+            results[ticker] = data[COLUMNS].reset_index(drop=True)
+        return results
+
+
+class TokenBucket:
+    """權杖桶限速器：平均每秒最多 rate 次請求，允許 capacity 次的短暫突發"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個權杖，不足時等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def bulk_download(
+    tickers,
+    start_date,
+    end_date,
+    provider=None,
+    batch_size=20,
+    max_workers=4,
+    rate=2.0,
+    retries=3,
+    backoff=1.0,
+):
+    """
+    以有限的執行緒並行下載多檔股票
+    每批股票一次請求，請求前經過權杖桶限速，失敗時以指數退避重試
+    請求成功但結果缺少的股票逐檔判定為失敗，下一次只重試這些股票
+    回傳 (ticker -> DataFrame, ticker -> 錯誤訊息)，區間內沒有資料的股票兩者皆不包含
+    """
+    provider = provider or YFinanceProvider()
+    tickers = list(tickers)
+    bucket = TokenBucket(rate)
+    batches = [
+        list(tickers[i : i + batch_size]) for i in range(0, len(tickers), batch_size)
+    ]
+
+    def fetch(batch):
+        data, pending = {}, list(batch)
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(backoff * 2 ** (attempt - 1))
+            bucket.acquire()
+            try:
+                downloaded = provider.download(pending, start_date, end_date)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            data.update(
+                (ticker, downloaded[ticker])
+                for ticker in pending
+                if ticker in downloaded
+            )
+            pending = [ticker for ticker in pending if ticker not in downloaded]
+            if not pending:
+                break
+            error = "下載結果缺少此股票"
+        return data, {ticker: error for ticker in pending}
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for data, failed in executor.map(fetch, batches):
+            results.update(
+                (ticker, frame) for ticker, frame in data.items() if not frame.empty
+            )
+            errors.update(failed)
+    return results, errors